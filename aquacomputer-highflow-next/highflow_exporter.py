@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Highflow Next exporter for the node_exporter textfile collector.
+
+Reads the highflownext hwmon attributes straight from sysfs at a high rate
+(no `sensors`/`jq` processes), aggregates min/max/avg per export interval and
+writes highflow.prom atomically (temp file + rename), so node_exporter never
+sees a half-written file.
+
+Values use the same units as the old cronscript.sh, so existing series and
+dashboards carry on unchanged.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DEFAULT_OUTPUT = "/var/lib/node_exporter/textfile_collector/highflow.prom"
+
+# (metric, sysfs attribute, scale, help)
+# sysfs reports fans raw, temperatures in millidegrees C and power in
+# microwatts; cronscript.sh divided the `sensors` watts by 1000 again.
+CHANNELS = [
+    ("highflow_flow_lph", "fan1_input", 1 / 10, "Flow rate in liters per hour"),
+    ("highflow_water_quality_percent", "fan2_input", 1 / 100, "Water quality percentage"),
+    ("highflow_conductivity_nscm", "fan3_input", 1, "Conductivity in nS/cm"),
+    ("highflow_coolant_temp_celsius", "temp1_input", 1 / 1000, "Coolant temperature in Celsius"),
+    ("highflow_dissipated_power_watts", "power1_input", 1 / 1e9, "Dissipated power in Watts"),
+]
+
+
+def log(level: str, message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {level}: {message}", flush=True)
+
+
+def find_hwmon_dir(device_name: str, hwmon_root: str = "/sys/class/hwmon") -> str | None:
+    """Return the hwmon directory whose `name` is device_name, if present."""
+    for path in sorted(glob.glob(os.path.join(hwmon_root, "hwmon*"))):
+        try:
+            with open(os.path.join(path, "name")) as f:
+                if f.read().strip() == device_name:
+                    return path
+        except OSError:
+            continue
+    return None
+
+
+class HwmonReader:
+    """
+    Keeps the attribute files open and re-reads them with pread, so a sample
+    costs five syscalls instead of five open/read/close cycles. The hwmon
+    index can change when the USB device re-enumerates, so the directory is
+    looked up again after any read error.
+    """
+
+    def __init__(self, device_name: str, hwmon_root: str = "/sys/class/hwmon"):
+        self.device_name = device_name
+        self.hwmon_root = hwmon_root
+        self.fds: list[int] = []
+
+    def open(self):
+        path = find_hwmon_dir(self.device_name, self.hwmon_root)
+        if path is None:
+            raise FileNotFoundError(f"no hwmon device named {self.device_name}")
+        fds = []
+        try:
+            for _, attribute, _, _ in CHANNELS:
+                fds.append(os.open(os.path.join(path, attribute), os.O_RDONLY))
+        except OSError:
+            for fd in fds:
+                os.close(fd)
+            raise
+        self.fds = fds
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+    def read(self) -> list[float]:
+        """Read one scaled sample per channel; raises OSError/ValueError on failure."""
+        if not self.fds:
+            self.open()
+        try:
+            return [
+                int(os.pread(fd, 32, 0)) * scale
+                for fd, (_, _, scale, _) in zip(self.fds, CHANNELS)
+            ]
+        except (OSError, ValueError):
+            self.close()
+            raise
+
+
+class Aggregate:
+    """Running min/max/sum for one export interval."""
+
+    def __init__(self):
+        self.count = 0
+        self.mins = [float("inf")] * len(CHANNELS)
+        self.maxs = [float("-inf")] * len(CHANNELS)
+        self.sums = [0.0] * len(CHANNELS)
+        self.read_seconds_sum = 0.0
+        self.read_seconds_max = 0.0
+
+    def add(self, values: list[float], read_seconds: float):
+        self.count += 1
+        for i, value in enumerate(values):
+            self.mins[i] = min(self.mins[i], value)
+            self.maxs[i] = max(self.maxs[i], value)
+            self.sums[i] += value
+        self.read_seconds_sum += read_seconds
+        self.read_seconds_max = max(self.read_seconds_max, read_seconds)
+
+
+def render(agg: Aggregate, reads_total: int, failures_total: int) -> str:
+    lines = []
+
+    def gauge(name: str, help_text: str, value: float, kind: str = "gauge"):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {float(value)!r}")
+
+    # Only report readings when the interval actually produced some, so a
+    # dead sensor shows up as missing data rather than a frozen value.
+    if agg.count:
+        for i, (metric, _, _, help_text) in enumerate(CHANNELS):
+            gauge(metric, help_text, agg.sums[i] / agg.count)
+            gauge(f"{metric}_min", f"{help_text} (minimum over the export interval)", agg.mins[i])
+            gauge(f"{metric}_max", f"{help_text} (maximum over the export interval)", agg.maxs[i])
+        gauge("highflow_read_seconds_avg", "Average sysfs read latency per sample", agg.read_seconds_sum / agg.count)
+        gauge("highflow_read_seconds_max", "Maximum sysfs read latency per sample", agg.read_seconds_max)
+    gauge("highflow_samples", "Samples aggregated in the last export interval", agg.count)
+    gauge("highflow_reads_total", "Sample reads attempted since start", reads_total, "counter")
+    gauge("highflow_read_failures_total", "Sample reads that failed since start", failures_total, "counter")
+    gauge("highflow_last_export_timestamp_seconds", "Unix time of the last export", time.time())
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: str, content: str):
+    """Write to a temp file in the same directory, then rename over the target."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".highflow.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def run(args: argparse.Namespace):
+    reader = HwmonReader(args.device_name, args.hwmon_root)
+    reads_total = 0
+    failures_total = 0
+    agg = Aggregate()
+    failing = False
+    next_sample = time.monotonic()
+    next_export = next_sample + args.export_interval
+
+    while True:
+        start = time.perf_counter()
+        reads_total += 1
+        try:
+            values = reader.read()
+            agg.add(values, time.perf_counter() - start)
+            if failing:
+                log("OK", "Sensor data is readable again")
+                failing = False
+        except (OSError, ValueError) as e:
+            failures_total += 1
+            # log the transition only, not every sample while the probe is gone
+            if not failing:
+                log("ERROR", f"Failed to read sensor data: {e}")
+                failing = True
+
+        now = time.monotonic()
+        if now >= next_export:
+            try:
+                write_atomic(args.output, render(agg, reads_total, failures_total))
+            except OSError as e:
+                log("ERROR", f"Failed to write metrics to {args.output}: {e}")
+            agg = Aggregate()
+            next_export += args.export_interval
+            if next_export <= now:  # we fell behind, e.g. after a suspend
+                next_export = now + args.export_interval
+
+        next_sample += args.sample_interval
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=os.getenv("HIGHFLOW_OUTPUT", DEFAULT_OUTPUT))
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=float(os.getenv("HIGHFLOW_SAMPLE_INTERVAL", "1")),
+        help="seconds between sysfs reads",
+    )
+    parser.add_argument(
+        "--export-interval",
+        type=float,
+        default=float(os.getenv("HIGHFLOW_EXPORT_INTERVAL", "15")),
+        help="seconds between textfile writes",
+    )
+    parser.add_argument("--device-name", default=os.getenv("HIGHFLOW_DEVICE_NAME", "highflownext"))
+    parser.add_argument("--hwmon-root", default="/sys/class/hwmon")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    log("INFO", f"Sampling every {args.sample_interval}s, writing {args.output} every {args.export_interval}s")
+    try:
+        run(args)
+    except KeyboardInterrupt:
+        pass
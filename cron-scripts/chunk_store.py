@@ -0,0 +1,248 @@
+"""
+Content-addressed chunk store for pg_backup.py.
+
+Dumps are cut into variable-size chunks with a gear rolling hash, so an
+insert near the start of a dump only changes the chunks around it instead
+of shifting every fixed-size block after it. Each chunk is stored once on
+the FTP server as `chunks/<sha256>.zst`, uploaded under a `.part` name and
+renamed once complete; a backup is a small JSON manifest listing its chunks
+in order.
+
+Boundaries depend only on the last GEAR_WINDOW bytes of content, never on
+how the stream was read, so the same dump always chunks the same way.
+Changing the chunk size parameters is safe but costs one round of
+deduplication.
+"""
+
+import ftplib
+import hashlib
+import io
+import json
+import threading
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import zstandard
+
+# Hash of a byte is 32 bits, so a position's hash covers the last 32 bytes
+GEAR_WINDOW = 32
+GEAR = np.array(
+    [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], "little") for i in range(256)],
+    dtype=np.uint32,
+)
+# 16 high bits must be zero for a cut: one candidate every 64 KiB on average.
+# The high bits are the ones that depend on the whole window.
+CUT_MASK = np.uint32(0xFFFF0000)
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+READ_SIZE = 8 * 1024 * 1024
+# Uploads are renamed to <sha256>.zst only once complete
+PARTIAL_SUFFIX = ".part"
+# DELE commands in flight at once; bounded so neither side's socket buffer fills
+PIPELINE_DEPTH = 64
+
+
+def gear_hashes(block: bytes, context: bytes) -> np.ndarray:
+    """
+    Gear hash at every position of block, h[i] = sum(GEAR[b[i-k]] << k).
+
+    Vectorised as GEAR_WINDOW shifted adds instead of a per-byte loop;
+    context is the tail of the previous block so hashes carry across reads.
+    """
+    g = GEAR[np.frombuffer(context + block, dtype=np.uint8)]
+    n, c = len(block), len(context)
+    h = np.zeros(n, dtype=np.uint32)
+    for k in range(GEAR_WINDOW):
+        start = c - k
+        if start >= 0:
+            h += g[start:start + n] << np.uint32(k)
+        elif n + start > 0:
+            h[-start:] += g[:n + start] << np.uint32(k)
+    return h
+
+
+class Chunker:
+    def __init__(self, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE):
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def chunks(self, source: BinaryIO) -> Iterator[bytes]:
+        pending = bytearray()
+        context = b""
+        while block := source.read(READ_SIZE):
+            hits = np.flatnonzero((gear_hashes(block, context) & CUT_MASK) == 0)
+            context = (context + block)[-(GEAR_WINDOW - 1):]
+            base = len(pending)
+            pending += block
+
+            start = 0
+            for cut in (hits + 1 + base).tolist():
+                while cut - start > self.max_size:
+                    yield bytes(pending[start:start + self.max_size])
+                    start += self.max_size
+                if cut - start >= self.min_size:
+                    yield bytes(pending[start:cut])
+                    start = cut
+            while len(pending) - start > self.max_size:
+                yield bytes(pending[start:start + self.max_size])
+                start += self.max_size
+            del pending[:start]
+        if pending:
+            yield bytes(pending)
+
+
+class ChunkIndex:
+    """
+    Chunk hashes the remote store already has, listed once per run.
+
+    Shared by the concurrent backups: claim() hands each new chunk to
+    exactly one uploader. Another backup producing the same chunk waits
+    until that upload is committed, or takes the chunk over if it is
+    released after a failure, so no manifest can list a chunk whose upload
+    has not finished.
+    """
+
+    def __init__(self, hashes: set[str]):
+        self.hashes = hashes
+        self.uploading: set[str] = set()
+        self.changed = threading.Condition()
+
+    @classmethod
+    def load(cls, ftp: ftplib.FTP, chunk_dir: str) -> "ChunkIndex":
+        # partial uploads keep their temporary name, so they never count as present
+        names = list_chunk_dir(ftp, chunk_dir)
+        return cls({name.removesuffix(".zst") for name in names if name.endswith(".zst")})
+
+    def claim(self, digest: str) -> bool:
+        """True if the caller must upload digest, False once the store has it."""
+        with self.changed:
+            while digest in self.uploading:
+                self.changed.wait()
+            if digest in self.hashes:
+                return False
+            self.uploading.add(digest)
+            return True
+
+    def commit(self, digest: str):
+        with self.changed:
+            self.uploading.discard(digest)
+            self.hashes.add(digest)
+            self.changed.notify_all()
+
+    def release(self, digest: str):
+        with self.changed:
+            self.uploading.discard(digest)
+            self.changed.notify_all()
+
+
+class StoreStats:
+    def __init__(self):
+        self.chunks = 0
+        self.new_chunks = 0
+        self.uploaded = 0
+
+
+def chunk_path(chunk_dir: str, digest: str) -> str:
+    return f"{chunk_dir}/{digest}.zst"
+
+
+def list_chunk_dir(ftp: ftplib.FTP, chunk_dir: str) -> list[str]:
+    try:
+        return [name.rsplit("/", 1)[-1] for name in ftp.nlst(chunk_dir)]
+    except ftplib.error_perm:  # no chunks yet
+        return []
+
+
+def upload_chunk(ftp: ftplib.FTP, chunk_dir: str, digest: str, compressed: bytes):
+    """STOR under a temporary name, then rename, so an interrupted upload never looks complete."""
+    partial = f"{chunk_path(chunk_dir, digest)}{PARTIAL_SUFFIX}"
+    ftp.storbinary(f"STOR {partial}", io.BytesIO(compressed))
+    ftp.rename(partial, chunk_path(chunk_dir, digest))
+
+
+def store_stream(
+    ftp: ftplib.FTP, source: BinaryIO, index: ChunkIndex, chunk_dir: str, level: int
+) -> tuple[list[list], StoreStats]:
+    """Chunk source and upload the chunks the store lacks; returns [[sha256, size], ...] in order."""
+    cctx = zstandard.ZstdCompressor(level=level)
+    stats = StoreStats()
+    chunks = []
+    for chunk in Chunker().chunks(source):
+        digest = hashlib.sha256(chunk).hexdigest()
+        chunks.append([digest, len(chunk)])
+        stats.chunks += 1
+        if not index.claim(digest):
+            continue
+        compressed = cctx.compress(chunk)
+        try:
+            upload_chunk(ftp, chunk_dir, digest, compressed)
+        except BaseException:
+            index.release(digest)
+            raise
+        index.commit(digest)
+        stats.new_chunks += 1
+        stats.uploaded += len(compressed)
+    return chunks, stats
+
+
+def write_manifest(ftp: ftplib.FTP, path: str, manifest: dict):
+    ftp.storbinary(f"STOR {path}", io.BytesIO(json.dumps(manifest).encode()))
+
+
+def read_manifest(ftp: ftplib.FTP, path: str) -> dict:
+    buffer = io.BytesIO()
+    ftp.retrbinary(f"RETR {path}", buffer.write)
+    return json.loads(buffer.getvalue())
+
+
+def restore_stream(ftp: ftplib.FTP, manifest: dict, chunk_dir: str, out: BinaryIO):
+    """Write the manifest's chunks to out in order, checking every chunk and the whole dump."""
+    dctx = zstandard.ZstdDecompressor()
+    total = hashlib.sha256()
+    for digest, size in manifest["chunks"]:
+        buffer = io.BytesIO()
+        ftp.retrbinary(f"RETR {chunk_path(chunk_dir, digest)}", buffer.write)
+        chunk = dctx.decompress(buffer.getvalue(), max_output_size=size)
+        if len(chunk) != size or hashlib.sha256(chunk).hexdigest() != digest:
+            raise ValueError(f"chunk {digest} is corrupt")
+        total.update(chunk)
+        out.write(chunk)
+    if total.hexdigest() != manifest["sha256"]:
+        raise ValueError("restored dump does not match the manifest checksum")
+
+
+def delete_pipelined(ftp: ftplib.FTP, paths: list[str]) -> list[str]:
+    """
+    DELE every path over the one control connection without waiting for
+    each reply: a batch of PIPELINE_DEPTH commands goes out in one write,
+    then its replies are read in order. Returns the paths that failed.
+    """
+    failed = []
+    for i in range(0, len(paths), PIPELINE_DEPTH):
+        batch = paths[i:i + PIPELINE_DEPTH]
+        ftp.sock.sendall("".join(f"DELE {path}\r\n" for path in batch).encode(ftp.encoding))
+        for path in batch:
+            try:
+                ftp.getresp()
+            except (ftplib.error_perm, ftplib.error_temp):
+                failed.append(path)
+    return failed
+
+
+def collect_garbage(ftp: ftplib.FTP, chunk_dir: str, manifest_paths: list[str]) -> int:
+    """
+    Delete chunks no manifest references, and partial uploads left by an
+    interrupted run; returns how many were deleted. Must not run while a
+    backup is storing chunks.
+    """
+    referenced = set()
+    for path in manifest_paths:
+        referenced.update(digest for digest, _ in read_manifest(ftp, path)["chunks"])
+    names = list_chunk_dir(ftp, chunk_dir)
+    garbage = [
+        f"{chunk_dir}/{name}"
+        for name in names
+        if name.endswith(PARTIAL_SUFFIX)
+        or (name.endswith(".zst") and name.removesuffix(".zst") not in referenced)
+    ]
+    return len(garbage) - len(delete_pipelined(ftp, garbage))
@@ -0,0 +1,674 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL backup to FTP, replacing pg-backup.sh.
+
+Every database is dumped concurrently and streamed straight into the
+content-addressed chunk store on the FTP server (see chunk_store.py):
+pg_dump's output is never written to local disk, only chunks the server
+lacks are uploaded, and size, line count and checksum are taken from the
+bytes as they go past. Each backup is a `backup_<stamp>.<sql|tar>.manifest.json`
+in the database's directory; retention deletes expired manifests and then
+garbage-collects chunks no manifest references.
+
+Databases listed in PG_BACKUP_DIRECTORY_DBS are dumped in directory format
+with PG_BACKUP_JOBS parallel workers instead (one table per worker), which
+pays off for large databases at the cost of one local copy in the scratch
+directory; that copy is streamed up as a tar and removed. pg_dump's own
+compression is turned off there, since compressed output would not dedup.
+
+Retention runs once per run in a single FTP session: every directory is
+listed once and all expired files, then all unreferenced chunks, are
+deleted with pipelined DELE commands instead of a round trip each.
+
+With --verify (or PG_BACKUP_VERIFY=1) the row count of every table is
+recorded in the manifest, taken in the same snapshot pg_dump uses, and the
+new backups are then restored in parallel into scratch `<db>_verify`
+databases (the backup user needs CREATEDB) whose row counts must match.
+The verdict is sent to the alert bot.
+
+Usage:
+    pg_backup.py [--verify]                back up every database
+    pg_backup.py restore DB [MANIFEST]     write a dump (latest by default)
+                                           to stdout, e.g. `| psql DB`
+    pg_backup.py verify DB [MANIFEST]      restore-test a backup made with --verify
+
+Reads the same pg-backup.env as the shell script did (see
+pg-backup.env-sample) and needs zstandard and numpy (requirements.txt).
+"""
+
+import argparse
+import ftplib
+import hashlib
+import json
+import os
+import re
+import ssl
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from chunk_store import (
+    ChunkIndex,
+    collect_garbage,
+    delete_pipelined,
+    read_manifest,
+    restore_stream,
+    store_stream,
+    write_manifest,
+)
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pg-backup.env")
+
+
+def log(message: str, file=sys.stdout):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", file=file, flush=True)
+
+
+def load_env_file(path: str):
+    """Load KEY=value lines from the shell env file; the real environment wins."""
+    if not os.path.isfile(path):
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("export "):
+                line = line[len("export "):].strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            os.environ.setdefault(key.strip(), value.strip().strip("'\""))
+    log(f"Sourced environment variables from {path}")
+
+
+load_env_file(ENV_FILE)
+
+# Configurable Variables
+DB_HOST = os.getenv("PG_BACKUP_HOST", "localhost")
+DB_PORT = os.getenv("PG_BACKUP_PORT", "5432")
+DB_USER = os.getenv("PG_BACKUP_USER")
+DB_PASSWORD = os.getenv("PG_BACKUP_PASSWORD")
+DBS_TO_BACKUP = [db for db in os.getenv("PG_BACKUP_DBS", "finance,parents_finance,metabase").split(",") if db]
+# Dumped in directory format with DUMP_JOBS workers; only worth it for big databases
+DIRECTORY_DBS = {db for db in os.getenv("PG_BACKUP_DIRECTORY_DBS", "").split(",") if db}
+DUMP_JOBS = int(os.getenv("PG_BACKUP_JOBS", "4"))
+# Scratch space for directory-format dumps; also where pg-backup.sh kept its copies
+BASE_BACKUP_DIR = os.getenv("PG_BACKUP_LOCAL_DIR", "/home/nathan/pg-backup")
+BASE_REMOTE_DIR = os.getenv("PG_BACKUP_REMOTE_DIR", "/nathan/pg-backup")
+FTP_HOST = os.getenv("PG_BACKUP_FTP_HOST", "10.20.0.18")
+FTP_PORT = int(os.getenv("PG_BACKUP_FTP_PORT", "21"))
+FTP_USER = os.getenv("PG_BACKUP_FTP_USER")
+FTP_PASS = os.getenv("PG_BACKUP_FTP_PASS")
+ALERT_URL = os.getenv("PG_BACKUP_ALERT_URL", "http://localhost:30007/alert/finance")
+KEEP_DAYS = int(os.getenv("PG_BACKUP_KEEP_DAYS", "60"))  # Number of days to keep backups
+ZSTD_LEVEL = int(os.getenv("PG_BACKUP_ZSTD_LEVEL", "9"))
+# Shared by every database, so identical data is stored once across all of them
+CHUNK_DIR = f"{BASE_REMOTE_DIR}/chunks"
+MANIFEST_SUFFIX = ".manifest.json"
+VERIFY = os.getenv("PG_BACKUP_VERIFY", "").strip().lower() in {"1", "true", "yes", "on"}
+VERIFY_DB_SUFFIX = "_verify"
+
+# Exact row count of every user table, as "schema.table<TAB>count" lines
+ROW_COUNT_SQL = """
+SELECT format('%I.%I', table_schema, table_name),
+       (xpath('/row/c/text()', query_to_xml(
+           format('SELECT count(*) AS c FROM %I.%I', table_schema, table_name), false, true, ''
+       )))[1]::text::bigint
+FROM information_schema.tables
+WHERE table_type = 'BASE TABLE' AND table_schema NOT IN ('pg_catalog', 'information_schema')
+ORDER BY 1;
+"""
+
+BACKUP_NAME_RE = re.compile(r"^backup_(\d{8}_\d{6})\.")
+
+
+def send_discord_notification(message: str, priority: str = "normal"):
+    """Post to the alert bot; priority is one of critical, high, normal, low."""
+    body = json.dumps({"message": message, "priority": priority}).encode()
+    request = urllib.request.Request(
+        ALERT_URL, data=body, headers={"Content-Type": "application/json"}
+    )
+    try:
+        urllib.request.urlopen(request, timeout=10).close()
+    except Exception as e:
+        log(f"Failed to send Discord notification: {e}", file=sys.stderr)
+
+
+def fail(message: str):
+    log(message, file=sys.stderr)
+    send_discord_notification(message, "critical")
+
+
+class TallyReader:
+    """File-like wrapper that sizes and hashes (and optionally line-counts) what is read through it."""
+
+    def __init__(self, raw, count_lines: bool = False):
+        self.raw = raw
+        self.count_lines = count_lines
+        self.size = 0
+        self.lines = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.size += len(data)
+        self.sha256.update(data)
+        if self.count_lines:
+            self.lines += data.count(b"\n")
+        return data
+
+
+class BackupResult:
+    def __init__(self, db: str, name: str, manifest: dict, stats, seconds: float):
+        self.db = db
+        self.name = name
+        self.raw_size = manifest["size"]
+        self.lines = manifest["lines"]
+        self.sha256 = manifest["sha256"]
+        self.chunks = stats.chunks
+        self.new_chunks = stats.new_chunks
+        self.uploaded = stats.uploaded
+        self.seconds = seconds
+
+    def __str__(self):
+        lines = f", {self.lines} lines" if self.lines is not None else ""
+        return (
+            f"{self.name}{lines}, {human_size(self.raw_size)}, {self.new_chunks}/{self.chunks} chunks new "
+            f"({human_size(self.uploaded)} uploaded), sha256 {self.sha256[:12]}, {self.seconds:.0f}s"
+        )
+
+
+def human_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def connect_ftp() -> ftplib.FTP:
+    """Log in with explicit TLS when the server offers it, like lftp did, else plain FTP."""
+    ftp = ftplib.FTP_TLS(context=ssl._create_unverified_context(), timeout=120)
+    ftp.connect(FTP_HOST, FTP_PORT)
+    try:
+        ftp.auth()
+        secure = True
+    except ftplib.error_perm:
+        secure = False
+    ftp.login(FTP_USER, FTP_PASS, secure=secure)
+    if secure:
+        ftp.prot_p()
+    return ftp
+
+
+def ftp_makedirs(ftp: ftplib.FTP, path: str):
+    """mkdir -p for FTP, then cd into path."""
+    ftp.cwd("/")
+    for part in path.strip("/").split("/"):
+        try:
+            ftp.cwd(part)
+        except ftplib.error_perm:
+            ftp.mkd(part)
+            ftp.cwd(part)
+
+
+def pg_env() -> dict:
+    return {**os.environ, "PGPASSWORD": DB_PASSWORD}
+
+
+def pg_dump_command(db: str, *args: str) -> list[str]:
+    return ["pg_dump", "-h", DB_HOST, "-p", DB_PORT, "-U", DB_USER, "-b", *args, db]
+
+
+def psql_command(db: str, *args: str) -> list[str]:
+    """Unaligned, tuples-only psql, so output is one tab-separated row per line."""
+    return ["psql", "-X", "-q", "-A", "-t", "-F", "\t", "-h", DB_HOST, "-p", DB_PORT, "-U", DB_USER, "-d", db, *args]
+
+
+def run_psql(db: str, *args: str) -> list[str]:
+    result = subprocess.run(psql_command(db, *args), env=pg_env(), capture_output=True, text=True, check=True)
+    return [line for line in result.stdout.splitlines() if line]
+
+
+def parse_row_counts(lines: list[str]) -> dict[str, int]:
+    return {table: int(count) for table, count in (line.split("\t") for line in lines)}
+
+
+class SourceSnapshot:
+    """
+    A REPEATABLE READ transaction held open in psql, so the row counts and
+    `pg_dump --snapshot` see exactly the same data even on a live database.
+    """
+
+    SENTINEL = "__pg_backup_done__"
+
+    def __init__(self, db: str):
+        self.proc = subprocess.Popen(
+            psql_command(db), stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=pg_env(), text=True
+        )
+        lines = self.query("BEGIN ISOLATION LEVEL REPEATABLE READ; SELECT pg_export_snapshot();")
+        if not lines:
+            self.close()
+            raise RuntimeError(f"could not export a snapshot of {db}")
+        self.id = lines[0]
+
+    def query(self, sql: str) -> list[str]:
+        self.proc.stdin.write(f"{sql}\n\\echo {self.SENTINEL}\n")
+        self.proc.stdin.flush()
+        lines = []
+        for line in self.proc.stdout:
+            line = line.rstrip("\n")
+            if line == self.SENTINEL:
+                return lines
+            if line:
+                lines.append(line)
+        raise RuntimeError(f"psql exited with {self.proc.wait()}")
+
+    def close(self):
+        with suppress(OSError):
+            self.proc.stdin.write("COMMIT;\n")
+            self.proc.stdin.close()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def finish(
+    ftp: ftplib.FTP, db: str, name: str, raw: TallyReader, chunks: list, row_counts: dict | None
+) -> dict:
+    """Write the manifest for a fully stored dump; this is what makes the backup exist."""
+    if raw.size == 0:
+        raise RuntimeError("dump is empty")
+    manifest = {
+        "db": db,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "size": raw.size,
+        "lines": raw.lines if raw.count_lines else None,
+        "sha256": raw.sha256.hexdigest(),
+        "row_counts": row_counts,
+        "chunks": chunks,
+    }
+    # written last, so a manifest never references a chunk that is not there
+    write_manifest(ftp, name, manifest)
+    return manifest
+
+
+def dump_plain(ftp: ftplib.FTP, db: str, name: str, index: ChunkIndex, snapshot: SourceSnapshot | None):
+    """pg_dump -F p | chunk | STOR, all in one pass."""
+    args = ["--snapshot", snapshot.id] if snapshot else []
+    proc = subprocess.Popen(pg_dump_command(db, "-F", "p", *args), stdout=subprocess.PIPE, env=pg_env())
+    raw = TallyReader(proc.stdout, count_lines=True)
+    try:
+        chunks, stats = store_stream(ftp, raw, index, CHUNK_DIR, ZSTD_LEVEL)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+    # the exit status is only known once the stream ends, so check it before
+    # the manifest makes this backup visible
+    if proc.wait() != 0:
+        raise RuntimeError(f"pg_dump exited with {proc.returncode}")
+    return finish(ftp, db, name, raw, chunks, row_counts(snapshot)), stats
+
+
+def dump_directory(ftp: ftplib.FTP, db: str, name: str, index: ChunkIndex, snapshot: SourceSnapshot | None):
+    """pg_dump -F d -j N into scratch, then tar | chunk | STOR through a pipe."""
+    os.makedirs(BASE_BACKUP_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=BASE_BACKUP_DIR, prefix=f".{db}.") as scratch:
+        dump_dir = os.path.join(scratch, db)
+        # no pg_dump compression: compressed files would not dedup, and chunks are zstd'd anyway
+        args = ["--snapshot", snapshot.id] if snapshot else []
+        subprocess.run(
+            pg_dump_command(db, "-F", "d", "-j", str(DUMP_JOBS), "-Z", "0", "-f", dump_dir, *args),
+            env=pg_env(),
+            check=True,
+        )
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def write_tar():
+            try:
+                with os.fdopen(write_fd, "wb") as out, tarfile.open(fileobj=out, mode="w|") as tar:
+                    tar.add(dump_dir, arcname=db)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write_tar, daemon=True)
+        writer.start()
+        with os.fdopen(read_fd, "rb") as pipe:
+            raw = TallyReader(pipe)
+            chunks, stats = store_stream(ftp, raw, index, CHUNK_DIR, ZSTD_LEVEL)
+        writer.join()
+        if errors:
+            raise errors[0]
+    return finish(ftp, db, name, raw, chunks, row_counts(snapshot)), stats
+
+
+def row_counts(snapshot: SourceSnapshot | None) -> dict[str, int] | None:
+    return parse_row_counts(snapshot.query(ROW_COUNT_SQL)) if snapshot else None
+
+
+def expired(name: str, cutoff: datetime) -> bool:
+    match = BACKUP_NAME_RE.match(name)
+    if match is None:
+        return False
+    try:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S") < cutoff
+    except ValueError:  # not one of ours after all
+        return False
+
+
+def list_dir(ftp: ftplib.FTP, directory: str) -> list[str]:
+    try:
+        return sorted(os.path.basename(name) for name in ftp.nlst(directory))
+    except ftplib.error_perm:  # missing or empty
+        return []
+
+
+def select_retention(
+    listing: dict[str, list[str]], dbs: list[str], cutoff: datetime
+) -> tuple[list[str], list[str]]:
+    """
+    Split a listing of BASE_REMOTE_DIR ({directory: [file names]}) into the
+    expired backups to delete and the manifests that stay.
+    """
+    expired_paths, manifests = [], []
+    for entry, names in listing.items():
+        # databases no longer in PG_BACKUP_DBS keep their backups and chunks
+        for name in names:
+            path = f"{BASE_REMOTE_DIR}/{entry}/{name}"
+            if entry in dbs and expired(name, cutoff):
+                expired_paths.append(path)
+            elif name.endswith(MANIFEST_SUFFIX):
+                manifests.append(path)
+    return expired_paths, manifests
+
+
+def apply_retention(dbs: list[str]):
+    """
+    Prune the backups of dbs past KEEP_DAYS, all in one FTP session.
+
+    Every directory is listed once; expired manifests (and whole-file
+    backups from before the chunk store) go in one pipelined batch, then
+    the chunks no remaining manifest references go in another. A manifest
+    that fails to delete keeps its chunks. Copies pg-backup.sh left locally
+    are removed too.
+    """
+    cutoff = datetime.now() - timedelta(days=KEEP_DAYS)
+    ftp = connect_ftp()
+    try:
+        listing = {
+            entry: list_dir(ftp, f"{BASE_REMOTE_DIR}/{entry}")
+            for entry in list_dir(ftp, BASE_REMOTE_DIR)
+            if entry != os.path.basename(CHUNK_DIR)
+        }
+        expired_paths, manifests = select_retention(listing, dbs, cutoff)
+
+        failed = delete_pipelined(ftp, expired_paths)
+        for path in failed:
+            log(f"Warning: Failed to delete {path} from FTP server.", file=sys.stderr)
+        manifests.extend(path for path in failed if path.endswith(MANIFEST_SUFFIX))
+        log(f"Deleted {len(expired_paths) - len(failed)} expired backups from FTP server")
+        log(f"Garbage collected {collect_garbage(ftp, CHUNK_DIR, manifests)} unreferenced chunks")
+    finally:
+        quit_ftp(ftp)
+
+    for db in dbs:
+        local_dir = os.path.join(BASE_BACKUP_DIR, db)
+        if os.path.isdir(local_dir):
+            for name in os.listdir(local_dir):
+                if expired(name, cutoff):
+                    log(f"Deleting {name} locally...")
+                    os.remove(os.path.join(local_dir, name))
+
+
+def quit_ftp(ftp: ftplib.FTP):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+
+def backup_database(db: str, index: ChunkIndex) -> BackupResult:
+    started = time.monotonic()
+    directory = db in DIRECTORY_DBS
+    name = f"backup_{datetime.now():%Y%m%d_%H%M%S}.{'tar' if directory else 'sql'}{MANIFEST_SUFFIX}"
+    log(f"Backing up {db} to {name}")
+
+    ftp = connect_ftp()
+    try:
+        ftp_makedirs(ftp, f"{BASE_REMOTE_DIR}/{db}")
+        # a failed dump writes no manifest, and its chunks are collected as garbage
+        dump = dump_directory if directory else dump_plain
+        if VERIFY:
+            with SourceSnapshot(db) as snapshot:
+                manifest, stats = dump(ftp, db, name, index, snapshot)
+        else:
+            manifest, stats = dump(ftp, db, name, index, None)
+    finally:
+        quit_ftp(ftp)
+    return BackupResult(db, name, manifest, stats, time.monotonic() - started)
+
+
+def list_manifests(ftp: ftplib.FTP, directory: str) -> list[str]:
+    return [f"{directory}/{name}" for name in list_dir(ftp, directory) if name.endswith(MANIFEST_SUFFIX)]
+
+
+def find_manifest(ftp: ftplib.FTP, db: str, manifest_name: str | None) -> str | None:
+    """Path of the named manifest of db, or of its latest one."""
+    manifests = list_manifests(ftp, f"{BASE_REMOTE_DIR}/{db}")
+    if manifest_name is not None:
+        manifests = [path for path in manifests if os.path.basename(path) == manifest_name]
+    return manifests[-1] if manifests else None
+
+
+def restore(db: str, manifest_name: str | None) -> int:
+    """Stream a backup of db to stdout: the named manifest, else the latest."""
+    ftp = connect_ftp()
+    try:
+        path = find_manifest(ftp, db, manifest_name)
+        if path is None:
+            log(f"No backup of {db} found", file=sys.stderr)
+            return 1
+        log(f"Restoring {path}", file=sys.stderr)
+        restore_stream(ftp, read_manifest(ftp, path), CHUNK_DIR, sys.stdout.buffer)
+    finally:
+        quit_ftp(ftp)
+    return 0
+
+
+def restore_plain(ftp: ftplib.FTP, manifest: dict, target: str):
+    """Replay a plain dump into target, stopping at the first failed statement."""
+    proc = subprocess.Popen(
+        psql_command(target, "-v", "ON_ERROR_STOP=1"),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        env=pg_env(),
+    )
+    try:
+        restore_stream(ftp, manifest, CHUNK_DIR, proc.stdin)
+    except BrokenPipeError:
+        pass  # psql stopped early; its exit code says why
+    finally:
+        with suppress(BrokenPipeError):
+            proc.stdin.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"psql exited with {returncode} while restoring into {target}")
+
+
+def restore_directory(ftp: ftplib.FTP, manifest: dict, db: str, target: str):
+    """Unpack the tar into scratch as it streams in, then pg_restore -j N from there."""
+    os.makedirs(BASE_BACKUP_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=BASE_BACKUP_DIR, prefix=f".{db}.") as scratch:
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def write_dump():
+            try:
+                with os.fdopen(write_fd, "wb") as out:
+                    restore_stream(ftp, manifest, CHUNK_DIR, out)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write_dump, daemon=True)
+        writer.start()
+        with os.fdopen(read_fd, "rb") as pipe, tarfile.open(fileobj=pipe, mode="r|") as tar:
+            tar.extractall(scratch, filter="data")
+        writer.join()
+        if errors:
+            raise errors[0]
+        # errors pg_restore skips past (e.g. existing extensions) surface as row count mismatches
+        subprocess.run(
+            ["pg_restore", "-h", DB_HOST, "-p", DB_PORT, "-U", DB_USER, "-j", str(DUMP_JOBS),
+             "-d", target, os.path.join(scratch, db)],
+            env=pg_env(),
+        )
+
+
+def verify_backup(db: str, manifest_name: str | None = None) -> str:
+    """
+    Restore a backup into a scratch database and compare its row counts with
+    the ones recorded at dump time. Returns a summary; raises on a mismatch.
+    """
+    target = f"{db}{VERIFY_DB_SUFFIX}"
+    ftp = connect_ftp()
+    try:
+        path = find_manifest(ftp, db, manifest_name)
+        if path is None:
+            raise RuntimeError("no backup found")
+        manifest = read_manifest(ftp, path)
+        expected = manifest.get("row_counts")
+        if expected is None:
+            raise RuntimeError(f"{os.path.basename(path)} has no row counts, it was not made with --verify")
+
+        run_psql("postgres", "-c", f'DROP DATABASE IF EXISTS "{target}"')
+        run_psql("postgres", "-c", f'CREATE DATABASE "{target}"')
+        try:
+            if path.endswith(f".tar{MANIFEST_SUFFIX}"):
+                restore_directory(ftp, manifest, db, target)
+            else:
+                restore_plain(ftp, manifest, target)
+            actual = parse_row_counts(run_psql(target, "-c", ROW_COUNT_SQL))
+        finally:
+            run_psql("postgres", "-c", f'DROP DATABASE IF EXISTS "{target}"')
+    finally:
+        quit_ftp(ftp)
+
+    mismatches = [
+        f"{table} {expected.get(table)} → {actual.get(table)}"
+        for table in sorted(expected.keys() | actual.keys())
+        if expected.get(table) != actual.get(table)
+    ]
+    if mismatches:
+        raise RuntimeError(f"{len(mismatches)} tables differ: {', '.join(mismatches[:5])}")
+    return f"{os.path.basename(path)}, {len(actual)} tables, {sum(actual.values())} rows match"
+
+
+def verify_all(dbs: list[str], manifest_name: str | None = None) -> list[str]:
+    """Verify the latest (or named) backup of every db in parallel and alert each verdict; returns the failures."""
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, len(dbs))) as pool:
+        futures = {pool.submit(verify_backup, db, manifest_name): db for db in dbs}
+        for future in as_completed(futures):
+            db = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                failures.append(db)
+                fail(f"❌ PostgreSQL Backup Verification Failed: {db}: {e}")
+                continue
+            message = f"✅ PostgreSQL Backup Verified: {db} restores cleanly ({summary})"
+            log(message)
+            send_discord_notification(message, "low")
+    return failures
+
+
+def main() -> int:
+    # Check if required environment variables are set
+    if not DB_USER or not DB_PASSWORD:
+        fail("❌ PostgreSQL Backup Failed: PG_BACKUP_USER and PG_BACKUP_PASSWORD environment variables must be set!")
+        return 1
+    if not FTP_USER or not FTP_PASS:
+        fail("❌ PostgreSQL Backup Failed: PG_BACKUP_FTP_USER and PG_BACKUP_FTP_PASS environment variables must be set!")
+        return 1
+
+    ftp = connect_ftp()
+    try:
+        ftp_makedirs(ftp, CHUNK_DIR)
+        index = ChunkIndex.load(ftp, CHUNK_DIR)
+    finally:
+        quit_ftp(ftp)
+    log(f"Chunk store has {len(index.hashes)} chunks")
+
+    failures = []
+    succeeded = []
+    with ThreadPoolExecutor(max_workers=max(1, len(DBS_TO_BACKUP))) as pool:
+        futures = {pool.submit(backup_database, db, index): db for db in DBS_TO_BACKUP}
+        for future in as_completed(futures):
+            db = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(db)
+                fail(f"❌ PostgreSQL Backup Failed: {db}: {e}")
+                continue
+            succeeded.append(db)
+            message = f"✅ PostgreSQL Backup Success: {db} backed up to FTP ({result})"
+            log(message)
+            send_discord_notification(message, "low")
+
+    if VERIFY:
+        unverified = verify_all(succeeded)
+        failures.extend(unverified)
+        # a new backup that does not restore must not push out the old ones
+        succeeded = [db for db in succeeded if db not in unverified]
+
+    try:
+        # only databases that just backed up (and verified) lose old backups
+        apply_retention(succeeded)
+    except Exception as e:
+        # safe to skip, whatever is left is pruned on the next run
+        log(f"Warning: retention failed: {e}", file=sys.stderr)
+
+    if failures:
+        return 1
+    message = "✅ PostgreSQL Backup Complete: All databases backed up successfully"
+    log(message)
+    send_discord_notification(message)
+    return 0
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--verify", action="store_true", default=VERIFY, help="restore-test the new backups"
+    )
+    commands = parser.add_subparsers(dest="command")
+    for command, help_text in (("restore", "write a backup to stdout"), ("verify", "restore-test a backup")):
+        command_parser = commands.add_parser(command, help=help_text)
+        command_parser.add_argument("db")
+        command_parser.add_argument("manifest", nargs="?", help="manifest name, latest by default")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    VERIFY = args.verify
+    if args.command == "restore":
+        sys.exit(restore(args.db, args.manifest))
+    if args.command == "verify":
+        sys.exit(1 if verify_all([args.db], args.manifest) else 0)
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import ftplib
+import hashlib
+import io
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import chunk_store
+from chunk_store import (
+    ChunkIndex,
+    Chunker,
+    chunk_path,
+    collect_garbage,
+    read_manifest,
+    restore_stream,
+    store_stream,
+    write_manifest,
+)
+
+CHUNK_DIR = "/backup/chunks"
+
+
+class FakeSocket:
+    def __init__(self, ftp):
+        self.ftp = ftp
+
+    def sendall(self, data: bytes):
+        self.ftp.pending += [line.removeprefix("DELE ") for line in data.decode().split("\r\n") if line]
+
+
+class FakeFTP:
+    """In-memory FTP server: the calls chunk_store makes, over a dict of files."""
+
+    encoding = "utf-8"
+
+    def __init__(self, files: dict[str, bytes] | None = None):
+        self.files: dict[str, bytes] = {} if files is None else files
+        self.pending: list[str] = []
+        self.sock = FakeSocket(self)
+
+    def storbinary(self, command: str, source):
+        self.files[command.removeprefix("STOR ")] = source.read()
+
+    def rename(self, source: str, target: str):
+        self.files[target] = self.files.pop(source)
+
+    def retrbinary(self, command: str, callback):
+        path = command.removeprefix("RETR ")
+        if path not in self.files:
+            raise ftplib.error_perm(f"550 {path}: no such file")
+        callback(self.files[path])
+
+    def nlst(self, directory: str):
+        return [path for path in self.files if path.startswith(directory + "/")]
+
+    def getresp(self):
+        path = self.pending.pop(0)
+        if self.files.pop(path, None) is None:
+            raise ftplib.error_perm(f"550 {path}: no such file")
+        return "250 deleted"
+
+
+def random_bytes(size: int, seed: int = 1) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def chunk_digests(data: bytes) -> list[str]:
+    return [hashlib.sha256(chunk).hexdigest() for chunk in Chunker().chunks(io.BytesIO(data))]
+
+
+def backup(ftp: FakeFTP, index: ChunkIndex, data: bytes, path: str) -> dict:
+    chunks, _ = store_stream(ftp, io.BytesIO(data), index, CHUNK_DIR, level=1)
+    manifest = {"chunks": chunks, "sha256": hashlib.sha256(data).hexdigest()}
+    write_manifest(ftp, path, manifest)
+    return manifest
+
+
+def test_boundaries_do_not_depend_on_read_size(monkeypatch):
+    data = random_bytes(2 * 1024 * 1024)
+    expected = chunk_digests(data)
+
+    for read_size in [4096, 100_003, 1024 * 1024]:
+        monkeypatch.setattr(chunk_store, "READ_SIZE", read_size)
+        assert chunk_digests(data) == expected
+    assert b"".join(Chunker().chunks(io.BytesIO(data))) == data
+
+
+def test_chunk_sizes_stay_within_bounds():
+    sizes = [len(chunk) for chunk in Chunker().chunks(io.BytesIO(random_bytes(3 * 1024 * 1024)))]
+
+    assert all(chunk_store.MIN_CHUNK_SIZE <= size <= chunk_store.MAX_CHUNK_SIZE for size in sizes[:-1])
+    assert sizes[-1] <= chunk_store.MAX_CHUNK_SIZE
+
+
+def test_insert_only_changes_nearby_chunks():
+    data = random_bytes(2 * 1024 * 1024)
+    shifted = data[:300_000] + b"inserted row" * 10 + data[300_000:]
+
+    before, after = chunk_digests(data), chunk_digests(shifted)
+
+    assert len(set(before) - set(after)) <= 2
+    assert len(before) > 10
+
+
+def test_manifest_round_trips():
+    ftp = FakeFTP()
+    data = random_bytes(1024 * 1024)
+    manifest = backup(ftp, ChunkIndex(set()), data, "/backup/db/backup_20261001_000000.manifest.json")
+
+    assert read_manifest(ftp, "/backup/db/backup_20261001_000000.manifest.json") == manifest
+    out = io.BytesIO()
+    restore_stream(ftp, manifest, CHUNK_DIR, out)
+    assert out.getvalue() == data
+
+
+def test_identical_chunks_are_uploaded_once():
+    ftp = FakeFTP()
+    index = ChunkIndex(set())
+    data = random_bytes(1024 * 1024)
+    backup(ftp, index, data, "/backup/db/a.manifest.json")
+
+    _, stats = store_stream(ftp, io.BytesIO(data), index, CHUNK_DIR, level=1)
+
+    assert stats.chunks > 0
+    assert stats.new_chunks == 0
+
+
+def test_restore_rejects_a_corrupt_chunk():
+    ftp = FakeFTP()
+    manifest = backup(ftp, ChunkIndex(set()), random_bytes(256 * 1024), "/backup/db/a.manifest.json")
+    digest, size = manifest["chunks"][0]
+    other = chunk_store.zstandard.ZstdCompressor().compress(random_bytes(size, seed=2))
+    ftp.files[chunk_path(CHUNK_DIR, digest)] = other
+
+    with pytest.raises(ValueError):
+        restore_stream(ftp, manifest, CHUNK_DIR, io.BytesIO())
+
+
+def test_gc_keeps_referenced_chunks():
+    ftp = FakeFTP()
+    index = ChunkIndex(set())
+    kept = backup(ftp, index, random_bytes(512 * 1024, seed=1), "/backup/db/new.manifest.json")
+    backup(ftp, index, random_bytes(512 * 1024, seed=2), "/backup/db/old.manifest.json")
+    del ftp.files["/backup/db/old.manifest.json"]
+
+    deleted = collect_garbage(ftp, CHUNK_DIR, ["/backup/db/new.manifest.json"])
+
+    assert deleted > 0
+    remaining = ChunkIndex.load(ftp, CHUNK_DIR).hashes
+    assert remaining == {digest for digest, _ in kept["chunks"]}
+
+
+def test_gc_aborts_when_a_manifest_cannot_be_read():
+    ftp = FakeFTP()
+    backup(ftp, ChunkIndex(set()), random_bytes(512 * 1024), "/backup/db/a.manifest.json")
+    chunks_before = set(ftp.nlst(CHUNK_DIR))
+
+    with pytest.raises(ftplib.error_perm):
+        collect_garbage(ftp, CHUNK_DIR, ["/backup/db/a.manifest.json", "/backup/db/gone.manifest.json"])
+
+    assert set(ftp.nlst(CHUNK_DIR)) == chunks_before
+
+
+class FailingFTP(FakeFTP):
+    """Fails its first upload once released, leaving half the chunk behind like a dropped connection."""
+
+    def __init__(self, files: dict[str, bytes]):
+        super().__init__(files)
+        self.uploading = threading.Event()
+        self.fail = threading.Event()
+
+    def storbinary(self, command: str, source):
+        self.uploading.set()
+        self.fail.wait(timeout=5)
+        self.files[command.removeprefix("STOR ")] = source.read()[:100]
+        raise ftplib.error_temp("426 connection closed; transfer aborted")
+
+
+def test_interrupted_upload_is_not_counted_as_stored():
+    ftp = FailingFTP({})
+    ftp.fail.set()
+
+    with pytest.raises(ftplib.error_temp):
+        store_stream(ftp, io.BytesIO(random_bytes(64 * 1024)), ChunkIndex(set()), CHUNK_DIR, level=1)
+
+    assert ftp.files  # the partial upload is still there
+    assert ChunkIndex.load(ftp, CHUNK_DIR).hashes == set()
+    assert collect_garbage(ftp, CHUNK_DIR, []) == 1
+    assert ftp.files == {}
+
+
+def test_concurrent_backup_uploads_a_shared_chunk_that_failed_elsewhere():
+    files: dict[str, bytes] = {}
+    failing, healthy = FailingFTP(files), FakeFTP(files)
+    index = ChunkIndex(set())
+    data = random_bytes(64 * 1024)
+    results = {}
+
+    def run(name, ftp):
+        try:
+            results[name] = backup(ftp, index, data, f"/backup/{name}/a.manifest.json")
+        except ftplib.Error as e:
+            results[name] = e
+
+    first = threading.Thread(target=run, args=("first", failing))
+    first.start()
+    assert failing.uploading.wait(timeout=5)
+    second = threading.Thread(target=run, args=("second", healthy))
+    second.start()
+    time.sleep(0.05)
+    # the second backup is waiting on the first one's upload, not skipping it
+    assert "/backup/second/a.manifest.json" not in files
+    failing.fail.set()
+    first.join()
+    second.join()
+
+    assert isinstance(results["first"], ftplib.error_temp)
+    out = io.BytesIO()
+    restore_stream(healthy, read_manifest(healthy, "/backup/second/a.manifest.json"), CHUNK_DIR, out)
+    assert out.getvalue() == data
@@ -0,0 +1,86 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pg_backup
+from pg_backup import expired, select_retention
+
+CUTOFF = datetime(2026, 8, 20)
+BASE = pg_backup.BASE_REMOTE_DIR
+
+
+def test_expired_uses_the_name_timestamp():
+    assert expired("backup_20260801_030000.manifest.json", CUTOFF)
+    assert expired("backup_20260801_030000.sql.gz", CUTOFF)
+    assert not expired("backup_20260901_030000.manifest.json", CUTOFF)
+    assert not expired("notes.txt", CUTOFF)
+    assert not expired("backup_20261399_000000.manifest.json", CUTOFF)
+
+
+def test_select_retention_deletes_expired_backups_and_keeps_the_rest():
+    listing = {
+        "finance": [
+            "backup_20260801_030000.manifest.json",
+            "backup_20260801_030000.sql.gz",
+            "backup_20260901_030000.manifest.json",
+        ],
+        "metabase": ["backup_20260901_030000.manifest.json"],
+    }
+
+    expired_paths, manifests = select_retention(listing, ["finance", "metabase"], CUTOFF)
+
+    assert expired_paths == [
+        f"{BASE}/finance/backup_20260801_030000.manifest.json",
+        f"{BASE}/finance/backup_20260801_030000.sql.gz",
+    ]
+    assert manifests == [
+        f"{BASE}/finance/backup_20260901_030000.manifest.json",
+        f"{BASE}/metabase/backup_20260901_030000.manifest.json",
+    ]
+
+
+def test_select_retention_leaves_databases_no_longer_backed_up_alone():
+    listing = {"old_db": ["backup_20200101_030000.manifest.json"]}
+
+    expired_paths, manifests = select_retention(listing, ["finance"], CUTOFF)
+
+    assert expired_paths == []
+    # its manifest still protects its chunks from garbage collection
+    assert manifests == [f"{BASE}/old_db/backup_20200101_030000.manifest.json"]
+
+
+def run_main(monkeypatch, dbs: list[str], unverified: list[str]) -> tuple[int, list[list[str]]]:
+    retained = []
+    monkeypatch.setattr(pg_backup, "DB_USER", "backup")
+    monkeypatch.setattr(pg_backup, "DB_PASSWORD", "secret")
+    monkeypatch.setattr(pg_backup, "FTP_USER", "ftp")
+    monkeypatch.setattr(pg_backup, "FTP_PASS", "secret")
+    monkeypatch.setattr(pg_backup, "DBS_TO_BACKUP", dbs)
+    monkeypatch.setattr(pg_backup, "VERIFY", True)
+    monkeypatch.setattr(pg_backup, "connect_ftp", lambda: None)
+    monkeypatch.setattr(pg_backup, "ftp_makedirs", lambda ftp, path: None)
+    monkeypatch.setattr(pg_backup, "quit_ftp", lambda ftp: None)
+    monkeypatch.setattr(
+        pg_backup.ChunkIndex, "load", classmethod(lambda cls, ftp, chunk_dir: cls(set()))
+    )
+    monkeypatch.setattr(pg_backup, "backup_database", lambda db, index: "1 chunk")
+    monkeypatch.setattr(pg_backup, "verify_all", lambda dbs: [db for db in dbs if db in unverified])
+    monkeypatch.setattr(pg_backup, "apply_retention", retained.append)
+    monkeypatch.setattr(pg_backup, "send_discord_notification", lambda *args: None)
+    return pg_backup.main(), retained
+
+
+def test_retention_skips_databases_whose_backup_failed_verification(monkeypatch):
+    status, retained = run_main(monkeypatch, ["finance", "metabase"], unverified=["finance"])
+
+    assert status == 1
+    assert retained == [["metabase"]]
+
+
+def test_main_with_no_databases_configured(monkeypatch):
+    status, retained = run_main(monkeypatch, [], unverified=[])
+
+    assert status == 0
+    assert retained == [[]]
@@ -1,129 +1,457 @@
 """
 Discord Alert Bot
 
-A Flask-based web service that receives HTTP POST requests and forwards them
-as messages to a specified Discord channel. The bot runs both a Flask web server
-and a Discord client concurrently using threading.
+An aiohttp web service that receives HTTP POST requests and forwards them
+as messages to Discord channels. The web server runs on the Discord client's
+own asyncio event loop, so there is no extra thread and no cross-thread queue.
+One process serves any number of channels; each channel has its own dispatch
+queue and sender task, so a backed-off channel does not hold up the others.
 
 Environment Variables:
-    CHANNEL_ID: Discord channel ID where messages will be sent
+    CHANNELS: Comma separated channel keys and Discord channel IDs,
+        e.g. "general=123,finance=456"
+    DEFAULT_CHANNEL: Channel key used when a request names none
+        (defaults to the first entry of CHANNELS)
+    CHANNEL_ID: Single channel ID, used as key "default" when CHANNELS is unset
     BOT_TOKEN: Discord bot token for authentication
+    MAX_QUEUE_SIZE: Alerts held per channel before new ones are rejected (1000)
+    MAX_SEND_ATTEMPTS: Send attempts per alert before it is dropped (5)
+    LOG_LEVEL: Python logging level (INFO)
 
 Usage:
-    Send POST requests to /alert endpoint with JSON payload:
-    {"message": "Your alert message here"}
+    Send POST requests to /alert or /alert/<channel> with JSON payload:
+    {"message": "Your alert message here", "priority": "critical"}
+
+    Send several alerts in one request to /alerts or /alerts/<channel> with
+    either a JSON array or {"messages": [...]}. Each item is a string or an
+    object shaped like the /alert payload.
+
+    The channel is taken from the payload's 'channel' field, then the URL
+    path, then DEFAULT_CHANNEL.
+
+    priority is optional and one of critical, high, normal (default) or low.
+    Higher priorities are always sent first; a waiting lower priority is
+    guaranteed a send after MAX_CONSECUTIVE_SKIPS higher-priority sends.
+
+    GET /metrics serves Prometheus metrics for queue depth, queue wait,
+    Discord API latency, errors, retries and dropped alerts.
 """
 
 from discord.channel import TextChannel
-from flask import Flask, request
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
 import discord
 import asyncio
-from queue import Queue, Empty
+from collections import deque
+from queue import Empty, Full
 import os
-import threading
 import logging
-from typing import Optional, Any
+import time
+from typing import Any, NamedTuple
+
+# Priority lanes, highest first
+PRIORITIES = ("critical", "high", "normal", "low")
+DEFAULT_PRIORITY = "normal"
+
+# A waiting lane is served after being passed over this many times in a row
+MAX_CONSECUTIVE_SKIPS = 5
+
+# Self metrics, labelled by channel key
+RECEIVED = Counter(
+    "alert_bot_received_total", "Alerts accepted over HTTP", ["channel", "priority"]
+)
+SENT = Counter("alert_bot_sent_total", "Alerts delivered to Discord", ["channel", "priority"])
+QUEUE_WAIT = Histogram(
+    "alert_bot_queue_wait_seconds",
+    "Time from enqueue to successful send",
+    ["channel", "priority"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+SEND_LATENCY = Histogram(
+    "alert_bot_discord_send_seconds",
+    "Discord API latency of one send attempt",
+    ["channel"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_ERRORS = Counter(
+    "alert_bot_discord_http_errors_total",
+    "Discord API errors by HTTP status",
+    ["channel", "status"],
+)
+RATE_LIMITED = Counter(
+    "alert_bot_discord_rate_limited_total", "Discord API 429 responses", ["channel"]
+)
+RETRIES = Counter("alert_bot_retries_total", "Send attempts that were retried", ["channel"])
+DROPPED = Counter(
+    "alert_bot_dropped_total", "Alerts that were never delivered", ["channel", "reason"]
+)
+
+
+class QueuedAlert(NamedTuple):
+    message: str
+    enqueued_at: float
+    attempts: int = 0
+
+
+class PriorityAlertQueue:
+    """
+    Asyncio queue with one FIFO lane per priority level.
+
+    get() always serves the highest non-empty lane, except that a lane which
+    has been passed over MAX_CONSECUTIVE_SKIPS times in a row is served next,
+    so routine alerts are delayed behind a burst but never starved.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._lanes: dict[str, deque[QueuedAlert]] = {p: deque() for p in PRIORITIES}
+        self._skips: dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._not_empty = asyncio.Event()
+
+    def put(self, alert: QueuedAlert, priority: str = DEFAULT_PRIORITY):
+        """Queue an alert at the tail of its lane or raise queue.Full."""
+        if self.free() < 1:
+            raise Full
+        self._lanes[priority].append(alert)
+        self._not_empty.set()
+
+    def put_front(self, alert: QueuedAlert, priority: str = DEFAULT_PRIORITY):
+        """Return an alert to the head of its lane, e.g. for a retry."""
+        self._lanes[priority].appendleft(alert)
+        self._not_empty.set()
+
+    def get_nowait(self) -> tuple[str, QueuedAlert]:
+        """Return (priority, alert) or raise queue.Empty."""
+        waiting = [p for p in PRIORITIES if self._lanes[p]]
+        if not waiting:
+            raise Empty
+        starved = [p for p in waiting if self._skips[p] >= MAX_CONSECUTIVE_SKIPS]
+        chosen = starved[0] if starved else waiting[0]
+        for p in waiting:
+            self._skips[p] = 0 if p == chosen else self._skips[p] + 1
+        return chosen, self._lanes[chosen].popleft()
+
+    async def get(self) -> tuple[str, QueuedAlert]:
+        """Wait until an alert is available and return (priority, alert)."""
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+
+    def qsize(self, priority: str | None = None) -> int:
+        if priority is not None:
+            return len(self._lanes[priority])
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def free(self) -> int:
+        """Slots left before put() raises queue.Full (unbounded if maxsize is 0)."""
+        if self.maxsize <= 0:
+            return 2**31
+        return self.maxsize - self.qsize()
+
+
+class ChannelDispatcher:
+    """
+    Dispatch state for one channel key: its own priority queue, resolved
+    channel object and sender task. Retry backoff only pauses this channel.
+    """
+
+    def __init__(self, key: str, channel_id: int):
+        self.key = key
+        self.channel_id = channel_id
+        self.queue = PriorityAlertQueue(MAX_QUEUE_SIZE)
+        self.channel: TextChannel | None = None
+
+    def put(self, message: str, priority: str):
+        """Queue a new alert; raises queue.Full and counts the drop when full."""
+        try:
+            self.queue.put(QueuedAlert(message, time.monotonic()), priority)
+        except Full:
+            DROPPED.labels(self.key, "queue_full").inc()
+            raise
+        RECEIVED.labels(self.key, priority).inc()
+
+    async def resolve(self):
+        """Resolve and cache the channel once, retrying until it succeeds."""
+        while self.channel is None:
+            self.channel = client.get_channel(self.channel_id)
+            if self.channel is not None:
+                break
+            logger.info(f"Channel {self.key} ({self.channel_id}) not in cache, fetching from API")
+            try:
+                self.channel = await client.fetch_channel(self.channel_id)
+            except Exception as e:
+                logger.error(f"Failed to fetch channel {self.key} ({self.channel_id}): {e}")
+                await asyncio.sleep(CHANNEL_RESOLVE_RETRY_SECONDS)
+
+    async def run(self):
+        """
+        Background task that processes messages from this channel's queue.
+        Runs continuously in the Discord bot's event loop.
+        """
+        await client.wait_until_ready()
+        await self.resolve()
+
+        while not client.is_closed():
+            # Sleeps until a handler queues something instead of polling
+            priority, alert = await self.queue.get()
+            start = time.monotonic()
+            try:
+                await self.channel.send(alert.message)
+                now = time.monotonic()
+                SEND_LATENCY.labels(self.key).observe(now - start)
+                QUEUE_WAIT.labels(self.key, priority).observe(now - alert.enqueued_at)
+                SENT.labels(self.key, priority).inc()
+                logger.info(f"Sent {priority} message to channel {self.key}")
+            except discord.HTTPException as e:
+                SEND_LATENCY.labels(self.key).observe(time.monotonic() - start)
+                HTTP_ERRORS.labels(self.key, str(e.status)).inc()
+                if e.status == 429:
+                    RATE_LIMITED.labels(self.key).inc()
+                logger.error(f"Discord API error sending message to {self.key}: {e}")
+                alert = alert._replace(attempts=alert.attempts + 1)
+                if alert.attempts >= MAX_SEND_ATTEMPTS:
+                    DROPPED.labels(self.key, "retries_exhausted").inc()
+                    logger.error(f"Dropping message to {self.key} after {alert.attempts} attempts")
+                    continue
+                RETRIES.labels(self.key).inc()
+                # Re-queue at the head of its lane so ordering is kept on retry
+                self.queue.put_front(alert, priority)
+                await asyncio.sleep(5.0)  # Back off before retrying
+            except Exception as e:
+                DROPPED.labels(self.key, "unexpected_error").inc()
+                logger.error(f"Unexpected error sending message to {self.key}: {e}")
+
+
+class QueueDepthCollector:
+    """Reports each channel's queue depth per priority at scrape time."""
 
-# Initialize Flask app and Discord client
-app = Flask(__name__)
-client = discord.Client(intents=discord.Intents.default())
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "alert_bot_queue_depth",
+            "Alerts waiting to be sent",
+            labels=["channel", "priority"],
+        )
+        for key, dispatcher in dispatchers.items():
+            for priority in PRIORITIES:
+                depth.add_metric([key, priority], dispatcher.queue.qsize(priority))
+        yield depth
 
-# Message queue for thread-safe communication
-alert_queue = Queue()
+
+class AlertClient(discord.Client):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.dispatcher_tasks: list[asyncio.Task] = []
+
+    async def setup_hook(self):
+        """
+        Called once after login, unlike on_ready which fires again on every
+        gateway reconnect. Starts one sender task per channel.
+        """
+        # Keep references: the loop only holds weak ones to running tasks
+        self.dispatcher_tasks = [
+            self.loop.create_task(dispatcher.run(), name=f"dispatch-{dispatcher.key}")
+            for dispatcher in dispatchers.values()
+        ]
+
+    async def close(self):
+        """Stop the sender tasks before closing the Discord connection."""
+        for task in self.dispatcher_tasks:
+            task.cancel()
+        await asyncio.gather(*self.dispatcher_tasks, return_exceptions=True)
+        self.dispatcher_tasks = []
+        await super().close()
+
+
+def parse_channels(raw: str) -> dict[str, int]:
+    """Parse "general=123,finance=456" into {"general": 123, "finance": 456}."""
+    channels = {}
+    for entry in raw.split(","):
+        if entry.strip() == "":
+            continue
+        key, sep, value = entry.partition("=")
+        if sep == "" or key.strip() == "" or not value.strip().isdigit():
+            raise ValueError(f"Invalid CHANNELS entry {entry!r}, expected key=channel_id")
+        channels[key.strip()] = int(value.strip())
+    return channels
+
+
+# Seconds between attempts to fetch a channel that could not be resolved
+CHANNEL_RESOLVE_RETRY_SECONDS = 30.0
+
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "1000"))
+MAX_SEND_ATTEMPTS = int(os.getenv("MAX_SEND_ATTEMPTS", "5"))
+
+# Initialize web app and Discord client
+app = web.Application()
+client = AlertClient(intents=discord.Intents.default())
 
 # Load environment variables
+channels_str = os.getenv("CHANNELS", "")
 channel_id_str = os.getenv("CHANNEL_ID", "")
 bot_token = os.getenv("BOT_TOKEN", "")
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Validate required environment variables
-if channel_id_str == "" or bot_token == "":
-    raise ValueError("Environment variables CHANNEL_ID and BOT_TOKEN must be set")
+if (channels_str == "" and channel_id_str == "") or bot_token == "":
+    raise ValueError("Environment variables CHANNELS (or CHANNEL_ID) and BOT_TOKEN must be set")
+
+channels = parse_channels(channels_str) if channels_str != "" else {"default": int(channel_id_str)}
+default_channel = os.getenv("DEFAULT_CHANNEL", next(iter(channels)))
+if default_channel not in channels:
+    raise ValueError(f"DEFAULT_CHANNEL {default_channel!r} is not one of {', '.join(channels)}")
 
-channel_id = int(channel_id_str)
+# Per-channel queues shared by the web handlers and the senders, all on one loop
+dispatchers = {key: ChannelDispatcher(key, cid) for key, cid in channels.items()}
+REGISTRY.register(QueueDepthCollector())
 
-@app.route("/alert", methods=["POST"])
-def send_alert():
+
+def parse_alert(item: Any, channel: str = default_channel) -> tuple[str, str, str]:
+    """
+    Turn one alert payload into (channel, priority, message).
+
+    Accepts a bare string or an object with 'message' and optional 'priority'
+    and 'channel'; channel defaults to the one given by the caller.
+    Raises ValueError describing what is wrong with the payload.
     """
-    Flask endpoint to receive alert messages and forward them to Discord.
+    if isinstance(item, str):
+        return channel, DEFAULT_PRIORITY, item
+    if not isinstance(item, dict):
+        raise ValueError("Expected JSON object")
+
+    message = item.get("message", "No message")
+    priority = item.get("priority", DEFAULT_PRIORITY)
+    channel = item.get("channel", channel)
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    if not isinstance(channel, str) or channel not in dispatchers:
+        raise ValueError(f"channel must be one of {', '.join(dispatchers)}")
+    return channel, priority, str(message)
+
 
-    Expects a POST request with JSON payload containing a 'message' field.
-    The message is queued for processing by the Discord bot.
+async def read_json(request: web.Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Expected JSON body")
+
+
+def path_channel(request: web.Request) -> str:
+    """Channel key from the URL path, or the default channel."""
+    channel = request.match_info.get("channel", default_channel)
+    if channel not in dispatchers:
+        raise web.HTTPNotFound(text=f"Unknown channel {channel}")
+    return channel
+
+
+async def send_alert(request: web.Request) -> web.Response:
+    """
+    Endpoint to receive a single alert message and forward it to Discord.
 
-    Returns:
-        tuple: Response message and HTTP status code
+    Expects a POST request with JSON payload containing a 'message' field and
+    optional 'priority' and 'channel' fields. The message is queued in its
+    channel's priority lane for processing by the Discord bot.
     """
-    data: Optional[dict[str, Any]] = request.get_json()
+    channel = path_channel(request)
+    data = await read_json(request)
     if not isinstance(data, dict):
         logger.error(f"Expected JSON object: {data}")
-        return "Expected JSON object", 400
+        return web.Response(text="Expected JSON object", status=400)
 
-    message = data.get("message", "No message")
-    logger.info(f"Received message: {message}")
+    try:
+        channel, priority, message = parse_alert(data, channel)
+    except ValueError as e:
+        logger.error(f"Invalid alert {data}: {e}")
+        return web.Response(text=str(e), status=400)
+    logger.info(f"Received {priority} message for {channel}: {message}")
 
-    # Queue the message—Flask returns immediately
-    alert_queue.put(message)
-    return "Sent", 202
+    # Queue the message and return immediately
+    try:
+        dispatchers[channel].put(message, priority)
+    except Full:
+        logger.error(f"Queue for {channel} is full, rejecting message")
+        return web.Response(text=f"Queue for {channel} is full", status=503)
+    return web.Response(text="Sent", status=202)
 
 
-@client.event
-async def on_ready():
+async def send_alerts(request: web.Request) -> web.Response:
     """
-    Discord client event handler called when the bot connects.
-    Starts the background alert processor task.
+    Bulk endpoint: queue a whole batch of alerts from one request.
+
+    The body is a JSON array, or an object with a 'messages' array. The batch
+    is validated as a whole, so either every alert is queued or none are.
     """
-    logger.info(f"Logged in as {client.user}")
-    client.loop.create_task(process_alerts())
+    channel = path_channel(request)
+    data = await read_json(request)
+    items = data.get("messages") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        logger.error(f"Expected JSON array of messages: {data}")
+        return web.Response(text="Expected JSON array of messages", status=400)
 
+    try:
+        alerts = [parse_alert(item, channel) for item in items]
+    except ValueError as e:
+        logger.error(f"Invalid alert batch: {e}")
+        return web.Response(text=str(e), status=400)
 
-async def process_alerts():
-    """
-    Background task that processes messages from the alert queue.
-    Runs continuously in the Discord bot's event loop.
-    """
-    await client.wait_until_ready()
+    needed: dict[str, int] = {}
+    for channel, _, _ in alerts:
+        needed[channel] = needed.get(channel, 0) + 1
+    for channel, count in needed.items():
+        if dispatchers[channel].queue.free() < count:
+            DROPPED.labels(channel, "queue_full").inc(count)
+            logger.error(f"Queue for {channel} is full, rejecting batch")
+            return web.Response(text=f"Queue for {channel} is full", status=503)
 
-    # Fetch and cache the channel once instead of on every message
-    channel: TextChannel = client.get_channel(channel_id)
-    if channel is None:
-        logger.error(f"Channel {channel_id} not found in cache, fetching from API")
-        try:
-            channel = await client.fetch_channel(channel_id)
-        except Exception as e:
-            logger.error(f"Failed to fetch channel {channel_id}: {e}")
-            return
+    for channel, priority, message in alerts:
+        dispatchers[channel].put(message, priority)
+    logger.info(f"Received batch of {len(alerts)} messages")
+    return web.Response(text=f"Sent {len(alerts)}", status=202)
 
-    while not client.is_closed():
-        try:
-            # Non-blocking check for queued messages
-            message = alert_queue.get_nowait()
-            try:
-                await channel.send(message)
-                logger.info(f"Sent message to channel {channel_id}")
-            except discord.HTTPException as e:
-                logger.error(f"Discord API error sending message: {e}")
-                # Re-queue the message for retry
-                alert_queue.put(message)
-                await asyncio.sleep(5.0)  # Back off before retrying
-            except Exception as e:
-                logger.error(f"Unexpected error sending message to Discord: {e}")
-        except Empty:
-            # Queue is empty, sleep briefly before checking again
-            await asyncio.sleep(0.5)
 
+async def metrics(request: web.Request) -> web.Response:
+    """Prometheus scrape endpoint."""
+    return web.Response(
+        body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
 
-def run_flask():
-    """Run Flask web server in a separate thread."""
-    app.run(host="0.0.0.0", port=5000)
 
+app.router.add_get("/metrics", metrics)
+app.router.add_post("/alert", send_alert)
+app.router.add_post("/alert/{channel}", send_alert)
+app.router.add_post("/alerts", send_alerts)
+app.router.add_post("/alerts/{channel}", send_alerts)
 
-if __name__ == "__main__":
-    # Start Flask in background thread
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
 
-    # Run Discord bot in main thread
-    client.run(bot_token)
\ No newline at end of file
+@client.event
+async def on_ready():
+    """Discord client event handler called when the bot connects."""
+    logger.info(f"Logged in as {client.user}, serving channels {', '.join(channels)}")
+
+
+async def main():
+    """Serve HTTP and run the Discord client on the same event loop."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host="0.0.0.0", port=5000).start()
+    try:
+        async with client:
+            await client.start(bot_token)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from queue import Empty, Full
+
+import pytest
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+os.environ.setdefault("CHANNELS", "general=123,finance=456")
+os.environ.setdefault("BOT_TOKEN", "test-token")
+
+from alert_bot import (
+    MAX_CONSECUTIVE_SKIPS,
+    ChannelDispatcher,
+    PriorityAlertQueue,
+    QueuedAlert,
+)
+
+
+def alert(message: str) -> QueuedAlert:
+    return QueuedAlert(message, enqueued_at=0.0)
+
+
+def drain(queue: PriorityAlertQueue) -> list[str]:
+    messages = []
+    while True:
+        try:
+            _, queued = queue.get_nowait()
+        except Empty:
+            return messages
+        messages.append(queued.message)
+
+
+def test_drains_highest_priority_first_and_fifo_within_a_lane():
+    queue = PriorityAlertQueue()
+    for message, priority in [
+        ("low-1", "low"),
+        ("normal-1", "normal"),
+        ("low-2", "low"),
+        ("high-1", "high"),
+        ("normal-2", "normal"),
+        ("critical-1", "critical"),
+    ]:
+        queue.put(alert(message), priority)
+
+    assert drain(queue) == ["critical-1", "high-1", "normal-1", "normal-2", "low-1", "low-2"]
+
+
+def test_retry_goes_back_to_the_head_of_its_lane():
+    queue = PriorityAlertQueue()
+    queue.put(alert("first"), "high")
+    queue.put(alert("second"), "high")
+
+    priority, retried = queue.get_nowait()
+    queue.put_front(retried, priority)
+
+    assert drain(queue) == ["first", "second"]
+
+
+def test_waiting_lane_is_served_after_max_consecutive_skips():
+    queue = PriorityAlertQueue()
+    queue.put(alert("routine"), "low")
+    for i in range(MAX_CONSECUTIVE_SKIPS + 3):
+        queue.put(alert(f"burst-{i}"), "critical")
+
+    served = drain(queue)
+
+    assert served.index("routine") == MAX_CONSECUTIVE_SKIPS
+    assert [m for m in served if m != "routine"] == [
+        f"burst-{i}" for i in range(MAX_CONSECUTIVE_SKIPS + 3)
+    ]
+
+
+def test_bounded_queue_rejects_when_full():
+    queue = PriorityAlertQueue(maxsize=2)
+    queue.put(alert("a"), "low")
+    queue.put(alert("b"), "critical")
+
+    assert queue.free() == 0
+    with pytest.raises(Full):
+        queue.put(alert("c"), "critical")
+    assert queue.qsize() == 2
+
+    queue.get_nowait()
+    queue.put(alert("c"), "critical")
+    assert drain(queue) == ["c", "a"]
+
+
+def test_dispatcher_counts_alerts_rejected_by_a_full_queue(monkeypatch):
+    monkeypatch.setattr("alert_bot.MAX_QUEUE_SIZE", 1)
+    dispatcher = ChannelDispatcher("general", 123)
+    labels = {"channel": "general", "reason": "queue_full"}
+    before = REGISTRY.get_sample_value("alert_bot_dropped_total", labels) or 0
+
+    dispatcher.put("kept", "normal")
+    with pytest.raises(Full):
+        dispatcher.put("rejected", "critical")
+
+    assert REGISTRY.get_sample_value("alert_bot_dropped_total", labels) == before + 1
+    assert dispatcher.queue.qsize() == 1
+
+
+def test_get_waits_for_a_put():
+    async def scenario():
+        queue = PriorityAlertQueue()
+        waiter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        queue.put(alert("late"), "normal")
+        priority, queued = await asyncio.wait_for(waiter, timeout=1)
+        return priority, queued.message
+
+    assert asyncio.run(scenario()) == ("normal", "late")
@@ -1,14 +1,316 @@
-import discord
-import subprocess
+import asyncio
+import math
 import os
+import time
+from collections.abc import Callable
 
-intents = discord.Intents.default()
-client = discord.Client(intents=intents)
-tree = discord.app_commands.CommandTree(client)
+import aiohttp
+import discord
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
 
 GUILD_ID = os.getenv("GUILD_ID")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+KASA_METRICS_URL = os.getenv(
+    "KASA_METRICS_URL",
+    "http://kasa-flask-server-exporter.kasa-flask-server:9101/metrics",
+)
+# Every /metrics hit makes the exporter sweep all plugs, so share results briefly
+USAGE_CACHE_TTL_SECONDS = float(os.getenv("USAGE_CACHE_TTL_SECONDS", "30"))
+USAGE_TOP_N = int(os.getenv("USAGE_TOP_N", "5"))
+# A full exporter sweep can take a while when a plug is retrying
+KASA_FETCH_TIMEOUT_SECONDS = float(os.getenv("KASA_FETCH_TIMEOUT_SECONDS", "90"))
+
+# Historical rollups come from Prometheus, never from the devices
+PROMETHEUS_URL = os.getenv(
+    "PROMETHEUS_URL", "http://prometheus-svc.prometheus.svc.cluster.local:9090"
+)
+# Only the scraped series; the exporter's push mode writes the same readings
+# again under job="kasa_exporter_push"
+KASA_PROMETHEUS_JOB = os.getenv("KASA_PROMETHEUS_JOB", "kasa_exporter")
+# Matches the kasa exporter's scrape interval, so every sample is used once
+USAGE_STEP_SECONDS = int(os.getenv("USAGE_STEP_SECONDS", "300"))
+USAGE_PERIODS = {"24h": 24 * 3600, "7d": 7 * 24 * 3600, "30d": 30 * 24 * 3600}
+
+
+class EnergyClient(discord.Client):
+    """Discord client that owns one pooled HTTP session for its lifetime."""
+
+    session: aiohttp.ClientSession | None = None
+
+    async def setup_hook(self):
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=KASA_FETCH_TIMEOUT_SECONDS),
+            connector=aiohttp.TCPConnector(limit=4, ttl_dns_cache=300),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        await super().close()
+
+
+intents = discord.Intents.default()
+client = EnergyClient(intents=intents)
+tree = discord.app_commands.CommandTree(client)
+
+
+class Usage:
+    """Parsed snapshot of the kasa exporter's metrics."""
+
+    def __init__(self, watts: dict[str, float], price: float | None):
+        self.watts = watts
+        self.price = price
+
+    @property
+    def total_watts(self) -> float:
+        return sum(self.watts.values())
+
+    def top(self, n: int) -> list[tuple[str, float]]:
+        return sorted(self.watts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def device_name(labels: dict[str, str]) -> str:
+    """Display name of a kasapower_watts series; HS300 outlets are prefixed with their strip."""
+    device = labels.get("device", "unknown")
+    strip = labels.get("strip", "")
+    return f"{strip}/{device}" if strip else device
+
+
+def parse_usage(text: str) -> Usage:
+    """Parse Prometheus text exposition into per-device watts and the current price."""
+    watts = {}
+    price = None
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name == "kasapower_watts":
+                watts[device_name(sample.labels)] = sample.value
+            elif sample.name == "electricity_price":
+                price = sample.value
+    return Usage(watts, price)
+
+
+class UsageCache:
+    """
+    Short-TTL cache in front of the exporter fetch.
+
+    Concurrent callers that miss the cache await the same in-flight fetch
+    (single flight) instead of each triggering a device sweep. Failures are
+    not cached, so the next call retries.
+    """
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._usage: Usage | None = None
+        self._fetched_at = 0.0
+        self._inflight: asyncio.Task | None = None
+
+    async def get(self) -> Usage:
+        if self._usage is not None and self.clock() - self._fetched_at < self.ttl:
+            return self._usage
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._fetch())
+        # shield so one cancelled interaction does not cancel the shared fetch
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> Usage:
+        try:
+            async with client.session.get(KASA_METRICS_URL) as response:
+                response.raise_for_status()
+                usage = parse_usage(await response.text())
+            self._usage = usage
+            self._fetched_at = self.clock()
+            return usage
+        finally:
+            self._inflight = None
+
+
+usage_cache = UsageCache(USAGE_CACHE_TTL_SECONDS)
+
+
+class Rollup:
+    """Energy and cost per device over one period."""
+
+    def __init__(self, period: str, kwh: dict[str, float], cost: dict[str, float]):
+        self.period = period
+        self.kwh = kwh
+        self.cost = cost
+
+
+async def query_range(query: str, start: int, end: int, step: int) -> list[dict]:
+    """Run a Prometheus range query and return its result series."""
+    params = {"query": query, "start": start, "end": end, "step": step}
+    async with client.session.get(
+        f"{PROMETHEUS_URL}/api/v1/query_range", params=params
+    ) as response:
+        response.raise_for_status()
+        body = await response.json()
+    if body.get("status") != "success":
+        raise RuntimeError(f"Prometheus query failed: {body.get('error')}")
+    return body["data"]["result"]
+
+
+def align(values: list, start: int, step: int, n: int) -> np.ndarray:
+    """Place [timestamp, "value"] pairs onto an n point grid, NaN where missing."""
+    out = np.full(n, np.nan)
+    if values:
+        pairs = np.array(values, dtype=float)
+        idx = np.rint((pairs[:, 0] - start) / step).astype(int)
+        keep = (idx >= 0) & (idx < n)
+        out[idx[keep]] = pairs[keep, 1]
+    return out
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last known value forward over NaN gaps."""
+    idx = np.where(np.isnan(values), 0, np.arange(values.size))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def fill_gaps(values: np.ndarray) -> np.ndarray:
+    """forward_fill, plus the first known value carried back over a leading gap; all NaN stays NaN."""
+    filled = forward_fill(values)
+    known = np.flatnonzero(~np.isnan(filled))
+    if known.size:
+        filled[: known[0]] = filled[known[0]]
+    return filled
+
+
+def integrate(watts: np.ndarray, price: np.ndarray, step: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Trapezoidal integration of a devices x time watts matrix.
+
+    Returns per-device kWh and CAD cost. Intervals with a missing endpoint are
+    skipped rather than guessed; the price of an interval is the price at its
+    start, since time-of-use rates only change on the hour. The price must
+    already be gap-filled: an interval without a price makes the cost NaN
+    rather than free.
+    """
+    mid = (watts[:, :-1] + watts[:, 1:]) / 2
+    joules = np.where(np.isnan(mid), 0.0, mid) * step
+    kwh = joules.sum(axis=1) / 3.6e6
+    cost = (joules * price[:-1]).sum(axis=1) / 3.6e6
+    return kwh, cost
+
+
+async def compute_rollup(period: str, end: int) -> Rollup:
+    step = USAGE_STEP_SECONDS
+    start = end - USAGE_PERIODS[period]
+    n = (end - start) // step + 1
+    power_series, price_series = await asyncio.gather(
+        query_range(
+            f'max by (device, strip) (kasapower_watts{{job="{KASA_PROMETHEUS_JOB}"}})',
+            start,
+            end,
+            step,
+        ),
+        query_range(f'max(electricity_price{{job="{KASA_PROMETHEUS_JOB}"}})', start, end, step),
+    )
+
+    devices = [device_name(series["metric"]) for series in power_series]
+    if not devices:
+        return Rollup(period, {}, {})
+    watts = np.vstack([align(series["values"], start, step, n) for series in power_series])
+    price = align(price_series[0]["values"] if price_series else [], start, step, n)
+
+    kwh, cost = integrate(watts, fill_gaps(price), step)
+    # max by (device, strip) leaves one series per outlet, and outlets of
+    # different strips have different names
+    return Rollup(period, dict(zip(devices, kwh.tolist())), dict(zip(devices, cost.tolist())))
+
+
+class RollupCache:
+    """
+    Rollups keyed by period and time bucket.
+
+    The range end is floored to USAGE_STEP_SECONDS, so every command within
+    one bucket asks for the same range and reuses the same result. Like
+    UsageCache, concurrent misses share one in-flight computation.
+    """
+
+    def __init__(self):
+        self._rollups: dict[str, tuple[int, Rollup]] = {}
+        self._inflight: dict[tuple[str, int], asyncio.Task] = {}
+
+    async def get(self, period: str) -> Rollup:
+        end = int(time.time()) // USAGE_STEP_SECONDS * USAGE_STEP_SECONDS
+        cached = self._rollups.get(period)
+        if cached is not None and cached[0] == end:
+            return cached[1]
+        key = (period, end)
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.create_task(self._compute(period, end))
+        return await asyncio.shield(self._inflight[key])
+
+    async def _compute(self, period: str, end: int) -> Rollup:
+        try:
+            rollup = await compute_rollup(period, end)
+            self._rollups[period] = (end, rollup)
+            return rollup
+        finally:
+            del self._inflight[(period, end)]
+
+
+rollup_cache = RollupCache()
+
+
+def format_usage(usage: Usage) -> str:
+    if not usage.watts:
+        return "No usage data found."
+
+    lines = [f"Total: **{usage.total_watts:.0f} W**"]
+    if usage.price is not None:
+        cost_per_hour = usage.total_watts / 1000 * usage.price
+        lines.append(f"Price: ${usage.price:.3f}/kWh (≈ ${cost_per_hour:.3f}/h)")
+
+    top = usage.top(USAGE_TOP_N)
+    lines.append(f"Top {len(top)}:")
+    lines.extend(f"**{device}**: {value:.0f} W" for device, value in top)
+
+    rest = len(usage.watts) - len(top)
+    if rest > 0:
+        rest_watts = usage.total_watts - sum(value for _, value in top)
+        lines.append(f"+ {rest} more devices using {rest_watts:.0f} W")
+    return "\n".join(lines)
+
+
+def format_rollup(rollup: Rollup) -> str:
+    if not rollup.kwh:
+        return "No usage data found."
+
+    total_kwh = sum(rollup.kwh.values())
+    total_cost = sum(rollup.cost.values())
+    # NaN when prometheus had no price at all for the period
+    if math.isnan(total_cost):
+        lines = [f"Total: **{total_kwh:.2f} kWh** (no price data)"]
+        top = sorted(rollup.kwh, key=rollup.kwh.get, reverse=True)[:USAGE_TOP_N]
+        lines.append(f"Top {len(top)}:")
+        lines.extend(f"**{device}**: {rollup.kwh[device]:.2f} kWh" for device in top)
+        rest = len(rollup.kwh) - len(top)
+        if rest > 0:
+            rest_kwh = total_kwh - sum(rollup.kwh[device] for device in top)
+            lines.append(f"+ {rest} more devices using {rest_kwh:.2f} kWh")
+        return "\n".join(lines)
+
+    lines = [f"Total: **{total_kwh:.2f} kWh** (${total_cost:.2f} CAD)"]
+
+    top = sorted(rollup.cost, key=rollup.cost.get, reverse=True)[:USAGE_TOP_N]
+    lines.append(f"Top {len(top)}:")
+    lines.extend(
+        f"**{device}**: {rollup.kwh[device]:.2f} kWh (${rollup.cost[device]:.2f})"
+        for device in top
+    )
+
+    rest = len(rollup.kwh) - len(top)
+    if rest > 0:
+        rest_cost = total_cost - sum(rollup.cost[device] for device in top)
+        lines.append(f"+ {rest} more devices costing ${rest_cost:.2f}")
+    return "\n".join(lines)
+
+
 @client.event
 async def on_ready():
     print(f'Logged in as {client.user}')
@@ -19,23 +321,26 @@ async def getusage(interaction: discord.Interaction):
     await interaction.response.defer()  # Acknowledge the command
 
     try:
-        result = subprocess.check_output(
-            ['curl', '-ks', 'http://kasa-flask-server-exporter.kasa-flask-server:9101/metrics'],
-            text=True
-        )
-        usage_lines = []
-        for line in result.splitlines():
-            if line.startswith("kasapower_watts"):
-                parts = line.split('"')
-                if len(parts) > 1:
-                    device = parts[1]
-                    value = line.split()[-1]
-                    usage_lines.append(f"**{device}**: {value} W")
-
-        message = "\n".join(usage_lines) or "No usage data found."
-        await interaction.followup.send(f"🔌 Power Usage:\n{message}")
+        usage = await usage_cache.get()
+        await interaction.followup.send(f"🔌 Power Usage:\n{format_usage(usage)}")
+
+    except Exception as e:
+        await interaction.followup.send(f"Error fetching usage: {str(e)}")
+
+@tree.command(name="usage", description="Energy use and cost over a period", guild=discord.Object(id=GUILD_ID))
+@discord.app_commands.choices(
+    period=[discord.app_commands.Choice(name=p, value=p) for p in USAGE_PERIODS]
+)
+async def usage(interaction: discord.Interaction, period: discord.app_commands.Choice[str]):
+    await interaction.response.defer()  # Acknowledge the command
+
+    try:
+        rollup = await rollup_cache.get(period.value)
+        await interaction.followup.send(f"📊 Usage over {period.value}:\n{format_rollup(rollup)}")
 
     except Exception as e:
         await interaction.followup.send(f"Error fetching usage: {str(e)}")
 
-client.run(BOT_TOKEN)
+
+if __name__ == "__main__":
+    client.run(BOT_TOKEN)
@@ -0,0 +1,162 @@
+import asyncio
+import math
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+os.environ.setdefault("GUILD_ID", "123")
+os.environ.setdefault("BOT_TOKEN", "test-token")
+
+import energy_bot
+from energy_bot import (
+    Rollup,
+    RollupCache,
+    align,
+    compute_rollup,
+    fill_gaps,
+    format_rollup,
+    forward_fill,
+    integrate,
+)
+
+STEP = 300
+START = 1_700_000_100
+
+
+def test_align_places_samples_on_the_grid_and_leaves_gaps_nan():
+    # the second sample is 2s late, the last one is past the grid
+    values = [
+        [START, "100"],
+        [START + STEP + 2, "200"],
+        [START + 3 * STEP, "400"],
+        [START + 9 * STEP, "9"],
+    ]
+
+    aligned = align(values, START, STEP, 4)
+
+    assert aligned[:2].tolist() == [100.0, 200.0]
+    assert math.isnan(aligned[2])
+    assert aligned[3] == 400.0
+
+
+def test_align_without_samples_is_all_nan():
+    assert np.isnan(align([], START, STEP, 3)).all()
+
+
+def test_forward_fill_carries_the_last_value_over_gaps():
+    filled = forward_fill(np.array([np.nan, 1.0, np.nan, np.nan, 2.0, np.nan]))
+
+    assert math.isnan(filled[0])
+    assert filled[1:].tolist() == [1.0, 1.0, 1.0, 2.0, 2.0]
+
+
+def test_fill_gaps_carries_the_first_price_back_over_a_leading_gap():
+    filled = fill_gaps(np.array([np.nan, np.nan, 0.1, np.nan, 0.2]))
+
+    assert filled.tolist() == [0.1, 0.1, 0.1, 0.1, 0.2]
+    assert np.isnan(fill_gaps(np.array([np.nan, np.nan]))).all()
+
+
+def test_integrate_skips_intervals_with_a_missing_reading():
+    # 1 kW for two full intervals, then a gap that is not guessed
+    watts = np.array([[1000.0, 1000.0, 1000.0, np.nan, 1000.0]])
+    price = np.full(5, 0.1)
+
+    kwh, cost = integrate(watts, price, 3600)
+
+    assert kwh.tolist() == pytest.approx([2.0])
+    assert cost.tolist() == pytest.approx([0.2])
+
+
+def test_integrate_prices_each_interval_at_its_start():
+    watts = np.array([[1000.0, 1000.0, 1000.0]])
+    price = np.array([0.1, 0.3, 99.0])  # the last price starts no interval
+
+    _, cost = integrate(watts, price, 3600)
+
+    assert cost.tolist() == pytest.approx([0.4])
+
+
+def test_integrate_leaves_cost_unknown_without_any_price():
+    watts = np.array([[1000.0, 1000.0]])
+
+    kwh, cost = integrate(watts, fill_gaps(np.full(2, np.nan)), 3600)
+
+    assert kwh.tolist() == pytest.approx([1.0])
+    assert math.isnan(cost[0])
+    text = format_rollup(Rollup("24h", {"pc": kwh[0]}, {"pc": cost[0]}))
+    assert "no price data" in text and "nan" not in text
+
+
+def test_compute_rollup_costs_a_range_whose_first_price_is_missing(monkeypatch):
+    end = START + 2 * STEP
+    queries = []
+
+    async def fake_query_range(query, start, end, step):
+        queries.append(query)
+        if query.startswith("max by"):
+            return [
+                {
+                    "metric": {"device": "pc", "strip": "rack"},
+                    "values": [[START + i * STEP, "1200"] for i in range(3)],
+                }
+            ]
+        # the price series only starts at the second step
+        return [{"metric": {}, "values": [[START + STEP, "0.1"], [START + 2 * STEP, "0.1"]]}]
+
+    monkeypatch.setattr(energy_bot, "USAGE_PERIODS", {"10m": 2 * STEP})
+    monkeypatch.setattr(energy_bot, "query_range", fake_query_range)
+
+    rollup = asyncio.run(compute_rollup("10m", end))
+
+    # 1.2 kW for 10 minutes, all of it priced
+    assert rollup.kwh == {"rack/pc": pytest.approx(0.2)}
+    assert rollup.cost == {"rack/pc": pytest.approx(0.02)}
+    assert all('job="kasa_exporter"' in query for query in queries)
+
+
+def test_rollup_cache_shares_one_computation_per_bucket(monkeypatch):
+    calls = []
+
+    async def fake_compute_rollup(period, end):
+        calls.append((period, end))
+        await asyncio.sleep(0.01)
+        return Rollup(period, {"pc": 1.0}, {"pc": 0.1})
+
+    monkeypatch.setattr(energy_bot, "compute_rollup", fake_compute_rollup)
+
+    async def scenario():
+        cache = RollupCache()
+        first, second = await asyncio.gather(cache.get("24h"), cache.get("24h"))
+        third = await cache.get("24h")
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert first is second is third
+
+
+def test_rollup_cache_does_not_keep_failures(monkeypatch):
+    outcomes = [RuntimeError("prometheus down"), Rollup("24h", {}, {})]
+
+    async def fake_compute_rollup(period, end):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(energy_bot, "compute_rollup", fake_compute_rollup)
+
+    async def scenario():
+        cache = RollupCache()
+        with pytest.raises(RuntimeError):
+            await cache.get("24h")
+        return await cache.get("24h")
+
+    assert asyncio.run(scenario()).period == "24h"
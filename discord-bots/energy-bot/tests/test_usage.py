@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+os.environ.setdefault("GUILD_ID", "123")
+os.environ.setdefault("BOT_TOKEN", "test-token")
+
+import energy_bot
+from energy_bot import UsageCache, format_usage, parse_usage
+
+METRICS = """\
+# HELP kasapower_watts Power in watts
+# TYPE kasapower_watts gauge
+kasapower_watts{device="13k",strip="rack1"} 120.0
+kasapower_watts{device="13k",strip="rack2"} 80.0
+kasapower_watts{device="fridge"} 45.0
+# HELP electricity_price Current price in CAD/kWh
+# TYPE electricity_price gauge
+electricity_price 0.098
+# HELP kasa_up 1 if the device answered
+# TYPE kasa_up gauge
+kasa_up{host="10.20.0.40"} 1.0
+"""
+
+
+class FakeResponse:
+    def __init__(self, text: str | Exception):
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if isinstance(self._text, Exception):
+            raise self._text
+
+    async def text(self):
+        await asyncio.sleep(0.01)
+        return self._text
+
+
+class FakeSession:
+    """Answers each get() with the next queued body, or raises it."""
+
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        return FakeResponse(self.bodies.pop(0))
+
+
+@pytest.fixture
+def session(monkeypatch):
+    def install(*bodies):
+        fake = FakeSession(*bodies)
+        monkeypatch.setattr(energy_bot, "client", SimpleNamespace(session=fake))
+        return fake
+
+    return install
+
+
+def test_parse_usage_names_outlets_by_strip_and_reads_the_price():
+    usage = parse_usage(METRICS)
+
+    assert usage.watts == {"rack1/13k": 120.0, "rack2/13k": 80.0, "fridge": 45.0}
+    assert usage.price == 0.098
+    assert usage.total_watts == 245.0
+    assert usage.top(2) == [("rack1/13k", 120.0), ("rack2/13k", 80.0)]
+
+
+def test_parse_usage_without_a_price():
+    usage = parse_usage('kasapower_watts{device="fridge"} 45.0\n')
+
+    assert usage.price is None
+    assert "Price" not in format_usage(usage)
+
+
+def test_cache_serves_a_fetch_until_the_ttl_expires(session):
+    fake = session(METRICS, METRICS.replace("45.0", "50.0"))
+    now = [0.0]
+    cache = UsageCache(30, clock=lambda: now[0])
+
+    async def scenario():
+        first = await cache.get()
+        now[0] = 29.0
+        cached = await cache.get()
+        now[0] = 30.0
+        refreshed = await cache.get()
+        return first, cached, refreshed
+
+    first, cached, refreshed = asyncio.run(scenario())
+
+    assert cached is first
+    assert refreshed.watts["fridge"] == 50.0
+    assert fake.calls == 2
+
+
+def test_concurrent_misses_share_one_fetch(session):
+    fake = session(METRICS)
+    cache = UsageCache(30)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get() for _ in range(5)))
+
+    results = asyncio.run(scenario())
+
+    assert fake.calls == 1
+    assert all(usage is results[0] for usage in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch(session):
+    fake = session(METRICS)
+    cache = UsageCache(30)
+
+    async def scenario():
+        impatient = asyncio.create_task(cache.get())
+        patient = asyncio.create_task(cache.get())
+        await asyncio.sleep(0)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(scenario()).price == 0.098
+    assert fake.calls == 1
+
+
+def test_failed_fetch_is_not_cached(session):
+    fake = session(RuntimeError("exporter down"), METRICS)
+    cache = UsageCache(30)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await cache.get()
+        return await cache.get()
+
+    assert asyncio.run(scenario()).total_watts == 245.0
+    assert fake.calls == 2
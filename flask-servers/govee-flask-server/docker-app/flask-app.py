@@ -3,78 +3,111 @@ from prometheus_client import (
     CollectorRegistry,
     generate_latest,
     CONTENT_TYPE_LATEST,
-    Gauge,
 )
-import asyncio
-import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
-# user config
-NAME = "govee"
-GOVEE_API_KEY = os.getenv("GOVEE_API_KEY")
-GOVEE_DEVICE_ID = os.getenv("GOVEE_DEVICE_ID")
-GOVEE_DEVICE_SKU = os.getenv("GOVEE_DEVICE_SKU")
-GOVEE_BASE_URL = "https://openapi.api.govee.com"
-GOVEE_PROPERTIES_URL_SUFFIX = "/router/api/v1/device/state"
+from govee_api import (
+    GOVEE_API_KEY,
+    GOVEE_BASE_URL,
+    GOVEE_DEVICES_URL_SUFFIX,
+    GOVEE_MAX_CONCURRENCY,
+    GOVEE_PROPERTIES_URL_SUFFIX,
+    PollState,
+    parse_devices,
+    parse_state,
+    state_request_body,
+)
+
+# (connect, read) timeouts so a slow API can never hang the poller
+GOVEE_TIMEOUT = (3.05, 10)
 
 app = Flask(__name__)
+session = requests.Session()
+session.headers.update({"Govee-API-Key": GOVEE_API_KEY, "Content-Type": "application/json"})
+session.mount("https://", HTTPAdapter(pool_maxsize=GOVEE_MAX_CONCURRENCY))
+
+
+def get_devices() -> list[dict]:
+    """List the account's thermo-hygrometers; raises on any failure."""
+    response = session.get(f"{GOVEE_BASE_URL}{GOVEE_DEVICES_URL_SUFFIX}", timeout=GOVEE_TIMEOUT)
+    response.raise_for_status()
+    return parse_devices(response.json())
+
+
+def get_temp_humidity(device: dict) -> dict:
+    """Fetch one reading for a device from the Govee API; raises on any failure."""
+    url = f"{GOVEE_BASE_URL}{GOVEE_PROPERTIES_URL_SUFFIX}"
+    response = session.post(url, json=state_request_body(device), timeout=GOVEE_TIMEOUT)
+    response.raise_for_status()
+    return parse_state(response.json())
+
+
+class Poller:
+    """
+    Polls every Govee thermo-hygrometer in a background thread and reports
+    each reading to a govee_api.PollState.
+
+    /metrics only ever reads that state, so scrapes are instant and a slow
+    or failing API shows up as a growing reading age, not a 500. Devices are
+    polled concurrently, at most GOVEE_MAX_CONCURRENCY at a time.
+    """
+
+    def __init__(self, state: PollState):
+        self.state = state
+        self.executor = ThreadPoolExecutor(max_workers=GOVEE_MAX_CONCURRENCY)
+
+    def refresh_devices(self):
+        if not self.state.device_list_due():
+            return
+        try:
+            devices = get_devices()
+        except Exception as e:
+            print(f"govee device list error ------------ Got Nothing: error: {e}")
+            return
+        interval = self.state.set_devices(devices)
+        print(f"found {len(devices)} govee devices, polling every {interval:.0f}s")
+
+    def poll_device(self, device: dict):
+        label = self.state.label(device)
+        if not self.state.acquire():
+            return
+        try:
+            reading = get_temp_humidity(device)
+        except Exception as e:
+            print(f"govee {label} poll error ------------ Got Nothing: error: {e}")
+            self.state.record_error(label)
+            return
+        self.state.record(label, reading)
+
+    def poll_once(self):
+        self.refresh_devices()
+        list(self.executor.map(self.poll_device, self.state.devices))
+
+    def run(self):
+        while True:
+            started = time.monotonic()
+            self.poll_once()
+            time.sleep(max(0.0, self.state.interval - (time.monotonic() - started)))
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
 
 
-async def get_temp_humidity(request_id: str) -> dict | str:
-    output_dict = {}
-    try:
-        url = f"{GOVEE_BASE_URL}{GOVEE_PROPERTIES_URL_SUFFIX}"
-        headers = {"Govee-API-Key": GOVEE_API_KEY, "Content-Type": "application/json"}
-        body = {
-            "requestId": request_id,
-            "payload": {"sku": GOVEE_DEVICE_SKU, "device": GOVEE_DEVICE_ID},
-        }
-        response = requests.post(url, headers=headers, json=body)
-        data = response.json()["payload"]["capabilities"]
-        for element in data:
-            if element["instance"] == "sensorTemperature":
-                output_dict["temperatureF"] = float(element["state"]["value"])
-            if element["instance"] == "sensorHumidity":
-                output_dict["humidity"] = float(element["state"]["value"])
-        return output_dict
-    except Exception as e:
-        return f"govee response error: {response.status_code} ------------ Got Nothing: error: {e}"
+state = PollState()
+poller = Poller(state)
+registry = CollectorRegistry()
+registry.register(state)
 
 
 @app.route("/metrics")
 def metrics():
-    registry = CollectorRegistry()
-
-    # Run asyncio task inside Flask
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    govee_data = loop.run_until_complete(get_temp_humidity(GOVEE_DEVICE_ID))
-    if type(govee_data) == str:
-        print(f"govee_data: {govee_data}")
-        return (
-            "there was an error in the flask app",
-            500,
-            {"Content-Type": CONTENT_TYPE_LATEST},
-        )
-    else:
-        data = govee_data
-        temp_gauge = Gauge(
-            f"{NAME}_temperature",
-            documentation=f"Temperature in F for the govee device",
-            unit="F",
-            registry=registry,
-        )
-        temp_gauge.set(data["temperatureF"])
-
-        humidity_gauge = Gauge(
-            f"{NAME}_humidity",
-            documentation=f"Humidity in % for the govee device",
-            unit="percentage",
-            registry=registry,
-        )
-        humidity_gauge.set(data["humidity"])
-        return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
 
 if __name__ == "__main__":
+    poller.start()
     app.run(host="0.0.0.0", port=9101)
@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+NAME = "govee"
+GOVEE_API_KEY = os.getenv("GOVEE_API_KEY")
+
+# Govee allows 10,000 API requests per account per day. Polling is spread
+# evenly across the day so only GOVEE_QUOTA_FRACTION of that is ever used,
+# leaving headroom for restarts and other clients on the same key.
+GOVEE_DAILY_REQUEST_QUOTA = int(os.getenv("GOVEE_DAILY_REQUEST_QUOTA", "10000"))
+GOVEE_QUOTA_FRACTION = float(os.getenv("GOVEE_QUOTA_FRACTION", "0.5"))
+GOVEE_POLL_INTERVAL_SECONDS = float(os.getenv("GOVEE_POLL_INTERVAL_SECONDS", "60"))
+# The device list rarely changes, so it is fetched once and refreshed daily
+GOVEE_DEVICE_LIST_REFRESH_SECONDS = float(os.getenv("GOVEE_DEVICE_LIST_REFRESH_SECONDS", "86400"))
+GOVEE_MAX_CONCURRENCY = int(os.getenv("GOVEE_MAX_CONCURRENCY", "4"))
+
+GOVEE_BASE_URL = "https://openapi.api.govee.com"
+GOVEE_DEVICES_URL_SUFFIX = "/router/api/v1/user/devices"
+GOVEE_PROPERTIES_URL_SUFFIX = "/router/api/v1/device/state"
+
+TEMPERATURE_INSTANCE = "sensorTemperature"
+HUMIDITY_INSTANCE = "sensorHumidity"
+
+
+def parse_devices(body: dict) -> list[dict]:
+    """Return the thermo-hygrometers from a device-list response."""
+    return [device for device in body["data"] if is_thermo_hygrometer(device)]
+
+
+def is_thermo_hygrometer(device: dict) -> bool:
+    instances = {c.get("instance") for c in device.get("capabilities", [])}
+    return {TEMPERATURE_INSTANCE, HUMIDITY_INSTANCE} <= instances
+
+
+def device_label(device: dict) -> str:
+    """Name used for the device label, falling back to the device id."""
+    return device.get("deviceName") or device["device"]
+
+
+def device_labels(devices: list[dict]) -> dict[str, str]:
+    """Label of each device by device id; a name shared by several devices gets the id appended."""
+    names = Counter(device_label(device) for device in devices)
+    return {
+        device["device"]: (
+            device_label(device)
+            if names[device_label(device)] == 1
+            else f"{device_label(device)} ({device['device']})"
+        )
+        for device in devices
+    }
+
+
+def state_request_body(device: dict) -> dict:
+    return {
+        "requestId": str(uuid.uuid4()),
+        "payload": {"sku": device["sku"], "device": device["device"]},
+    }
+
+
+def parse_state(body: dict) -> dict:
+    """Pull temperature and humidity out of a device-state response; raises if either is missing."""
+    output_dict = {}
+    for element in body["payload"]["capabilities"]:
+        if element["instance"] == TEMPERATURE_INSTANCE:
+            output_dict["temperatureF"] = float(element["state"]["value"])
+        if element["instance"] == HUMIDITY_INSTANCE:
+            output_dict["humidity"] = float(element["state"]["value"])
+    if set(output_dict) != {"temperatureF", "humidity"}:
+        raise ValueError(f"incomplete govee response: {output_dict}")
+    return output_dict
+
+
+class RequestBudget:
+    """
+    Daily request budget shared by every device on the account.
+
+    Govee's quota is per API key, not per device, so all pollers draw from
+    one counter. poll_interval() spreads a day's budget evenly across the
+    devices, and try_acquire() is the hard stop if polls bunch up anyway
+    (retries, device-list refreshes). The count only lives in memory, so a
+    restart starts the day from zero; what covers restarts is the headroom
+    left by GOVEE_QUOTA_FRACTION.
+    """
+
+    def __init__(
+        self,
+        daily_quota: int,
+        fraction: float,
+        min_interval: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.daily_budget = int(daily_quota * fraction)
+        self.min_interval = min_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.day = self._today()
+        self.used = 0
+
+    def _today(self) -> int:
+        return int(self.clock() // 86400)
+
+    def poll_interval(self, device_count: int, reserved: int = 0) -> float:
+        """Smallest interval at which polling every device stays within the budget."""
+        available = max(1, self.daily_budget - reserved)
+        return max(self.min_interval, 86400 * max(1, device_count) / available)
+
+    def try_acquire(self, count: int = 1) -> bool:
+        with self.lock:
+            today = self._today()
+            if today != self.day:
+                self.day, self.used = today, 0
+            if self.used + count > self.daily_budget:
+                return False
+            self.used += count
+            return True
+
+    def used_today(self) -> int:
+        with self.lock:
+            return self.used if self.day == self._today() else 0
+
+
+class PollState:
+    """
+    Everything a govee poller keeps between rounds: the device list, the
+    last good reading and error count per device, and the request budget.
+
+    The standalone exporter (threads, requests) and the unified exporter's
+    collector (coroutines, aiohttp) only make the HTTP calls and report the
+    outcome here, so both follow the same quota rules and publish the same
+    series. Register it with a CollectorRegistry to serve those series.
+    """
+
+    def __init__(
+        self,
+        budget: RequestBudget | None = None,
+        refresh_seconds: float = GOVEE_DEVICE_LIST_REFRESH_SECONDS,
+    ):
+        self.budget = budget or RequestBudget(
+            GOVEE_DAILY_REQUEST_QUOTA, GOVEE_QUOTA_FRACTION, GOVEE_POLL_INTERVAL_SECONDS
+        )
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.devices: list[dict] = []
+        # device id -> device label, unique across the account
+        self.labels: dict[str, str] = {}
+        self.devices_fetched_at = 0.0
+        self.readings: dict[str, tuple[dict, float]] = {}
+        self.errors: dict[str, int] = {}
+        self.quota_skips = 0
+        self.interval = self.budget.min_interval
+
+    def device_list_due(self) -> bool:
+        """True when the device list is stale and a request for it was taken from the budget."""
+        with self.lock:
+            if self.devices and time.monotonic() - self.devices_fetched_at < self.refresh_seconds:
+                return False
+        return self.budget.try_acquire()
+
+    def set_devices(self, devices: list[dict]) -> float:
+        """
+        Store a fresh device list and forget devices that left it; returns
+        the poll interval that fits the list in the budget.
+        """
+        # one device-list call per refresh period is held back from the budget
+        refreshes_per_day = max(1, int(86400 // self.refresh_seconds))
+        labels = device_labels(devices)
+        current = set(labels.values())
+        with self.lock:
+            self.devices = devices
+            self.labels = labels
+            self.readings = {k: v for k, v in self.readings.items() if k in current}
+            self.errors = {k: v for k, v in self.errors.items() if k in current}
+            self.devices_fetched_at = time.monotonic()
+            self.interval = self.budget.poll_interval(len(devices), reserved=refreshes_per_day)
+            return self.interval
+
+    def label(self, device: dict) -> str:
+        with self.lock:
+            return self.labels.get(device["device"]) or device_label(device)
+
+    def acquire(self) -> bool:
+        """Take one device poll from the budget, counting a quota skip if it is spent."""
+        if self.budget.try_acquire():
+            return True
+        with self.lock:
+            self.quota_skips += 1
+        return False
+
+    def record(self, label: str, reading: dict):
+        with self.lock:
+            self.readings[label] = (reading, time.time())
+
+    def record_error(self, label: str):
+        with self.lock:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def collect(self):
+        with self.lock:
+            labels = list(self.labels.values())
+            readings = dict(self.readings)
+            errors = dict(self.errors)
+            quota_skips = self.quota_skips
+            interval = self.interval
+        now = time.time()
+
+        devices = GaugeMetricFamily(f"{NAME}_devices", "Thermo-hygrometers found on the govee account")
+        devices.add_metric([], len(labels))
+        used = GaugeMetricFamily(
+            f"{NAME}_api_requests_today", "Govee api requests made today out of the daily budget"
+        )
+        used.add_metric([], self.budget.used_today())
+        skips = CounterMetricFamily(
+            f"{NAME}_quota_skips", "Polls skipped because the daily request budget was spent"
+        )
+        skips.add_metric([], quota_skips)
+        poll_interval = GaugeMetricFamily(
+            f"{NAME}_poll_interval_seconds", "Current per-device poll interval chosen to fit the quota"
+        )
+        poll_interval.add_metric([], interval)
+
+        up = GaugeMetricFamily(
+            f"{NAME}_up", "1 if a reading has been received from the govee api", labels=["device"]
+        )
+        poll_errors = CounterMetricFamily(
+            f"{NAME}_poll_errors", "Failed govee api polls since start", labels=["device"]
+        )
+        age = GaugeMetricFamily(
+            f"{NAME}_reading_age_seconds", "Seconds since the last good govee reading", labels=["device"]
+        )
+        temperature = GaugeMetricFamily(
+            f"{NAME}_temperature", "Temperature in F for the govee device", labels=["device"], unit="F"
+        )
+        humidity = GaugeMetricFamily(
+            f"{NAME}_humidity",
+            "Humidity in % for the govee device",
+            labels=["device"],
+            unit="percentage",
+        )
+        for label in labels:
+            up.add_metric([label], 1 if label in readings else 0)
+            poll_errors.add_metric([label], errors.get(label, 0))
+        for label, (reading, reading_time) in readings.items():
+            age.add_metric([label], now - reading_time)
+            temperature.add_metric([label], reading["temperatureF"])
+            humidity.add_metric([label], reading["humidity"])
+        yield from (devices, used, skips, poll_interval, up, poll_errors, age, temperature, humidity)
@@ -0,0 +1,161 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+from govee_api import PollState, RequestBudget, device_labels, parse_state
+
+DAY = 86400
+T0 = 20_000 * DAY + 3600
+
+
+
+def state_body(*capabilities: tuple[str, object]) -> dict:
+    return {
+        "payload": {
+            "capabilities": [
+                {"instance": instance, "state": {"value": value}}
+                for instance, value in capabilities
+            ]
+        }
+    }
+
+
+def thermometer(device_id: str, name: str | None = None) -> dict:
+    device = {"device": device_id, "sku": "H5179"}
+    if name is not None:
+        device["deviceName"] = name
+    return device
+
+
+def make_budget(now: list[float], quota: int = 100, fraction: float = 0.5, min_interval: float = 60):
+    return RequestBudget(quota, fraction, min_interval, clock=lambda: now[0])
+
+
+def test_try_acquire_stops_at_the_daily_budget():
+    budget = make_budget([T0])
+
+    assert budget.daily_budget == 50
+    assert all(budget.try_acquire() for _ in range(48))
+    assert budget.try_acquire(2)
+    assert not budget.try_acquire()
+    assert budget.used_today() == 50
+
+
+def test_a_request_that_would_overshoot_takes_nothing():
+    budget = make_budget([T0])
+    budget.try_acquire(49)
+
+    assert not budget.try_acquire(2)
+    assert budget.used_today() == 49
+    assert budget.try_acquire()
+
+
+def test_budget_resets_on_the_next_utc_day():
+    now = [T0]
+    budget = make_budget(now)
+    budget.try_acquire(50)
+
+    now[0] = T0 + DAY - 3600 - 1  # last second of the same day
+    assert not budget.try_acquire()
+    now[0] += 1
+    assert budget.used_today() == 0
+    assert budget.try_acquire()
+    assert budget.used_today() == 1
+
+
+def test_poll_interval_spreads_the_budget_over_the_devices():
+    budget = RequestBudget(10_000, 0.5, 60, clock=lambda: T0)
+
+    # 5000 requests a day: 10 devices every 172.8s
+    assert budget.poll_interval(10) == pytest.approx(172.8)
+    # reserved requests are taken off the budget first
+    assert budget.poll_interval(10, reserved=1000) == pytest.approx(216)
+
+
+def test_poll_interval_never_goes_below_the_minimum():
+    budget = RequestBudget(10_000, 0.5, 60, clock=lambda: T0)
+
+    assert budget.poll_interval(1) == 60
+    assert budget.poll_interval(0) == 60
+
+
+def test_poll_interval_with_the_budget_reserved_away():
+    budget = RequestBudget(10, 0.5, 60, clock=lambda: T0)
+
+    # nothing left after the reservation: poll each device once a day at most
+    assert budget.poll_interval(2, reserved=5) == 2 * DAY
+
+
+def test_parse_state_reads_temperature_and_humidity():
+    body = state_body(("online", True), ("sensorTemperature", "71.6"), ("sensorHumidity", 43))
+
+    assert parse_state(body) == {"temperatureF": 71.6, "humidity": 43.0}
+
+
+@pytest.mark.parametrize(
+    "capabilities",
+    [
+        [("sensorTemperature", 71.6)],
+        [("sensorHumidity", 43)],
+        [("online", False)],
+    ],
+)
+def test_parse_state_rejects_an_incomplete_reading(capabilities):
+    with pytest.raises(ValueError, match="incomplete"):
+        parse_state(state_body(*capabilities))
+
+
+def test_device_labels_keep_unique_names_and_disambiguate_shared_ones():
+    devices = [
+        thermometer("AA:01", "Bedroom"),
+        thermometer("AA:02", "Bedroom"),
+        thermometer("AA:03", "Office"),
+        thermometer("AA:04"),
+    ]
+
+    assert device_labels(devices) == {
+        "AA:01": "Bedroom (AA:01)",
+        "AA:02": "Bedroom (AA:02)",
+        "AA:03": "Office",
+        "AA:04": "AA:04",
+    }
+
+
+def test_same_named_devices_keep_separate_readings():
+    state = PollState(make_budget([T0]))
+    first, second = thermometer("AA:01", "Bedroom"), thermometer("AA:02", "Bedroom")
+    state.set_devices([first, second])
+
+    state.record(state.label(first), {"temperatureF": 70.0, "humidity": 40.0})
+    state.record(state.label(second), {"temperatureF": 65.0, "humidity": 50.0})
+
+    temperatures = {
+        sample.labels["device"]: sample.value
+        for family in state.collect()
+        if family.name == "govee_temperature_F"
+        for sample in family.samples
+    }
+    assert temperatures == {"Bedroom (AA:01)": 70.0, "Bedroom (AA:02)": 65.0}
+
+
+def test_refreshed_device_list_forgets_removed_devices():
+    state = PollState(make_budget([T0]))
+    kept, removed = thermometer("AA:01", "Office"), thermometer("AA:02", "Garage")
+    state.set_devices([kept, removed])
+    state.record("Office", {"temperatureF": 70.0, "humidity": 40.0})
+    state.record("Garage", {"temperatureF": 40.0, "humidity": 70.0})
+    state.record_error("Garage")
+
+    state.set_devices([kept])
+
+    assert set(state.readings) == {"Office"}
+    assert state.errors == {}
+    served = {
+        sample.labels.get("device")
+        for family in state.collect()
+        for sample in family.samples
+    }
+    assert "Garage" not in served
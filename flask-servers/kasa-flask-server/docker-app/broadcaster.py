@@ -0,0 +1,80 @@
+"""
+Fan-out of the poller's readings to /stream (Server-Sent Events) clients.
+
+The poller is the only producer: each round is formatted once and offered
+to every client's own bounded queue without blocking. A client whose queue
+is full has fallen behind; it is dropped rather than slowing the poller or
+the other clients, and its EventSource reconnects to a fresh snapshot.
+Clients never cause a device request.
+"""
+
+import json
+import queue
+import threading
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, max_queue: int):
+        self.queue: queue.Queue[str] = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def messages(self, keepalive: float):
+        """Yield queued events until dropped; a comment every keepalive seconds when idle."""
+        while not self.dropped:
+            try:
+                yield self.queue.get(timeout=keepalive)
+            except queue.Empty:
+                # also how a disconnected client is noticed
+                yield ": keepalive\n\n"
+
+
+class Broadcaster:
+    def __init__(self, max_queue: int = 64, max_clients: int = 32):
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self.lock = threading.Lock()
+        self.subscribers: set[Subscription] = set()
+        self.dropped_clients = 0
+
+    def subscribe(self, initial: list[str]) -> Subscription | None:
+        """Register a client, starting its queue with initial; None when full."""
+        sub = Subscription(self.max_queue)
+        for message in initial[: self.max_queue]:
+            sub.queue.put_nowait(message)
+        with self.lock:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def publish(self, event: str, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+        message = format_event(event, data)
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(message)
+            except queue.Full:
+                self.drop(sub)
+
+    def drop(self, sub: Subscription):
+        with self.lock:
+            if sub not in self.subscribers:
+                return
+            self.subscribers.discard(sub)
+            self.dropped_clients += 1
+        sub.dropped = True
+
+    def __len__(self):
+        with self.lock:
+            return len(self.subscribers)
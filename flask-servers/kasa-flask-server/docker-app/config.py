@@ -19,7 +19,11 @@ def get_bool_env(name: str, default: bool = False) -> bool:
 
 class Config:
     # user config
-    HS300_IP: str = require_env("HS300_IP")
+    # HS300_IPS lists every strip like KP125M_IPS; HS300_IP is the older
+    # single-strip setting and is used when HS300_IPS is not set
+    HS300_IPS_RAW: str = os.getenv("HS300_IPS") or require_env("HS300_IP")
+    HS300_IPS: list[str] = [x.strip() for x in HS300_IPS_RAW.split("-") if x.strip() != ""]
+    HS300_IP: str = HS300_IPS[0]
     KP125M_IPS_RAW: str = require_env("KP125M_IPS")
     KP125M_IPS: list[str] = [x.strip() for x in KP125M_IPS_RAW.split("-") if x != ""]
     NAME = "kasapower"
@@ -61,8 +65,84 @@ class Config:
 
     LOW_POWER_THRESHOLD_WATTS = 7
 
+    # POST /plugs/state gives up on devices that have not answered by then
+    KASA_CONTROL_TIMEOUT_SECONDS = float(os.getenv("KASA_CONTROL_TIMEOUT_SECONDS", "20"))
+
+    # built-in idle power-off, driven by the poller's readings (needs
+    # KASA_POLL_ENABLED); a desktop must stay under LOW_POWER_THRESHOLD_WATTS
+    # for both this many polls and this long. Dry run unless set to false.
+    KASA_AUTO_POWEROFF_ENABLED = get_bool_env("KASA_AUTO_POWEROFF_ENABLED")
+    KASA_AUTO_POWEROFF_DRY_RUN = get_bool_env("KASA_AUTO_POWEROFF_DRY_RUN", default=True)
+    KASA_AUTO_POWEROFF_MIN_SAMPLES = int(os.getenv("KASA_AUTO_POWEROFF_MIN_SAMPLES", "4"))
+    KASA_AUTO_POWEROFF_MIN_IDLE_SECONDS = float(
+        os.getenv("KASA_AUTO_POWEROFF_MIN_IDLE_SECONDS", "600")
+    )
+    KASA_AUTO_POWEROFF_COOLDOWN_SECONDS = float(
+        os.getenv("KASA_AUTO_POWEROFF_COOLDOWN_SECONDS", "3600")
+    )
+
+    # background broadcast discovery; the registry survives restarts so a
+    # plug DHCP moved is found again without editing HS300_IP/KP125M_IPS
+    KASA_DISCOVERY_ENABLED = get_bool_env("KASA_DISCOVERY_ENABLED")
+    KASA_DISCOVERY_TARGET = os.getenv("KASA_DISCOVERY_TARGET", "255.255.255.255")
+    KASA_DISCOVERY_INTERVAL_SECONDS = float(
+        os.getenv("KASA_DISCOVERY_INTERVAL_SECONDS", "600")
+    )
+    KASA_DISCOVERY_TIMEOUT_SECONDS = int(os.getenv("KASA_DISCOVERY_TIMEOUT_SECONDS", "5"))
+    # registry records discovery has not refreshed for this long are dropped
+    KASA_DEVICE_TTL_SECONDS = float(os.getenv("KASA_DEVICE_TTL_SECONDS", "86400"))
+    KASA_DEVICE_REGISTRY_PATH = os.getenv(
+        "KASA_DEVICE_REGISTRY_PATH", "/data/kasa-devices.json"
+    )
+
+    # persistent background polling: /metrics serves the poller's snapshot
+    # instead of connecting to every device per scrape
+    KASA_POLL_ENABLED = get_bool_env("KASA_POLL_ENABLED")
+    KASA_POLL_INTERVAL_SECONDS = float(os.getenv("KASA_POLL_INTERVAL_SECONDS", "15"))
+    KASA_FULL_REFRESH_SECONDS = float(os.getenv("KASA_FULL_REFRESH_SECONDS", "600"))
+
+    # scrape mode: /metrics returns what answered within Prometheus's
+    # X-Prometheus-Scrape-Timeout-Seconds (this default without the header),
+    # less a margin for building the response
+    KASA_SCRAPE_TIMEOUT_SECONDS = float(os.getenv("KASA_SCRAPE_TIMEOUT_SECONDS", "60"))
+    KASA_SCRAPE_TIMEOUT_MARGIN_SECONDS = float(
+        os.getenv("KASA_SCRAPE_TIMEOUT_MARGIN_SECONDS", "2")
+    )
+
+    # /stream (Server-Sent Events, needs KASA_POLL_ENABLED): events a client
+    # may fall behind by before it is dropped, and how many may connect
+    KASA_STREAM_QUEUE_SIZE = int(os.getenv("KASA_STREAM_QUEUE_SIZE", "64"))
+    KASA_STREAM_MAX_CLIENTS = int(os.getenv("KASA_STREAM_MAX_CLIENTS", "32"))
+    KASA_STREAM_KEEPALIVE_SECONDS = float(os.getenv("KASA_STREAM_KEEPALIVE_SECONDS", "15"))
+
+    # startup: /readyz waits for the first connection to every device, but
+    # no longer than this; /livez fails once a poll round is this overdue
+    KASA_WARMUP_TIMEOUT_SECONDS = float(os.getenv("KASA_WARMUP_TIMEOUT_SECONDS", "60"))
+    KASA_LIVENESS_STALE_SECONDS = float(os.getenv("KASA_LIVENESS_STALE_SECONDS", "300"))
+
+    # local copy of every polled sample for backfilling Prometheus gaps;
+    # off unless a path is set
+    KASA_SAMPLE_STORE_PATH = os.getenv("KASA_SAMPLE_STORE_PATH")
+    KASA_SAMPLE_RETENTION_DAYS = float(os.getenv("KASA_SAMPLE_RETENTION_DAYS", "30"))
+
+    # push every polled sample to a remote-write endpoint (e.g. prometheus
+    # with --web.enable-remote-write-receiver); off unless a URL is set
+    KASA_REMOTE_WRITE_URL = os.getenv("KASA_REMOTE_WRITE_URL")
+    KASA_REMOTE_WRITE_JOB = os.getenv("KASA_REMOTE_WRITE_JOB", "kasa_exporter_push")
+    KASA_REMOTE_WRITE_BATCH_SIZE = int(os.getenv("KASA_REMOTE_WRITE_BATCH_SIZE", "500"))
+    KASA_REMOTE_WRITE_QUEUE_SIZE = int(os.getenv("KASA_REMOTE_WRITE_QUEUE_SIZE", "10000"))
+    KASA_REMOTE_WRITE_FLUSH_SECONDS = float(os.getenv("KASA_REMOTE_WRITE_FLUSH_SECONDS", "15"))
+
+    # debugging: span tracing is on when KASA_TRACE_PATH is set, and
+    # /debug/profile only exists when KASA_DEBUG_ENDPOINTS is true
+    KASA_TRACE_PATH = os.getenv("KASA_TRACE_PATH")
+    KASA_TRACE_MAX_BYTES = int(os.getenv("KASA_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+    KASA_TRACE_BACKUPS = int(os.getenv("KASA_TRACE_BACKUPS", "3"))
+    KASA_DEBUG_ENDPOINTS = get_bool_env("KASA_DEBUG_ENDPOINTS")
+    KASA_PROFILE_MAX_SECONDS = 60
+
     # discord msg alerts
-    DISCORD_ALERT_BOT_URL = "http://discord-general-channel-alert-bot-node-port.discord-bots.svc.cluster.local:5000/alert"
+    DISCORD_ALERT_BOT_URL = "http://discord-alert-bot-node-port.discord-bots.svc.cluster.local:5000/alert/general"
 
     def __repr__(self):
-        return f"Config(HS300_IP={self.HS300_IP}, KP125M_IPS={self.KP125M_IPS})"
+        return f"Config(HS300_IPS={self.HS300_IPS}, KP125M_IPS={self.KP125M_IPS})"
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+from kasa import DeviceConnectionParameters
+
+
+class DeviceRecord:
+    """What discovery last saw of one device, keyed by its MAC address."""
+
+    def __init__(
+        self,
+        device_id: str,
+        host: str,
+        alias: str | None,
+        model: str | None,
+        connection: dict[str, Any],
+        last_seen: float | None = None,
+        configured_as: str | None = None,
+    ):
+        self.device_id = device_id
+        self.host = host
+        self.alias = alias
+        self.model = model
+        self.connection = connection
+        self.last_seen = time.time() if last_seen is None else last_seen
+        # the configured address this device was found at, followed if it moves
+        self.configured_as = configured_as
+
+    @property
+    def connection_params(self) -> DeviceConnectionParameters:
+        return DeviceConnectionParameters.from_dict(self.connection)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "host": self.host,
+            "alias": self.alias,
+            "model": self.model,
+            "connection": self.connection,
+            "last_seen": self.last_seen,
+            "configured_as": self.configured_as,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "DeviceRecord":
+        return cls(**data)
+
+    def __repr__(self):
+        return f"DeviceRecord(device_id={self.device_id}, host={self.host}, alias={self.alias}, model={self.model})"
+
+
+class DeviceRegistry:
+    """
+    Thread-safe map of device id to its current host, connection parameters
+    and alias, persisted as JSON so a restart does not wait for discovery.
+
+    Discovery writes to it in the background. The configured addresses
+    stay the source of truth for which devices are polled; the registry
+    only follows a configured device to its current address.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records: dict[str, DeviceRecord] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.records = {
+                record["device_id"]: DeviceRecord.from_dict(record) for record in data
+            }
+
+    def save(self):
+        """Write the registry atomically (temp file + rename)."""
+        with self.lock:
+            data = [record.to_dict() for record in self.records.values()]
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".kasa-devices.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def update(self, record: DeviceRecord):
+        """Insert or replace a device; a device that moved keeps its id, so its old host is dropped."""
+        with self.lock:
+            # DHCP can hand a departed device's address to another one
+            for device_id, existing in list(self.records.items()):
+                if existing.host == record.host and device_id != record.device_id:
+                    del self.records[device_id]
+            previous = self.records.get(record.device_id)
+            if previous is not None:
+                if record.alias is None:
+                    record.alias = previous.alias
+                record.configured_as = previous.configured_as
+            self.records[record.device_id] = record
+
+    def prune(self, max_age: float, now: float | None = None) -> int:
+        """Drop devices discovery has not seen for max_age seconds; returns how many."""
+        cutoff = (time.time() if now is None else now) - max_age
+        with self.lock:
+            stale = [
+                device_id
+                for device_id, record in self.records.items()
+                if record.last_seen < cutoff
+            ]
+            for device_id in stale:
+                del self.records[device_id]
+        return len(stale)
+
+    def resolve(
+        self, configured: list[str], model_prefix: str, max_age: float, now: float | None = None
+    ) -> list[str]:
+        """
+        Current address of each configured host. A device seen at a
+        configured address is claimed for it and followed when DHCP moves
+        it; a configured host without a fresh record is kept as is, and
+        discovered devices that were never configured are left out.
+        """
+        cutoff = (time.time() if now is None else now) - max_age
+        resolved = []
+        with self.lock:
+            fresh = [
+                record
+                for record in self.records.values()
+                if record.last_seen >= cutoff
+                and record.model is not None
+                and record.model.startswith(model_prefix)
+            ]
+            for host in configured:
+                claimed = next((r for r in fresh if r.configured_as == host), None)
+                if claimed is None:
+                    claimed = next(
+                        (r for r in fresh if r.host == host and r.configured_as is None), None
+                    )
+                    if claimed is not None:
+                        claimed.configured_as = host
+                current = claimed.host if claimed is not None else host
+                if current not in resolved:
+                    resolved.append(current)
+        return resolved
+
+    def get_by_host(self, host: str) -> DeviceRecord | None:
+        with self.lock:
+            for record in self.records.values():
+                if record.host == host:
+                    return record
+        return None
+
+    def hosts(self, model_prefix: str) -> list[str]:
+        """Hosts of every known device whose model starts with model_prefix, e.g. "KP125M"."""
+        with self.lock:
+            return sorted(
+                record.host
+                for record in self.records.values()
+                if record.model is not None and record.model.startswith(model_prefix)
+            )
+
+    def __len__(self):
+        with self.lock:
+            return len(self.records)
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from contextlib import suppress
+from logging import Logger
+
+from device_registry import DeviceRecord, DeviceRegistry
+from kasa import Credentials, Device, Discover
+
+
+class DiscoveryService:
+    """
+    Runs python-kasa broadcast discovery every interval on a background
+    thread with its own event loop, and records what it finds in the
+    registry. Nothing in the request path ever waits on it.
+    """
+
+    def __init__(
+        self,
+        registry: DeviceRegistry,
+        logger: Logger,
+        target: str = "255.255.255.255",
+        interval: float = 600,
+        timeout: int = 5,
+        credentials: Credentials | None = None,
+        max_age: float = 86400,
+    ):
+        self.registry = registry
+        self.logger = logger
+        self.target = target
+        self.interval = interval
+        self.timeout = timeout
+        self.credentials = credentials
+        self.max_age = max_age
+
+    async def describe(self, dev: Device) -> DeviceRecord | None:
+        # alias and model of the newer smart devices are not in the
+        # discovery reply, so ask once; the registry keeps the old alias if
+        # this fails
+        try:
+            await dev.update()
+        except Exception as e:
+            self.logger.warning(f"IP: {dev.host} - discovered but could not be queried: {e}")
+        try:
+            device_id = dev.mac
+        except Exception:
+            return None
+        return DeviceRecord(
+            device_id=device_id,
+            host=dev.host,
+            alias=dev.alias,
+            model=dev.model,
+            connection=dev.config.connection_type.to_dict(),
+        )
+
+    async def discover_once(self) -> int:
+        """Run one discovery round; returns how many devices were recorded."""
+        found = await Discover.discover(
+            target=self.target,
+            discovery_timeout=self.timeout,
+            credentials=self.credentials,
+        )
+        recorded = 0
+        for dev in found.values():
+            try:
+                record = await self.describe(dev)
+            finally:
+                with suppress(Exception):
+                    await dev.disconnect()
+            if record is not None:
+                self.registry.update(record)
+                recorded += 1
+        pruned = self.registry.prune(self.max_age)
+        if pruned:
+            self.logger.info(f"Dropped {pruned} devices not seen for {self.max_age:.0f}s")
+        if recorded or pruned:
+            self.registry.save()
+        return recorded
+
+    async def discover_and_log(self):
+        """One discovery round whose outcome, success or not, is only logged."""
+        try:
+            recorded = await self.discover_once()
+            self.logger.info(f"Discovery found {recorded} devices, {len(self.registry)} known")
+        except Exception as e:
+            self.logger.error(f"Discovery failed: {e}")
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        while True:
+            started = time.monotonic()
+            loop.run_until_complete(self.discover_and_log())
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name="kasa-discovery").start()
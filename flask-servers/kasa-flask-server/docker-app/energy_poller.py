@@ -0,0 +1,241 @@
+import asyncio
+import threading
+import time
+from contextlib import suppress
+from logging import Logger
+from typing import Awaitable, Callable
+
+import tracing
+from kasa import Device, Module
+from kasa.iot import IotDevice
+from plug_control import PlugKey, PlugTarget, apply_states, plug_name
+
+
+class EnergyPoller:
+    """
+    Keeps one connection per device open on a background thread and polls
+    only what /metrics needs, so a scrape just reads the last snapshot.
+
+    A full dev.update() fetches every module (time, cloud, firmware, LED,
+    schedules, daily/monthly usage...). Between full refreshes, which happen
+    every full_refresh_interval seconds, a poll only asks for:
+
+    - KP125M: device info (alias, on/off) and the energy module. Smart
+      devices already skip modules whose MINIMUM_UPDATE_INTERVAL_SECS has
+      not elapsed, so the other modules get that interval raised per
+      instance and dev.update() does the rest.
+    - HS300: one get_sysinfo, which carries every outlet's alias and state,
+      plus get_realtime per outlet instead of each outlet's full module set.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        hs300_hosts: Callable[[], list[str]],
+        kp125m_hosts: Callable[[], list[str]],
+        connect_hs300: Callable[..., Awaitable[Device]],
+        connect_kp125m: Callable[..., Awaitable[Device]],
+        interval: float = 15,
+        full_refresh_interval: float = 600,
+        on_result: Callable[[str, Exception | None], None] | None = None,
+        on_round: Callable[[], None] | None = None,
+        policy=None,
+    ):
+        self.logger = logger
+        self.hs300_hosts = hs300_hosts
+        self.kp125m_hosts = kp125m_hosts
+        self.connect_hs300 = connect_hs300
+        self.connect_kp125m = connect_kp125m
+        self.interval = interval
+        self.full_refresh_interval = full_refresh_interval
+        self.on_result = on_result
+        self.on_round = on_round
+        # optional power_policy.IdlePowerPolicy, evaluated after every round
+        self.policy = policy
+        self.devices: dict[str, Device] = {}
+        self.last_full_refresh: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.readings: dict[str, dict[str, int]] = {}
+        # the device (or HS300 outlet) objects behind each reading, by host then alias
+        self.plugs: dict[str, dict[str, Device]] = {}
+        # strip label of each HS300 host's outlets
+        self.strips: dict[str, str] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.started_at: float | None = None
+        self.updated_at: float | None = None
+
+    def snapshot(self) -> dict[tuple[str, str], int]:
+        """
+        Watts keyed by (alias, strip) from the last poll of every reachable
+        device; strip is "" for a standalone plug.
+        """
+        with self.lock:
+            return {
+                (alias, self.strips.get(host, "")): watts
+                for host, readings in self.readings.items()
+                for alias, watts in readings.items()
+            }
+
+    async def connect(self, host: str, connect_func) -> Device:
+        # connect_func does the first full update; retries are left to the
+        # next round so one dead plug cannot stall the others
+        dev = await connect_func(host, max_retries=1)
+        self.last_full_refresh[host] = time.monotonic()
+        if not isinstance(dev, IotDevice):
+            energy = dev.modules.get(Module.Energy)
+            device_info = dev.modules.get("DeviceModule")
+            for module in dev.modules.values():
+                if module is not energy and module is not device_info:
+                    module.MINIMUM_UPDATE_INTERVAL_SECS = max(
+                        module.MINIMUM_UPDATE_INTERVAL_SECS, self.full_refresh_interval
+                    )
+        self.devices[host] = dev
+        return dev
+
+    async def drop(self, host: str):
+        dev = self.devices.pop(host, None)
+        self.last_full_refresh.pop(host, None)
+        self.plugs.pop(host, None)
+        self.strips.pop(host, None)
+        if dev is not None:
+            with suppress(Exception):
+                await dev.disconnect()
+
+    async def refresh_strip(self, host: str, dev: Device) -> dict[str, int]:
+        dev._set_sys_info(await dev.get_sys_info())
+        self.strips[host] = dev.alias or host
+        self.plugs[host] = {plug.alias: plug for plug in dev.children if plug.alias is not None}
+        readings = {}
+        for plug in dev.children:
+            if plug.alias is None:
+                continue
+            with tracing.span("energy_read", host=dev.host, alias=plug.alias):
+                status = await plug.modules[Module.Energy].get_status()
+            if status.power is not None:
+                readings[plug.alias] = int(status.power)
+        return readings
+
+    async def poll_host(self, host: str, connect_func) -> dict[str, int]:
+        dev = self.devices.get(host)
+        if dev is None:
+            dev = await self.connect(host, connect_func)
+        elif time.monotonic() - self.last_full_refresh[host] >= self.full_refresh_interval:
+            await dev.update()
+            self.last_full_refresh[host] = time.monotonic()
+        elif isinstance(dev, IotDevice):
+            return await self.refresh_strip(host, dev)
+        else:
+            await dev.update()
+
+        if dev.children:
+            plugs = dev.children
+            self.strips[host] = dev.alias or host
+        else:
+            plugs = [dev]
+        self.plugs[host] = {plug.alias: plug for plug in plugs if plug.alias is not None}
+        readings = {}
+        for plug in plugs:
+            if plug.alias is None:
+                continue
+            energy_consumption = plug.modules[Module.Energy].current_consumption
+            if energy_consumption is not None:
+                readings[plug.alias] = int(energy_consumption)
+        return readings
+
+    async def poll_once(self):
+        targets = {host: self.connect_hs300 for host in self.hs300_hosts()}
+        targets.update({host: self.connect_kp125m for host in self.kp125m_hosts()})
+        for host in set(self.devices) - set(targets):
+            await self.drop(host)
+
+        # each device has its own connection, so a slow or dead one only
+        # costs its own time; the first round is the startup warm-up
+        await asyncio.gather(
+            *(self.poll_and_record(host, connect_func) for host, connect_func in targets.items())
+        )
+        with self.lock:
+            for host in set(self.readings) - set(targets):
+                del self.readings[host]
+            self.updated_at = time.time()
+        if self.on_round is not None:
+            self.on_round()
+        if self.policy is not None:
+            await self.policy.evaluate(
+                time.time(), self.snapshot(), self.plug_states(), self.turn_off
+            )
+
+    def plug_states(self) -> dict[PlugKey, bool]:
+        """On/off state by (alias, strip) of every plug that answered the last poll."""
+        return {key: plug.is_on for key, plug in self.plugs_by_key(answered_only=True).items()}
+
+    def plugs_by_key(self, answered_only: bool = False) -> dict[PlugKey, Device]:
+        with self.lock:
+            hosts = list(self.readings) if answered_only else list(self.plugs)
+        return {
+            (alias, self.strips.get(host, "")): plug
+            for host in hosts
+            for alias, plug in self.plugs.get(host, {}).items()
+        }
+
+    async def turn_off(self, key: PlugKey):
+        """Turn a plug off over its already open connection."""
+        plug = self.plugs_by_key().get(key)
+        if plug is None:
+            raise KeyError(f"no polled plug named {plug_name(key)}")
+        with tracing.span("turn_off", alias=key[0], strip=key[1]):
+            await plug.turn_off()
+
+    def set_states(self, targets: list[PlugTarget], timeout: float) -> list[dict]:
+        """
+        Apply targets from another thread over the poller's open connections,
+        concurrently across devices; raises TimeoutError past timeout.
+        """
+        if self.loop is None:
+            raise RuntimeError("energy poller is not running")
+
+        async def apply():
+            with tracing.span("set_states", plugs=len(targets)):
+                return await apply_states(self.plugs_by_key(), targets)
+
+        future = asyncio.run_coroutine_threadsafe(apply(), self.loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def poll_and_record(self, host: str, connect_func):
+        try:
+            with tracing.span("poll", host=host):
+                readings = await self.poll_host(host, connect_func)
+        except Exception as e:
+            self.logger.error(f"IP: {host} ------------ Energy poll failed: error: {e}")
+            await self.drop(host)
+            # a stale reading would look like a flat line, so report none
+            with self.lock:
+                self.readings.pop(host, None)
+            if self.on_result is not None:
+                self.on_result(host, e)
+            return
+        with self.lock:
+            self.readings[host] = readings
+        if self.on_result is not None:
+            self.on_result(host, None)
+
+    async def poll_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                self.logger.error(f"Energy poll round failed: {e}")
+            # sleep inside the loop so set_states() calls run between rounds
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.poll_forever())
+
+    def start(self):
+        self.started_at = time.time()
+        threading.Thread(target=self.run, daemon=True, name="kasa-energy-poller").start()
@@ -1,11 +1,23 @@
+import time
+
+# measured from here so kasa_startup_import_seconds covers the imports below
+IMPORT_STARTED = time.perf_counter()
+
 import asyncio
+import atexit
 import re
+import threading
 from contextlib import asynccontextmanager, suppress
 from typing import Any
 
 import requests
+import tracing
+from broadcaster import Broadcaster, format_event
 from config import Config
-from flask import Flask, jsonify, request
+from device_registry import DeviceRegistry
+from discovery import DiscoveryService
+from energy_poller import EnergyPoller
+from flask import Flask, Response, jsonify, request
 from kasa import (
     Credentials,
     Device,
@@ -13,18 +25,57 @@ from kasa import (
     Module,
 )
 from my_logger import Logger
+from plug_control import (
+    AliasIndex,
+    PlugKey,
+    PlugTarget,
+    UnknownPlug,
+    apply_states,
+    parse_targets,
+)
+from plug_control import result as plug_result
+from power_policy import IdlePowerPolicy
 from prometheus_client import (
     CONTENT_TYPE_LATEST,
     CollectorRegistry,
+    Counter,
     Gauge,
     generate_latest,
 )
+from remote_write import RemoteWriter
+from sample_store import SampleStore
+from startup import Startup
+from strip_commands import set_children_state
 from time_of_use_electricity_pricing import TimeOfUseElectricityPricing
 
 CONFIG = Config()
 LOGGER = Logger().get_logger()
 LOGGER.info(f"Loaded config: {CONFIG}")
+tracing.configure(
+    CONFIG.KASA_TRACE_PATH, CONFIG.KASA_TRACE_MAX_BYTES, CONFIG.KASA_TRACE_BACKUPS
+)
 TOU_PRICING = TimeOfUseElectricityPricing()
+DEVICE_REGISTRY = (
+    DeviceRegistry(CONFIG.KASA_DEVICE_REGISTRY_PATH)
+    if CONFIG.KASA_DISCOVERY_ENABLED
+    else None
+)
+# set by create_energy_poller(), which start_energy_poller() calls when KASA_POLL_ENABLED
+ENERGY_POLLER: EnergyPoller | None = None
+STARTUP = Startup(CONFIG.KASA_WARMUP_TIMEOUT_SECONDS)
+# (alias, strip) -> host of every plug seen by a scrape, for /plugs/state
+ALIAS_INDEX = AliasIndex()
+# set by start_sample_store() when KASA_SAMPLE_STORE_PATH is set
+SAMPLE_STORE: SampleStore | None = None
+# set by start_remote_write() when KASA_REMOTE_WRITE_URL is set
+REMOTE_WRITER: RemoteWriter | None = None
+# fans the poller's rounds out to /stream clients
+BROADCASTER = Broadcaster(CONFIG.KASA_STREAM_QUEUE_SIZE, CONFIG.KASA_STREAM_MAX_CLIENTS)
+# on/off by (alias, strip) as of the last round published to /stream
+PLUG_STATES: dict[PlugKey, bool] = {}
+# host -> scrapes it missed the deadline of
+SCRAPE_TIMEOUTS: dict[str, int] = {}
+SCRAPE_TIMEOUTS_LOCK = threading.Lock()
 
 app = Flask(__name__)
 
@@ -34,17 +85,18 @@ def obscure_credentials(message: str) -> str:
     return re.sub(r"(ftp://)([^:/\s]+):([^@/\s]+)@", r"\1nnn:nnn@", message)
 
 
-async def send_discord_message(message: str) -> None:
+async def send_discord_message(message: str, priority: str = "normal") -> None:
     """Send a message to Discord webhook asynchronously with error handling."""
     try:
-        payload_dict = {"message": obscure_credentials(message)}
+        payload_dict = {"message": obscure_credentials(message), "priority": priority}
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: requests.post(
-                CONFIG.DISCORD_ALERT_BOT_URL, json=payload_dict, timeout=5
-            ),
-        )
+        with tracing.span("alert_send", priority=priority):
+            await loop.run_in_executor(
+                None,
+                lambda: requests.post(
+                    CONFIG.DISCORD_ALERT_BOT_URL, json=payload_dict, timeout=5
+                ),
+            )
     except Exception as e:
         LOGGER.error(f"Failed to send Discord message: {e}")
 
@@ -54,6 +106,48 @@ def should_manage_plug(plug: Any) -> bool:
     return plug.alias is not None and plug.alias in CONFIG.DESKTOPS
 
 
+def kp125m_ips() -> list[str]:
+    """KP125M_IPS, each followed to its current address when discovery has seen it move."""
+    if DEVICE_REGISTRY is None:
+        return CONFIG.KP125M_IPS
+    return DEVICE_REGISTRY.resolve(
+        CONFIG.KP125M_IPS, "KP125M", CONFIG.KASA_DEVICE_TTL_SECONDS
+    )
+
+
+def hs300_ips() -> list[str]:
+    """HS300_IPS, each followed to its current address when discovery has seen it move."""
+    if DEVICE_REGISTRY is None:
+        return CONFIG.HS300_IPS
+    return DEVICE_REGISTRY.resolve(CONFIG.HS300_IPS, "HS300", CONFIG.KASA_DEVICE_TTL_SECONDS)
+
+
+def create_discovery() -> DiscoveryService | None:
+    """The discovery service if enabled, not yet started."""
+    if DEVICE_REGISTRY is None:
+        return None
+    return DiscoveryService(
+        DEVICE_REGISTRY,
+        LOGGER,
+        target=CONFIG.KASA_DISCOVERY_TARGET,
+        interval=CONFIG.KASA_DISCOVERY_INTERVAL_SECONDS,
+        timeout=CONFIG.KASA_DISCOVERY_TIMEOUT_SECONDS,
+        max_age=CONFIG.KASA_DEVICE_TTL_SECONDS,
+        credentials=Credentials(
+            username=CONFIG.KASA_USERNAME, password=CONFIG.KASA_PASSWORD
+        ),
+    )
+
+
+def start_discovery():
+    """Start background discovery if enabled; never called on import."""
+    discovery = create_discovery()
+    if discovery is None:
+        return
+    discovery.start()
+    LOGGER.info(f"Discovery started, {len(DEVICE_REGISTRY)} devices in the registry")
+
+
 def log_device_error(ip: str, error: Exception, context: str = "Got Nothing"):
     """Log device-related errors with consistent formatting."""
     LOGGER.error(f"IP: {ip} ------------ {context}: error: {error}")
@@ -66,8 +160,10 @@ async def connect_to_device(
     for attempt in range(max_retries):
         dev = None
         try:
-            dev = await Device.connect(config=device_config)
-            await dev.update()
+            with tracing.span("connect", host=ip, attempt=attempt + 1):
+                dev = await Device.connect(config=device_config)
+            with tracing.span("update", host=ip):
+                await dev.update()
             return dev
         except Exception as e:
             if dev is not None:
@@ -87,12 +183,18 @@ async def connect_to_kp125m_device(
     ip: str, timeout: int = 10, max_retries: int = 3
 ) -> Device:
     """Connect to a KP125M device with credentials, retrying on timeout."""
+    # discovery learns each device's actual encryption, so prefer it
+    record = DEVICE_REGISTRY.get_by_host(ip) if DEVICE_REGISTRY is not None else None
     device_config = DeviceConfig(
         host=ip,
         credentials=Credentials(
             username=CONFIG.KASA_USERNAME, password=CONFIG.KASA_PASSWORD
         ),
-        connection_type=CONFIG.get_kp125m_device_connect_param(ip),
+        connection_type=(
+            record.connection_params
+            if record is not None
+            else CONFIG.get_kp125m_device_connect_param(ip)
+        ),
         timeout=timeout,
     )
     return await connect_to_device(device_config, ip, max_retries)
@@ -120,22 +222,32 @@ async def get_metrics_HS300(ip: str) -> dict[Any, Any]:
     output_dict = {}
     try:
         async with managed_device_connection(connect_to_hs300_device, ip) as dev:
-            for plug in dev.children:
-                plug_name = plug.alias
-                if plug_name is not None:
-                    energy = plug.modules[Module.Energy]
-                    energy_consumption = energy.current_consumption
-                    if energy_consumption is not None:
-                        output_dict[plug_name] = int(energy_consumption)
+            # outlets are labeled with their strip so two strips can reuse aliases
+            strip = dev.alias or ip
+            with tracing.span("energy_read", host=ip):
+                for plug in dev.children:
+                    plug_name = plug.alias
+                    if plug_name is not None:
+                        energy = plug.modules[Module.Energy]
+                        energy_consumption = energy.current_consumption
+                        if energy_consumption is not None:
+                            output_dict[(plug_name, strip)] = int(energy_consumption)
+            ALIAS_INDEX.update(
+                ip, [(plug.alias, strip) for plug in dev.children if plug.alias is not None]
+            )
+        STARTUP.record(ip)
         return output_dict
     except Exception as e:
         log_device_error(ip, e)
+        STARTUP.record(ip, e)
         raise e
 
 
 async def turn_off_desktop_plugs_if_no_power_HS300(ip: str) -> bool:
     try:
         async with managed_device_connection(connect_to_hs300_device, ip) as dev:
+            all_off = True
+            idle_plugs = []
             for plug in dev.children:
                 if should_manage_plug(plug):
                     if plug.is_on:
@@ -144,31 +256,39 @@ async def turn_off_desktop_plugs_if_no_power_HS300(ip: str) -> bool:
                             plug_energy.current_consumption
                             < CONFIG.LOW_POWER_THRESHOLD_WATTS
                         ):
-                            await plug.turn_off()
-                            await send_discord_message(f"Plug {plug.alias} turned off")
+                            idle_plugs.append(plug)
                         else:
                             LOGGER.warning(f"Plug {plug.alias} is still on")
-                            return False
-        return True
+                            all_off = False
+                            break
+            # the idle outlets go off in one request to the strip
+            with tracing.span("turn_off", host=ip, outlets=len(idle_plugs)):
+                await set_children_state(dev, idle_plugs, on=False)
+            for plug in idle_plugs:
+                await send_discord_message(
+                    f"Plug {plug.alias} turned off", priority="low"
+                )
+        return all_off
     except Exception as e:
         log_device_error(ip, e)
         return False
 
 
-async def check_all_desktop_plugs_are_off_HS300() -> bool:
-    try:
-        async with managed_device_connection(
-            connect_to_hs300_device, CONFIG.HS300_IP
-        ) as dev:
-            for plug in dev.children:
-                if should_manage_plug(plug):
-                    if plug.is_on:
-                        LOGGER.warning(f"Plug {plug.alias} is still on")
-                        return False
-        return True
-    except Exception as e:
-        log_device_error(CONFIG.HS300_IP, e)
-        return False
+async def check_all_desktop_plugs_are_off_HS300(ip_list: list[str]) -> bool:
+    async def check(ip: str) -> bool:
+        try:
+            async with managed_device_connection(connect_to_hs300_device, ip) as dev:
+                for plug in dev.children:
+                    if should_manage_plug(plug):
+                        if plug.is_on:
+                            LOGGER.warning(f"Plug {plug.alias} is still on")
+                            return False
+            return True
+        except Exception as e:
+            log_device_error(ip, e)
+            return False
+
+    return all(await asyncio.gather(*(check(ip) for ip in ip_list)))
 
 
 async def check_all_desktop_plugs_are_off_KP125M(ip_list: list[str]) -> bool:
@@ -194,8 +314,11 @@ async def turn_off_desktop_plugs_if_no_power_KP125M(ip_list: list[str]) -> bool:
                         device_energy.current_consumption
                         < CONFIG.LOW_POWER_THRESHOLD_WATTS
                     ):
-                        await dev.turn_off()
-                        await send_discord_message(f"Plug {dev.alias} turned off")
+                        with tracing.span("turn_off", host=ip, alias=dev.alias):
+                            await dev.turn_off()
+                        await send_discord_message(
+                            f"Plug {dev.alias} turned off", priority="low"
+                        )
                     else:
                         LOGGER.warning(f"Plug {dev.alias} is still on")
                         return False
@@ -210,47 +333,71 @@ async def get_metrics_KP125M(ip_list: list[str]) -> dict[Any, Any]:
     for ip in ip_list:
         try:
             async with managed_device_connection(connect_to_kp125m_device, ip) as dev:
-                device_alias = dev.alias
+                with tracing.span("energy_read", host=ip):
+                    device_alias = dev.alias
+                    if device_alias is not None:
+                        energy = dev.modules[Module.Energy]
+                        energy_consumption = energy.current_consumption
+                        if energy_consumption is not None:
+                            output_dict[(device_alias, "")] = int(energy_consumption)
                 if device_alias is not None:
-                    energy = dev.modules[Module.Energy]
-                    energy_consumption = energy.current_consumption
-                    if energy_consumption is not None:
-                        output_dict[device_alias] = int(energy_consumption)
+                    ALIAS_INDEX.update(ip, [(device_alias, "")])
+            STARTUP.record(ip)
         except Exception as e:
             log_device_error(ip, e)
+            STARTUP.record(ip, e)
             continue
     return output_dict
 
 
-@app.route("/metrics")
-def metrics():
-    registry = CollectorRegistry()
+async def get_power_data(deadline: float | None = None) -> dict[Any, Any]:
+    """
+    Sweep every device concurrently and return watts keyed by (alias, strip);
+    strip is "" for a KP125M.
 
-    # Run asyncio task inside Flask
-    hs300_data = {}
-    kp125m_data = {}
+    With a deadline (seconds), devices that have not answered by then are
+    cancelled, marked down and counted in SCRAPE_TIMEOUTS, and the readings
+    that did finish are returned.
+    """
+    tasks = {asyncio.ensure_future(get_metrics_HS300(ip)): ip for ip in hs300_ips()}
+    tasks.update(
+        {asyncio.ensure_future(get_metrics_KP125M([ip])): ip for ip in kp125m_ips()}
+    )
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
 
-    try:
-        hs300_data = asyncio.run(get_metrics_HS300(CONFIG.HS300_IP))
-    except Exception as e:
-        LOGGER.error(f"Error in metrics route from get_metrics_HS300: {e}")
-    try:
-        kp125m_data = asyncio.run(get_metrics_KP125M(CONFIG.KP125M_IPS))
-    except Exception as e:
-        LOGGER.error(f"Error in metrics route from get_metrics_KP125M: {e}")
+    output_dict = {}
+    for task in done:
+        if task.exception() is not None:
+            LOGGER.error(f"Error in metrics route for {tasks[task]}: {task.exception()}")
+        else:
+            output_dict.update(task.result())
+    for task in pending:
+        # every scrape reconnects, so there is nothing to keep a late one for
+        task.cancel()
+        ip = tasks[task]
+        LOGGER.warning(f"IP: {ip} - no answer within the {deadline:.1f}s scrape deadline")
+        STARTUP.record(ip, TimeoutError("scrape deadline"))
+        with SCRAPE_TIMEOUTS_LOCK:
+            SCRAPE_TIMEOUTS[ip] = SCRAPE_TIMEOUTS.get(ip, 0) + 1
+    return output_dict
 
-    data = {**hs300_data, **kp125m_data}
+
+def build_metrics_registry(data: dict[Any, Any]) -> CollectorRegistry:
+    """Build the exported gauges from get_power_data() output."""
+    registry = CollectorRegistry()
 
     # gauge for devices
     g = Gauge(
         name=CONFIG.NAME,
         documentation="Power consumption in watts for each device",
-        labelnames=["device"],
+        labelnames=["device", "strip"],
         unit="watts",
         registry=registry,
     )
-    for key, value in data.items():
-        g.labels(device=key).set(value)
+    for (device, strip), value in data.items():
+        g.labels(device=device, strip=strip).set(value)
 
     # Gauge for electricity price
     price_gauge = Gauge(
@@ -259,15 +406,393 @@ def metrics():
         registry=registry,
     )
     price_gauge.set(TOU_PRICING.get_current_price())
+
+    # startup and per-device health
+    import_gauge = Gauge(
+        name="kasa_startup_import",
+        documentation="Time to import flask-app.py and its dependencies",
+        unit="seconds",
+        registry=registry,
+    )
+    import_gauge.set(STARTUP.import_seconds or 0)
+    if STARTUP.warmup_seconds is not None:
+        Gauge(
+            name="kasa_startup_warmup",
+            documentation="Time from startup until every device had been connected to once",
+            unit="seconds",
+            registry=registry,
+        ).set(STARTUP.warmup_seconds)
+    up_gauge = Gauge(
+        name="kasa_up",
+        documentation="1 if the latest connection to the device succeeded",
+        labelnames=["host"],
+        registry=registry,
+    )
+    for host, up in STARTUP.device_up().items():
+        up_gauge.labels(host=host).set(1 if up else 0)
+    timeouts = Counter(
+        name="kasa_scrape_timeouts",
+        documentation="Scrapes a device did not answer within the scrape deadline",
+        labelnames=["host"],
+        registry=registry,
+    )
+    with SCRAPE_TIMEOUTS_LOCK:
+        for host, count in SCRAPE_TIMEOUTS.items():
+            timeouts.labels(host=host).inc(count)
+
+    Gauge(
+        name="kasa_stream_clients",
+        documentation="Clients connected to /stream",
+        registry=registry,
+    ).set(len(BROADCASTER))
+    Counter(
+        name="kasa_stream_dropped_clients",
+        documentation="/stream clients dropped for falling behind",
+        registry=registry,
+    ).inc(BROADCASTER.dropped_clients)
+
+    policy = ENERGY_POLLER.policy if ENERGY_POLLER is not None else None
+    if policy is not None:
+        actions = Counter(
+            name="kasa_auto_poweroff_actions",
+            documentation="Idle desktops turned off (or that would have been, in dry run)",
+            labelnames=["device", "strip", "dry_run"],
+            registry=registry,
+        )
+        for (alias, strip), count in policy.actions.items():
+            actions.labels(device=alias, strip=strip, dry_run=str(policy.dry_run).lower()).inc(count)
+
+    if REMOTE_WRITER is not None:
+        Gauge(
+            name="kasa_remote_write_queue_samples",
+            documentation="Samples waiting to be pushed",
+            registry=registry,
+        ).set(len(REMOTE_WRITER.queue))
+        for name, documentation, value in [
+            ("kasa_remote_write_sent_samples", "Samples accepted by the remote-write endpoint", REMOTE_WRITER.sent_samples),
+            ("kasa_remote_write_dropped_samples", "Samples dropped by a full queue or rejected by the endpoint", REMOTE_WRITER.dropped_samples),
+            ("kasa_remote_write_failed_pushes", "Pushes that failed and were retried", REMOTE_WRITER.failed_pushes),
+        ]:
+            Counter(name=name, documentation=documentation, registry=registry).inc(value)
     # LOGGER.info(TOU_PRICING)
+    return registry
+
+
+def start_sample_store():
+    """Open the local sample store if configured; never called on import."""
+    global SAMPLE_STORE
+    if not CONFIG.KASA_SAMPLE_STORE_PATH:
+        return
+    SAMPLE_STORE = SampleStore(
+        CONFIG.KASA_SAMPLE_STORE_PATH, retention_days=CONFIG.KASA_SAMPLE_RETENTION_DAYS
+    )
+    atexit.register(SAMPLE_STORE.close)
+    LOGGER.info(f"Recording samples to {CONFIG.KASA_SAMPLE_STORE_PATH}")
+
+
+def start_remote_write():
+    """Start pushing samples if configured; never called on import."""
+    global REMOTE_WRITER
+    if not CONFIG.KASA_REMOTE_WRITE_URL:
+        return
+    REMOTE_WRITER = RemoteWriter(
+        CONFIG.KASA_REMOTE_WRITE_URL,
+        LOGGER,
+        labels={"job": CONFIG.KASA_REMOTE_WRITE_JOB},
+        batch_size=CONFIG.KASA_REMOTE_WRITE_BATCH_SIZE,
+        max_queue=CONFIG.KASA_REMOTE_WRITE_QUEUE_SIZE,
+        flush_interval=CONFIG.KASA_REMOTE_WRITE_FLUSH_SECONDS,
+    )
+    REMOTE_WRITER.start()
+    LOGGER.info(f"Pushing samples to {CONFIG.KASA_REMOTE_WRITE_URL}")
+
+
+def record_samples(data: dict[Any, Any]):
+    if not data:
+        return
+    now = time.time()
+    if SAMPLE_STORE is not None:
+        try:
+            SAMPLE_STORE.append(now, data)
+        except Exception as e:
+            LOGGER.error(f"Failed to record samples: {e}")
+    if REMOTE_WRITER is not None:
+        REMOTE_WRITER.append(now, data)
+
+
+def power_event(ts: float, data: dict[Any, Any]) -> dict:
+    return {
+        "ts": ts,
+        "readings": [
+            {"device": device, "strip": strip, "watts": watts}
+            for (device, strip), watts in data.items()
+        ],
+    }
+
+
+def state_event(ts: float, key: PlugKey, on: bool) -> dict:
+    device, strip = key
+    return {"ts": ts, "device": device, "strip": strip, "on": on}
+
+
+def publish_round(data: dict[Any, Any]):
+    """Send a round's readings, and every plug switched since the last one, to /stream."""
+    global PLUG_STATES
+    now = time.time()
+    states = ENERGY_POLLER.plug_states()
+    BROADCASTER.publish("power", power_event(now, data))
+    for key, on in states.items():
+        if PLUG_STATES.get(key) != on:
+            BROADCASTER.publish("state", state_event(now, key, on))
+    PLUG_STATES = states
+
+
+def after_poll_round():
+    STARTUP.finish()
+    data = ENERGY_POLLER.snapshot()
+    record_samples(data)
+    publish_round(data)
+
+
+def build_power_policy() -> IdlePowerPolicy | None:
+    if not CONFIG.KASA_AUTO_POWEROFF_ENABLED:
+        return None
+    return IdlePowerPolicy(
+        CONFIG.DESKTOPS,
+        CONFIG.LOW_POWER_THRESHOLD_WATTS,
+        LOGGER,
+        notify=lambda message: send_discord_message(message, priority="low"),
+        min_samples=CONFIG.KASA_AUTO_POWEROFF_MIN_SAMPLES,
+        min_idle_seconds=CONFIG.KASA_AUTO_POWEROFF_MIN_IDLE_SECONDS,
+        cooldown_seconds=CONFIG.KASA_AUTO_POWEROFF_COOLDOWN_SECONDS,
+        dry_run=CONFIG.KASA_AUTO_POWEROFF_DRY_RUN,
+    )
+
+
+def create_energy_poller() -> EnergyPoller:
+    """Build the energy poller and publish it as ENERGY_POLLER, without starting it."""
+    global ENERGY_POLLER
+    ENERGY_POLLER = EnergyPoller(
+        LOGGER,
+        hs300_hosts=hs300_ips,
+        kp125m_hosts=kp125m_ips,
+        connect_hs300=connect_to_hs300_device,
+        connect_kp125m=connect_to_kp125m_device,
+        interval=CONFIG.KASA_POLL_INTERVAL_SECONDS,
+        full_refresh_interval=CONFIG.KASA_FULL_REFRESH_SECONDS,
+        on_result=STARTUP.record,
+        on_round=after_poll_round,
+        policy=build_power_policy(),
+    )
+    return ENERGY_POLLER
+
+
+def start_energy_poller():
+    """Start the persistent background poller if enabled; never called on import."""
+    if not CONFIG.KASA_POLL_ENABLED:
+        return
+    create_energy_poller().start()
+    LOGGER.info(f"Energy poller started, every {CONFIG.KASA_POLL_INTERVAL_SECONDS}s")
+
+
+async def warm_up_connections():
+    """Connect to every device once, in parallel, recording who answered."""
+
+    async def warm_up(ip: str, connect_func):
+        try:
+            async with managed_device_connection(connect_func, ip, max_retries=1):
+                pass
+            STARTUP.record(ip)
+        except Exception as e:
+            log_device_error(ip, e, context="Warm-up failed")
+            STARTUP.record(ip, e)
+
+    with tracing.span("warm_up"):
+        await asyncio.gather(
+            *(warm_up(ip, connect_to_hs300_device) for ip in hs300_ips()),
+            *(warm_up(ip, connect_to_kp125m_device) for ip in kp125m_ips()),
+        )
+
+
+def start_warm_up():
+    """
+    Connect to every device before reporting ready; never called on import.
+
+    With the poller, its first round is the warm-up and the connections are
+    kept. Otherwise the handshakes are only checked, since each scrape
+    reconnects.
+    """
+    STARTUP.begin([*hs300_ips(), *kp125m_ips()])
+    if CONFIG.KASA_POLL_ENABLED:
+        start_energy_poller()
+        return
+    if CONFIG.KASA_AUTO_POWEROFF_ENABLED:
+        LOGGER.warning("KASA_AUTO_POWEROFF_ENABLED needs KASA_POLL_ENABLED, ignoring it")
+
+    def run():
+        try:
+            asyncio.run(warm_up_connections())
+        finally:
+            STARTUP.finish()
+            LOGGER.info(f"Warm-up finished in {STARTUP.warmup_seconds:.1f}s")
+
+    threading.Thread(target=run, daemon=True, name="kasa-warm-up").start()
+
+
+@app.route("/readyz")
+def readyz():
+    status = STARTUP.status()
+    return jsonify(status), 200 if STARTUP.ready else 503
+
+
+@app.route("/livez")
+def livez():
+    # the HTTP server answering covers the scrape path; with the poller,
+    # also fail when its loop has stopped completing rounds
+    if ENERGY_POLLER is not None:
+        last_round = ENERGY_POLLER.updated_at or ENERGY_POLLER.started_at
+        if last_round is not None:
+            age = time.time() - last_round
+            if age > CONFIG.KASA_LIVENESS_STALE_SECONDS:
+                return jsonify(
+                    {"status": "failure", "message": f"no poll round for {age:.0f}s"}
+                ), 503
+    return jsonify({"status": "success", "message": "alive"}), 200
+
 
+def scrape_deadline() -> float:
+    """Seconds a scrape-mode sweep may take before /metrics answers with what it has."""
+    try:
+        timeout = float(request.headers.get("X-Prometheus-Scrape-Timeout-Seconds", ""))
+    except ValueError:
+        timeout = CONFIG.KASA_SCRAPE_TIMEOUT_SECONDS
+    return max(timeout - CONFIG.KASA_SCRAPE_TIMEOUT_MARGIN_SECONDS, timeout / 2)
+
+
+@app.route("/metrics")
+def metrics():
+    if ENERGY_POLLER is not None:
+        data = ENERGY_POLLER.snapshot()
+    else:
+        # Run asyncio task inside Flask
+        deadline = scrape_deadline()
+        with tracing.span("scrape", deadline=deadline):
+            data = asyncio.run(get_power_data(deadline))
+        record_samples(data)
+    registry = build_metrics_registry(data)
     return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
 
+@app.route("/stream")
+def stream():
+    """
+    Server-Sent Events from the poller: "power" after every round and
+    "state" when a plug is switched on or off. Starts with the current
+    readings and states; connecting never touches a device.
+    """
+    if ENERGY_POLLER is None:
+        return jsonify(
+            {"status": "failure", "message": "/stream needs KASA_POLL_ENABLED"}
+        ), 503
+    now = time.time()
+    initial = [format_event("power", power_event(now, ENERGY_POLLER.snapshot()))]
+    initial += [
+        format_event("state", state_event(now, key, on))
+        for key, on in ENERGY_POLLER.plug_states().items()
+    ]
+    sub = BROADCASTER.subscribe(initial)
+    if sub is None:
+        return jsonify({"status": "failure", "message": "too many /stream clients"}), 503
+    LOGGER.info(f"/stream client connected from {request.remote_addr}, {len(BROADCASTER)} total")
+
+    def events():
+        try:
+            yield from sub.messages(CONFIG.KASA_STREAM_KEEPALIVE_SECONDS)
+        finally:
+            BROADCASTER.unsubscribe(sub)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 async def trigger_power_off_desktops_async():
     """Execute power off sequence for all devices."""
-    await turn_off_desktop_plugs_if_no_power_HS300(CONFIG.HS300_IP)
-    await turn_off_desktop_plugs_if_no_power_KP125M(CONFIG.KP125M_IPS)
+    await asyncio.gather(
+        *(turn_off_desktop_plugs_if_no_power_HS300(ip) for ip in hs300_ips())
+    )
+    await turn_off_desktop_plugs_if_no_power_KP125M(kp125m_ips())
+
+
+async def set_plug_states(targets: list[PlugTarget]) -> list[dict]:
+    """
+    Apply targets without the poller: one connection per host involved,
+    all hosts at once. An alias the index has not seen triggers one sweep.
+    """
+    by_host, unresolved = ALIAS_INDEX.group(targets)
+    if any(isinstance(error, UnknownPlug) for _, error in unresolved):
+        await get_power_data()
+        by_host, unresolved = ALIAS_INDEX.group(targets)
+    strip_ips = set(hs300_ips())
+
+    async def apply_on_host(host: str, host_targets: list[tuple[PlugTarget, PlugKey]]) -> list[dict]:
+        # the index already picked the strip, so name it for apply_states
+        resolved = [PlugTarget(target.alias, target.on, key[1]) for target, key in host_targets]
+        connect_func = (
+            connect_to_hs300_device if host in strip_ips else connect_to_kp125m_device
+        )
+        try:
+            async with managed_device_connection(connect_func, host, max_retries=1) as dev:
+                strip = (dev.alias or host) if host in strip_ips else ""
+                plugs = {(plug.alias, strip): plug for plug in (dev.children or [dev])}
+                return await apply_states(plugs, resolved)
+        except Exception as e:
+            log_device_error(host, e, context="Set state failed")
+            return [plug_result(target, e) for target in resolved]
+
+    with tracing.span("set_states", plugs=len(targets)):
+        per_host = await asyncio.gather(
+            *(apply_on_host(host, host_targets) for host, host_targets in by_host.items())
+        )
+    results = {
+        id(target): item
+        for host_targets, items in zip(by_host.values(), per_host)
+        for (target, _), item in zip(host_targets, items)
+    }
+    for target, error in unresolved:
+        results[id(target)] = plug_result(target, error)
+    return [results[id(target)] for target in targets]
+
+
+@app.route("/plugs/state", methods=["POST"])
+def set_plugs_state():
+    """Turn plugs on/off by alias (and strip): [{"alias": "LG45", "on": false}, ...]."""
+    try:
+        targets = parse_targets(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    LOGGER.info(
+        "Plug state change %s requested from remote_addr=%s",
+        targets,
+        request.remote_addr,
+    )
+    try:
+        if ENERGY_POLLER is not None:
+            results = ENERGY_POLLER.set_states(targets, CONFIG.KASA_CONTROL_TIMEOUT_SECONDS)
+        else:
+            results = asyncio.run(
+                asyncio.wait_for(
+                    set_plug_states(targets), CONFIG.KASA_CONTROL_TIMEOUT_SECONDS
+                )
+            )
+    except TimeoutError:
+        return jsonify({"status": "failure", "message": "timed out"}), 504
+    ok = all(item["status"] == "success" for item in results)
+    return jsonify(
+        {"status": "success" if ok else "failure", "results": results}
+    ), 200 if ok else 502
 
 
 @app.route("/poweroff", methods=["POST"])
@@ -291,5 +816,36 @@ def trigger_power_off():
         ), 400
 
 
+@app.route("/debug/profile")
+def debug_profile():
+    """Sample every thread for ?seconds=N (default 10) and return collapsed stacks."""
+    if not CONFIG.KASA_DEBUG_ENDPOINTS:
+        return jsonify({"status": "failure", "message": "not found"}), 404
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+    except ValueError:
+        return jsonify({"status": "failure", "message": "seconds must be a number"}), 400
+    if not 0 < seconds <= CONFIG.KASA_PROFILE_MAX_SECONDS:
+        return jsonify(
+            {
+                "status": "failure",
+                "message": f"seconds must be in (0, {CONFIG.KASA_PROFILE_MAX_SECONDS}]",
+            }
+        ), 400
+    LOGGER.info(f"Profiling for {seconds}s, requested by {request.remote_addr}")
+    counts = tracing.sample_stacks(seconds)
+    return Response(
+        tracing.collapsed(counts),
+        mimetype="text/plain",
+        headers={"Content-Disposition": "attachment; filename=kasa-profile.folded"},
+    )
+
+
+STARTUP.import_seconds = time.perf_counter() - IMPORT_STARTED
+
 if __name__ == "__main__":
+    start_discovery()
+    start_sample_store()
+    start_remote_write()
+    start_warm_up()
     app.run(host="0.0.0.0", port=9101)
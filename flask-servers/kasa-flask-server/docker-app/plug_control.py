@@ -0,0 +1,186 @@
+import asyncio
+import threading
+from typing import Any, Iterable
+
+from kasa import Device
+from kasa.iot import IotStrip
+from strip_commands import set_children_state
+
+
+# (alias, strip) of a plug; strip is "" for a standalone plug, else the HS300's alias
+PlugKey = tuple[str, str]
+
+
+class PlugTarget:
+    """
+    One requested state change: turn the plug with this alias on or off.
+    strip picks the HS300 when the same alias is used on several strips.
+    """
+
+    def __init__(self, alias: str, on: bool, strip: str | None = None):
+        self.alias = alias
+        self.on = on
+        self.strip = strip
+
+    def __repr__(self):
+        strip = f", strip={self.strip}" if self.strip is not None else ""
+        return f"PlugTarget(alias={self.alias}{strip}, on={self.on})"
+
+
+def parse_targets(body: Any) -> list[PlugTarget]:
+    """Parse [{"alias": str, "on": bool[, "strip": str]}, ...] (or {"targets": [...]}); raises ValueError."""
+    if isinstance(body, dict):
+        body = body.get("targets")
+    if not isinstance(body, list) or not body:
+        raise ValueError("expected a non-empty list of {alias, on} targets")
+    targets = []
+    seen = set()
+    for item in body:
+        if not isinstance(item, dict):
+            raise ValueError(f"target {item!r} is not an object")
+        alias, on, strip = item.get("alias"), item.get("on"), item.get("strip")
+        if not isinstance(alias, str) or not isinstance(on, bool):
+            raise ValueError(f"target {item!r} needs a string alias and a boolean on")
+        if strip is not None and not isinstance(strip, str):
+            raise ValueError(f"target {item!r} has a strip that is not a string")
+        if (alias, strip) in seen:
+            raise ValueError(f"plug {alias} is listed twice")
+        seen.add((alias, strip))
+        targets.append(PlugTarget(alias, on, strip))
+    return targets
+
+
+def plug_name(key: PlugKey) -> str:
+    alias, strip = key
+    return f"{alias} on {strip}" if strip else alias
+
+
+class UnknownPlug(LookupError):
+    pass
+
+
+class AmbiguousAlias(LookupError):
+    pass
+
+
+def find_plug(keys: Iterable[PlugKey], target: PlugTarget) -> PlugKey:
+    """
+    The key of the plug target names. An alias without a strip must belong
+    to exactly one plug; raises UnknownPlug or AmbiguousAlias otherwise.
+    """
+    matches = [
+        key
+        for key in keys
+        if key[0] == target.alias and (target.strip is None or key[1] == target.strip)
+    ]
+    if not matches:
+        if target.strip is not None:
+            raise UnknownPlug(f"no plug with this alias on strip {target.strip}")
+        raise UnknownPlug("no plug with this alias")
+    if len(matches) > 1:
+        strips = ", ".join(sorted(strip or "no strip" for _, strip in matches))
+        raise AmbiguousAlias(f"alias {target.alias} is on several strips ({strips}), give its strip")
+    return matches[0]
+
+
+class AliasIndex:
+    """
+    (alias, strip) to host of every plug seen by a scrape, so a control
+    request only connects to the hosts it needs. An HS300 outlet maps to the
+    strip's host.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts: dict[PlugKey, str] = {}
+
+    def update(self, host: str, keys: list[PlugKey]):
+        with self.lock:
+            for key in [key for key, known in self.hosts.items() if known == host]:
+                del self.hosts[key]
+            for key in keys:
+                self.hosts[key] = host
+
+    def group(
+        self, targets: list[PlugTarget]
+    ) -> tuple[dict[str, list[tuple[PlugTarget, PlugKey]]], list[tuple[PlugTarget, LookupError]]]:
+        """Split targets into {host: [(target, key)]} and the targets that could not be found."""
+        by_host: dict[str, list[tuple[PlugTarget, PlugKey]]] = {}
+        unresolved = []
+        with self.lock:
+            for target in targets:
+                try:
+                    key = find_plug(self.hosts, target)
+                except LookupError as e:
+                    unresolved.append((target, e))
+                    continue
+                by_host.setdefault(self.hosts[key], []).append((target, key))
+        return by_host, unresolved
+
+    def __len__(self):
+        with self.lock:
+            return len(self.hosts)
+
+
+def result(target: PlugTarget, error: Exception | str | None = None, strip: str | None = None) -> dict:
+    """strip is the resolved strip of the plug, reported when it has one."""
+    strip = target.strip if strip is None else strip
+    item = {"alias": target.alias, "on": target.on}
+    if strip:
+        item["strip"] = strip
+    if error is None:
+        return {**item, "status": "success"}
+    return {**item, "status": "failure", "message": str(error)}
+
+
+async def apply_states(plugs: dict[PlugKey, Device], targets: list[PlugTarget]) -> list[dict]:
+    """
+    Switch every target concurrently; plugs maps (alias, strip) to the
+    device (or strip outlet) object. Outlets of the same HS300 going the same
+    way are sent as one request. Returns one result per target, in request
+    order.
+    """
+    results: list[dict | None] = [None] * len(targets)
+    strip_groups: dict[tuple[int, bool], tuple[Device, list[tuple[int, PlugKey]]]] = {}
+    singles = []
+    for i, target in enumerate(targets):
+        try:
+            key = find_plug(plugs, target)
+        except LookupError as e:
+            results[i] = result(target, e)
+            continue
+        plug = plugs[key]
+        if isinstance(getattr(plug, "parent", None), IotStrip):
+            group_key = (id(plug.parent), target.on)
+            strip_groups.setdefault(group_key, (plug.parent, []))[1].append((i, key))
+        else:
+            singles.append((i, key))
+
+    async def apply(i: int, key: PlugKey):
+        target, plug = targets[i], plugs[key]
+        try:
+            if target.on:
+                await plug.turn_on()
+            else:
+                await plug.turn_off()
+        except Exception as e:
+            results[i] = result(target, e, key[1])
+            return
+        results[i] = result(target, strip=key[1])
+
+    async def apply_strip(strip: Device, group: list[tuple[int, PlugKey]]):
+        on = targets[group[0][0]].on
+        try:
+            await set_children_state(strip, [plugs[key] for _, key in group], on)
+        except Exception as e:
+            for i, key in group:
+                results[i] = result(targets[i], e, key[1])
+            return
+        for i, key in group:
+            results[i] = result(targets[i], strip=key[1])
+
+    await asyncio.gather(
+        *(apply(i, key) for i, key in singles),
+        *(apply_strip(strip, group) for strip, group in strip_groups.values()),
+    )
+    return results
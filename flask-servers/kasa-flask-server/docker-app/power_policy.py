@@ -0,0 +1,106 @@
+from logging import Logger
+from typing import Awaitable, Callable
+
+from plug_control import PlugKey, plug_name
+
+
+class IdleState:
+    """How long one desktop has been continuously below the threshold."""
+
+    def __init__(self):
+        self.samples = 0
+        self.since: float | None = None
+        self.last_action: float | None = None
+
+    def reset(self):
+        self.samples = 0
+        self.since = None
+
+
+class IdlePowerPolicy:
+    """
+    Turns a desktop's plug off once it has idled below threshold_watts for
+    min_samples consecutive polls and at least min_idle_seconds, using the
+    readings the energy poller already has instead of a fresh connect sweep.
+
+    One sample above the threshold, a missing reading or the plug being off
+    starts the count over, so a single low reading never triggers. After an
+    action the desktop is left alone for cooldown_seconds. With dry_run the
+    decision is only logged and announced.
+
+    Plugs are tracked by (alias, strip): a desktop alias used on two strips
+    is two plugs, each judged on its own readings.
+    """
+
+    def __init__(
+        self,
+        desktops: list[str],
+        threshold_watts: float,
+        logger: Logger,
+        notify: Callable[[str], Awaitable[None]],
+        min_samples: int = 4,
+        min_idle_seconds: float = 600,
+        cooldown_seconds: float = 3600,
+        dry_run: bool = True,
+    ):
+        self.desktops = desktops
+        self.threshold_watts = threshold_watts
+        self.logger = logger
+        self.notify = notify
+        self.min_samples = min_samples
+        self.min_idle_seconds = min_idle_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.dry_run = dry_run
+        self.states: dict[PlugKey, IdleState] = {}
+        self.actions: dict[PlugKey, int] = {}
+
+    def observe(self, now: float, key: PlugKey, watts: int | None, is_on: bool | None) -> bool:
+        """Record one poll of a desktop; True when it should be turned off now."""
+        state = self.states.setdefault(key, IdleState())
+        if watts is None or not is_on or watts >= self.threshold_watts:
+            state.reset()
+            return False
+        state.samples += 1
+        if state.since is None:
+            state.since = now
+        if state.samples < self.min_samples or now - state.since < self.min_idle_seconds:
+            return False
+        if state.last_action is not None and now - state.last_action < self.cooldown_seconds:
+            return False
+        return True
+
+    async def evaluate(
+        self,
+        now: float,
+        readings: dict[PlugKey, int],
+        states: dict[PlugKey, bool],
+        turn_off: Callable[[PlugKey], Awaitable[None]],
+    ):
+        # a plug tracked before but missing from this poll restarts its count
+        keys = sorted(
+            key for key in set(readings) | set(states) | set(self.states) if key[0] in self.desktops
+        )
+        for key in keys:
+            if not self.observe(now, key, readings.get(key), states.get(key)):
+                continue
+            name = plug_name(key)
+            state = self.states[key]
+            idle_minutes = (now - state.since) / 60
+            state.last_action = now
+            state.reset()
+            if self.dry_run:
+                message = (
+                    f"Plug {name} idle below {self.threshold_watts}W for "
+                    f"{idle_minutes:.0f} min, would be turned off (dry run)"
+                )
+                self.logger.info(message)
+                await self.notify(message)
+            else:
+                try:
+                    await turn_off(key)
+                except Exception as e:
+                    self.logger.error(f"Plug {name} ------------ Auto power-off failed: error: {e}")
+                    continue
+                self.logger.info(f"Plug {name} turned off after {idle_minutes:.0f} min idle")
+                await self.notify(f"Plug {name} turned off after {idle_minutes:.0f} min idle")
+            self.actions[key] = self.actions.get(key, 0) + 1
@@ -0,0 +1,222 @@
+"""
+Prometheus remote-write client for the kasa exporter's own samples.
+
+Samples are queued as they are polled and pushed in batches, so history is
+kept at the poll interval while Prometheus keeps scraping every job at its
+global interval. The payload is a WriteRequest protobuf, snappy block
+compressed, per the remote-write 1.0 spec:
+
+    WriteRequest { repeated TimeSeries timeseries = 1; }
+    TimeSeries   { repeated Label labels = 1; repeated Sample samples = 2; }
+    Label        { string name = 1; string value = 2; }
+    Sample       { double value = 1; int64 timestamp = 2; }
+
+The four messages are encoded by hand rather than pulling in protobuf.
+"""
+
+import random
+import struct
+import threading
+import time
+from collections import deque
+from logging import Logger
+
+import requests
+from sample_store import device_labels
+
+# wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+HEADERS = {
+    "Content-Encoding": "snappy",
+    "Content-Type": "application/x-protobuf",
+    "User-Agent": "kasa-flask-server",
+    "X-Prometheus-Remote-Write-Version": "0.1.0",
+}
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64  # int64 is sent as its two's complement
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_key(field: int, wire_type: int) -> bytes:
+    return encode_varint((field << 3) | wire_type)
+
+
+def encode_bytes(field: int, data: bytes) -> bytes:
+    return encode_key(field, LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+
+def encode_label(name: str, value: str) -> bytes:
+    return encode_bytes(1, name.encode()) + encode_bytes(2, value.encode())
+
+
+def encode_sample(value: float, timestamp_ms: int) -> bytes:
+    return (
+        encode_key(1, FIXED64)
+        + struct.pack("<d", value)
+        + encode_key(2, VARINT)
+        + encode_varint(timestamp_ms)
+    )
+
+
+def encode_write_request(series: dict[tuple[tuple[str, str], ...], list[tuple[float, int]]]) -> bytes:
+    """Encode {sorted label pairs: [(value, timestamp_ms), ...]} as a WriteRequest."""
+    out = bytearray()
+    for labels, samples in series.items():
+        body = bytearray()
+        for name, value in labels:
+            body += encode_bytes(1, encode_label(name, value))
+        for value, timestamp_ms in samples:
+            body += encode_bytes(2, encode_sample(value, timestamp_ms))
+        out += encode_bytes(1, bytes(body))
+    return bytes(out)
+
+
+def snappy_literal_block(data: bytes) -> bytes:
+    """
+    A valid snappy block made only of literals, for when cramjam is not
+    installed: the receiver decodes it fine, it just is not smaller.
+    """
+    out = bytearray(encode_varint(len(data)))
+    for start in range(0, len(data), 65536):
+        chunk = data[start:start + 65536]
+        n = len(chunk) - 1
+        if n < 60:
+            out.append(n << 2)
+        elif n < 256:
+            out += bytes([60 << 2, n])
+        else:
+            out += bytes([61 << 2]) + n.to_bytes(2, "little")
+        out += chunk
+    return bytes(out)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    try:
+        import cramjam
+    except ImportError:
+        return snappy_literal_block(data)
+    return bytes(cramjam.snappy.compress_raw(data))
+
+
+class RemoteWriter:
+    """
+    Bounded queue of samples pushed by a background thread.
+
+    When the endpoint is down the queue keeps the newest max_queue samples
+    and drops the oldest. Failed pushes are retried with exponential backoff
+    and jitter; a 4xx other than 429 means the batch itself was rejected, so
+    it is dropped rather than retried forever, as Prometheus does.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        logger: Logger,
+        labels: dict[str, str] | None = None,
+        batch_size: int = 500,
+        max_queue: int = 10000,
+        flush_interval: float = 15,
+        timeout: float = 10,
+        min_backoff: float = 1,
+        max_backoff: float = 60,
+    ):
+        self.url = url
+        self.logger = logger
+        self.labels = labels or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.queue: deque[tuple[tuple[tuple[str, str], ...], float, int]] = deque(maxlen=max_queue)
+        self.condition = threading.Condition()
+        self.session = requests.Session()
+        self.sent_samples = 0
+        self.dropped_samples = 0
+        self.failed_pushes = 0
+
+    def append(self, ts: float, readings: dict, name: str = "kasapower_watts"):
+        """Queue one reading per device taken at ts (unix seconds)."""
+        timestamp_ms = int(ts * 1000)
+        with self.condition:
+            for key, value in readings.items():
+                labels = tuple(sorted({**self.labels, "__name__": name, **device_labels(key)}.items()))
+                if len(self.queue) == self.queue.maxlen:
+                    self.dropped_samples += 1
+                self.queue.append((labels, float(value), timestamp_ms))
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify()
+
+    def take_batch(self) -> list:
+        with self.condition:
+            return [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+
+    def requeue(self, batch: list):
+        """Put a failed batch back at the front, as far as the queue bound allows."""
+        with self.condition:
+            room = self.queue.maxlen - len(self.queue)
+            keep = batch[len(batch) - room:] if room < len(batch) else batch
+            self.dropped_samples += len(batch) - len(keep)
+            self.queue.extendleft(reversed(keep))
+
+    def push(self, batch: list) -> bool:
+        """Send one batch; True when it is done with (sent or rejected), False to retry."""
+        series: dict[tuple[tuple[str, str], ...], list[tuple[float, int]]] = {}
+        for labels, value, timestamp_ms in batch:
+            series.setdefault(labels, []).append((value, timestamp_ms))
+        for samples in series.values():
+            samples.sort(key=lambda sample: sample[1])
+        body = snappy_compress(encode_write_request(series))
+        try:
+            response = self.session.post(self.url, data=body, headers=HEADERS, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.logger.warning(f"Remote write to {self.url} failed: {e}")
+            return False
+        if response.status_code < 300:
+            self.sent_samples += len(batch)
+            return True
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            self.logger.error(
+                f"Remote write rejected {len(batch)} samples: {response.status_code} {response.text[:200]}"
+            )
+            self.dropped_samples += len(batch)
+            return True
+        self.logger.warning(f"Remote write to {self.url} got {response.status_code}, will retry")
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.min_backoff * 2**attempt)
+        return delay * random.uniform(0.5, 1)
+
+    def run(self):
+        attempt = 0
+        while True:
+            with self.condition:
+                if len(self.queue) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+            batch = self.take_batch()
+            while batch:
+                if self.push(batch):
+                    attempt = 0
+                    # drain a backlog without waiting a whole flush interval
+                    batch = self.take_batch() if len(self.queue) >= self.batch_size else []
+                    continue
+                self.failed_pushes += 1
+                self.requeue(batch)
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                batch = self.take_batch()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name="kasa-remote-write").start()
@@ -0,0 +1,245 @@
+"""
+Local store of every power sample the kasa exporter polls, so data lost in
+Prometheus (an outage, a redeploy, prometheus/delete_data.sh) can be
+backfilled.
+
+SQLite in WAL mode: samples are buffered in memory and written in one
+transaction per batch, and rows older than the retention are pruned about
+once an hour. Export writes OpenMetrics for promtool:
+
+    python sample_store.py export --db /data/kasa-samples.db \\
+        --start 2026-10-01T00:00 --end 2026-10-02T00:00 -o gap.om
+    promtool tsdb create-blocks-from openmetrics gap.om /prometheus
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, TextIO
+
+METRIC_NAME = "kasapower_watts"
+METRIC_HELP = "Power consumption in watts for each device"
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def device_labels(key: str | tuple[str, str]) -> dict[str, str]:
+    """Labels for a reading keyed by (alias, strip), or by a bare alias."""
+    device, strip = (key, "") if isinstance(key, str) else key
+    # an empty label is the same as none to Prometheus, so KP125M series
+    # keep their original label set
+    return {"device": device, "strip": strip} if strip else {"device": device}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    UNIQUE (name, labels)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    series_id INTEGER NOT NULL REFERENCES series (id),
+    ts_ms INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series_id, ts_ms)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts_ms);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # a crash can lose the last batch either way, so skip the fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class SampleStore:
+    """
+    Append-only sample buffer in front of SQLite.
+
+    append() only takes the lock and extends a list; the insert happens once
+    batch_size samples or flush_interval seconds have accumulated. clock gives
+    the wall time retention is measured against.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retention_days: float = 30,
+        batch_size: int = 500,
+        flush_interval: float = 60,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.conn = connect(path)
+        self.series_ids: dict[tuple[str, str], int] = {}
+        self.pending: list[tuple[tuple[str, str], int, float]] = []
+        self.last_flush = time.monotonic()
+        self.last_prune = time.monotonic()
+
+    def append(self, ts: float, readings: dict, name: str = METRIC_NAME):
+        """Buffer one reading per device taken at ts (unix seconds)."""
+        ts_ms = int(ts * 1000)
+        with self.lock:
+            for key, value in readings.items():
+                labels = json.dumps(device_labels(key), sort_keys=True)
+                self.pending.append(((name, labels), ts_ms, float(value)))
+            due = (
+                len(self.pending) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def series_id(self, key: tuple[str, str]) -> int:
+        series_id = self.series_ids.get(key)
+        if series_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO series (name, labels) VALUES (?, ?)", key)
+            (series_id,) = self.conn.execute(
+                "SELECT id FROM series WHERE name = ? AND labels = ?", key
+            ).fetchone()
+            self.series_ids[key] = series_id
+        return series_id
+
+    def flush(self):
+        """Write buffered samples in one transaction, then prune if an hour has passed."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+            if pending:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO samples (series_id, ts_ms, value) VALUES (?, ?, ?)",
+                        [(self.series_id(key), ts_ms, value) for key, ts_ms, value in pending],
+                    )
+            if time.monotonic() - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+                self.prune()
+
+    def prune(self, now: float | None = None) -> int:
+        """
+        Delete samples past the retention, and series left without samples;
+        call with the lock held. Returns how many samples were deleted.
+        """
+        now = self.clock() if now is None else now
+        cutoff_ms = int((now - self.retention_days * 86400) * 1000)
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM samples WHERE ts_ms < ?", (cutoff_ms,)).rowcount
+            removed = self.conn.execute(
+                "DELETE FROM series WHERE NOT EXISTS "
+                "(SELECT 1 FROM samples WHERE samples.series_id = series.id)"
+            ).rowcount
+        if removed:
+            # ids of removed series must not be reused from the cache
+            self.series_ids.clear()
+        self.last_prune = time.monotonic()
+        return deleted
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def export_openmetrics(
+    conn: sqlite3.Connection, out: TextIO, start: float | None = None, end: float | None = None
+) -> int:
+    """
+    Write samples in [start, end) as OpenMetrics with timestamps, grouped
+    by metric family and ordered by series then time as promtool expects.
+    Returns how many samples were written.
+    """
+    query = (
+        "SELECT series.name, series.labels, samples.ts_ms, samples.value "
+        "FROM samples JOIN series ON series.id = samples.series_id "
+        "WHERE samples.ts_ms >= ? AND samples.ts_ms < ? "
+        "ORDER BY series.name, series.id, samples.ts_ms"
+    )
+    start_ms = int(start * 1000) if start is not None else -(2**62)
+    end_ms = int(end * 1000) if end is not None else 2**62
+    written = 0
+    family = None
+    for name, labels, ts_ms, value in conn.execute(query, (start_ms, end_ms)):
+        if name != family:
+            family = name
+            if name == METRIC_NAME:
+                out.write(f"# HELP {name} {METRIC_HELP}\n")
+            out.write(f"# TYPE {name} gauge\n")
+            if name.endswith("_watts"):
+                out.write(f"# UNIT {name} watts\n")
+        label_text = ",".join(
+            f'{key}="{escape_label_value(str(val))}"' for key, val in json.loads(labels).items()
+        )
+        out.write(f"{name}{{{label_text}}} {format_value(value)} {ts_ms / 1000:.3f}\n")
+        written += 1
+    out.write("# EOF\n")
+    return written
+
+
+def parse_time(text: str) -> float:
+    """Unix seconds or an ISO 8601 date/time (local time unless it has an offset)."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect and export the kasa sample store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write samples as OpenMetrics for promtool")
+    export.add_argument("--db", required=True)
+    export.add_argument("--start", type=parse_time, help="unix seconds or ISO time, inclusive")
+    export.add_argument("--end", type=parse_time, help="unix seconds or ISO time, exclusive")
+    export.add_argument("-o", "--output", default="-", help="file to write, stdout by default")
+    stats = commands.add_parser("stats", help="series, sample count and time range")
+    stats.add_argument("--db", required=True)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    conn = connect(args.db)
+    if args.command == "stats":
+        (series,) = conn.execute("SELECT COUNT(*) FROM series").fetchone()
+        count, first, last = conn.execute(
+            "SELECT COUNT(*), MIN(ts_ms), MAX(ts_ms) FROM samples"
+        ).fetchone()
+        print(f"series: {series}, samples: {count}")
+        if count:
+            print(f"from {datetime.fromtimestamp(first / 1000)} to {datetime.fromtimestamp(last / 1000)}")
+        return 0
+
+    if args.output == "-":
+        written = export_openmetrics(conn, sys.stdout, args.start, args.end)
+    else:
+        with open(args.output, "w") as out:
+            written = export_openmetrics(conn, out, args.start, args.end)
+    print(f"exported {written} samples", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+class DeviceHealth:
+    """Outcome of the latest connection to one device."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.up: bool | None = None  # None until the first attempt finishes
+        self.last_success: float | None = None
+        self.last_error: str | None = None
+        self.consecutive_failures = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "up": self.up,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class Startup:
+    """
+    Tracks warm-up (the first connection to every device, made in parallel
+    before the exporter reports ready) and each device's health afterwards.
+
+    Ready once every device has been tried, or warmup_timeout seconds after
+    begin(), so one dead plug delays readiness but cannot block it.
+    """
+
+    def __init__(self, warmup_timeout: float = 60):
+        self.warmup_timeout = warmup_timeout
+        self.lock = threading.Lock()
+        self.devices: dict[str, DeviceHealth] = {}
+        self.started: float | None = None
+        self.finished = threading.Event()
+        self.import_seconds: float | None = None
+        self.warmup_seconds: float | None = None
+
+    def begin(self, hosts: list[str]):
+        with self.lock:
+            self.started = time.monotonic()
+            for host in hosts:
+                self.devices.setdefault(host, DeviceHealth(host))
+
+    def record(self, host: str, error: Exception | None = None):
+        with self.lock:
+            health = self.devices.setdefault(host, DeviceHealth(host))
+            if error is None:
+                health.up = True
+                health.last_success = time.time()
+                health.last_error = None
+                health.consecutive_failures = 0
+            else:
+                health.up = False
+                health.last_error = str(error) or type(error).__name__
+                health.consecutive_failures += 1
+
+    def finish(self):
+        """Mark warm-up complete; later calls are no-ops."""
+        with self.lock:
+            if self.finished.is_set():
+                return
+            if self.started is not None:
+                self.warmup_seconds = time.monotonic() - self.started
+            self.finished.set()
+
+    @property
+    def ready(self) -> bool:
+        if self.finished.is_set():
+            return True
+        return self.started is not None and time.monotonic() - self.started >= self.warmup_timeout
+
+    def status(self) -> dict:
+        with self.lock:
+            devices = {host: health.to_dict() for host, health in self.devices.items()}
+        if self.finished.is_set():
+            phase = "ready"
+        elif self.started is None:
+            phase = "starting"
+        elif self.ready:
+            phase = "warm-up timed out"
+        else:
+            phase = "warming up"
+        return {
+            "phase": phase,
+            "devices_total": len(devices),
+            "devices_done": sum(1 for health in devices.values() if health["up"] is not None),
+            "devices_up": sum(1 for health in devices.values() if health["up"]),
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "devices": devices,
+        }
+
+    def device_up(self) -> dict[str, bool]:
+        with self.lock:
+            return {
+                host: health.up
+                for host, health in self.devices.items()
+                if health.up is not None
+            }
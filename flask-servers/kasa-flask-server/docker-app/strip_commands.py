@@ -0,0 +1,48 @@
+"""
+Multi-outlet commands for the HS300.
+
+The legacy protocol addresses outlets through a request's context, and the
+context takes a list of child ids, so one set_relay_state can switch any
+number of outlets in a single round trip where python-kasa sends one
+request per outlet.
+
+Energy reads cannot be batched the same way: a request carries one
+get_realtime result, not one per child id, so the poller keeps one
+get_realtime per outlet over the strip's single connection.
+"""
+
+from kasa import Device
+
+
+def relay_request(child_ids: list[str], on: bool) -> dict:
+    return {
+        "context": {"child_ids": child_ids},
+        "system": {"set_relay_state": {"state": 1 if on else 0}},
+    }
+
+
+async def set_children_state(strip: Device, plugs: list[Device], on: bool) -> bool:
+    """
+    Switch all of plugs (outlets of strip) with one request; returns True if
+    it was batched. If the strip answers the batch with an error code, each
+    outlet is switched with its own request instead. Transport errors are
+    raised, not retried per outlet.
+    """
+    if not plugs:
+        return True
+    child_ids = [plug.child_id for plug in plugs]
+    response = await strip.protocol.query(relay_request(child_ids, on))
+    err_code = response.get("system", {}).get("set_relay_state", {}).get("err_code", -1)
+    if err_code != 0:
+        for plug in plugs:
+            if on:
+                await plug.turn_on()
+            else:
+                await plug.turn_off()
+        return False
+    # keep the cached state in step until the next update
+    for child in strip.sys_info.get("children", []):
+        if child.get("id") in child_ids:
+            child["state"] = 1 if on else 0
+    return True
+
@@ -0,0 +1,153 @@
+"""
+Opt-in span tracing and sampling profiler for the kasa exporter.
+
+Spans are written as Chrome trace events (one JSON object per line after an
+opening "[", which the format allows to stay unterminated), so a trace
+file opens directly in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off unless configure() is given a path; span() then returns a
+shared no-op context manager, so the instrumentation can stay in place.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+NOOP_SPAN = nullcontext()
+MAX_STACK_DEPTH = 64
+
+
+class TraceWriter:
+    """Appends trace events to path, rotating to path.1 .. path.<backups> past max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "a")
+        if self.file.tell() == 0:
+            self.file.write("[\n")
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def write(self, event: dict):
+        line = json.dumps(event, default=str) + ",\n"
+        with self.lock:
+            if self.file is None:
+                self.open()
+            elif self.file.tell() + len(line) > self.max_bytes:
+                self.rotate()
+            self.file.write(line)
+            self.file.flush()
+
+
+WRITER: TraceWriter | None = None
+
+
+def configure(path: str | None, max_bytes: int = 10 * 1024 * 1024, backups: int = 3):
+    """Enable tracing to path; None disables it."""
+    global WRITER
+    WRITER = TraceWriter(path, max_bytes, backups) if path else None
+
+
+def enabled() -> bool:
+    return WRITER is not None
+
+
+def track_id() -> int:
+    # concurrent coroutines share a thread, so give each task its own track
+    # or their spans would appear wrongly nested
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+@contextmanager
+def _span(writer: TraceWriter, name: str, args: dict):
+    start = time.perf_counter_ns()
+    ts = time.time_ns() // 1000
+    try:
+        yield
+    except BaseException as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        writer.write(
+            {
+                "name": name,
+                "cat": "kasa",
+                "ph": "X",
+                "ts": ts,
+                "dur": (time.perf_counter_ns() - start) // 1000,
+                "pid": os.getpid(),
+                "tid": track_id(),
+                "args": args,
+            }
+        )
+
+
+def span(name: str, **args):
+    """Time the with-block as a trace span; args are attached to the event."""
+    writer = WRITER
+    if writer is None:
+        return NOOP_SPAN
+    return _span(writer, name, args)
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Sample every other thread's stack every interval for seconds, returning
+    counts of collapsed stacks ("thread;outer;...;inner").
+
+    Coroutines parked on I/O have no frame on any thread, so time spent
+    waiting on a device shows up as the event loop's select, not the caller.
+    """
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    """Render sample_stacks() output in the folded format flamegraph.pl and speedscope read."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
@@ -0,0 +1,101 @@
+import importlib.util
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+from broadcaster import Broadcaster
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+
+def test_publish_fans_out_to_every_subscriber():
+    broadcaster = Broadcaster(max_queue=4)
+    subs = [broadcaster.subscribe([]) for _ in range(3)]
+
+    broadcaster.publish("power", {"watts": 42})
+
+    for sub in subs:
+        assert sub.queue.get_nowait() == 'event: power\ndata: {"watts":42}\n\n'
+
+
+def test_slow_subscriber_is_dropped_without_blocking_others():
+    broadcaster = Broadcaster(max_queue=2)
+    slow = broadcaster.subscribe([])
+    fast = broadcaster.subscribe([])
+
+    for i in range(3):
+        broadcaster.publish("power", {"i": i})
+        fast.queue.get_nowait()
+
+    assert slow.dropped
+    assert not fast.dropped
+    assert len(broadcaster) == 1
+    assert broadcaster.dropped_clients == 1
+    assert list(slow.messages(keepalive=0.01)) == []
+
+
+def test_subscribe_refuses_past_max_clients():
+    broadcaster = Broadcaster(max_clients=1)
+
+    assert broadcaster.subscribe([]) is not None
+    assert broadcaster.subscribe([]) is None
+
+
+def test_idle_stream_sends_keepalive():
+    sub = Broadcaster().subscribe([])
+
+    assert next(sub.messages(keepalive=0.01)) == ": keepalive\n\n"
+
+
+def test_stream_needs_the_poller(monkeypatch):
+    monkeypatch.setattr(FLASK_APP, "ENERGY_POLLER", None)
+
+    assert FLASK_APP.app.test_client().get("/stream").status_code == 503
+
+
+def test_stream_starts_with_snapshot_then_follows_poll_rounds(monkeypatch):
+    poller = SimpleNamespace(
+        snapshot=lambda: {("13k", "rack1"): 180},
+        plug_states=lambda: {("13k", "rack1"): True},
+    )
+    broadcaster = Broadcaster()
+    monkeypatch.setattr(FLASK_APP, "ENERGY_POLLER", poller)
+    monkeypatch.setattr(FLASK_APP, "BROADCASTER", broadcaster)
+    monkeypatch.setattr(FLASK_APP, "PLUG_STATES", {("13k", "rack1"): True})
+
+    response = FLASK_APP.app.test_client().get("/stream")
+    assert response.mimetype == "text/event-stream"
+    chunks = response.response
+    first = next(chunks).decode()
+    assert first.startswith("event: power\n")
+    assert '"device":"13k","strip":"rack1","watts":180' in first
+    assert next(chunks).decode().startswith("event: state\n")
+
+    # the next round, published from the poller's thread
+    poller.plug_states = lambda: {("13k", "rack1"): False}
+    publisher = threading.Thread(target=FLASK_APP.publish_round, args=({("13k", "rack1"): 2},))
+    publisher.start()
+    publisher.join()
+
+    assert '"watts":2' in next(chunks).decode()
+    event, data = next(chunks).decode().split("\n")[:2]
+    assert event == "event: state"
+    payload = json.loads(data.removeprefix("data: "))
+    assert (payload["device"], payload["strip"], payload["on"]) == ("13k", "rack1", False)
+    response.close()
+    assert len(broadcaster) == 0
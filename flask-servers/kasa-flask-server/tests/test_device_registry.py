@@ -0,0 +1,164 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from kasa import (
+    DeviceConnectionParameters,
+    DeviceEncryptionType,
+    DeviceFamily,
+)
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+from device_registry import DeviceRecord, DeviceRegistry
+from discovery import DiscoveryService
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+KLAP = DeviceConnectionParameters(
+    device_family=DeviceFamily.SmartKasaPlug,
+    encryption_type=DeviceEncryptionType.Klap,
+    login_version=2,
+    https=False,
+    http_port=80,
+)
+
+
+def make_record(device_id="AA:BB:CC:DD:EE:01", host="10.20.0.146", alias="LG45"):
+    return DeviceRecord(
+        device_id=device_id,
+        host=host,
+        alias=alias,
+        model="KP125M",
+        connection=KLAP.to_dict(),
+    )
+
+
+def test_registry_persists_across_restarts(tmp_path):
+    path = tmp_path / "kasa-devices.json"
+    registry = DeviceRegistry(str(path))
+    registry.update(make_record())
+    registry.save()
+
+    reloaded = DeviceRegistry(str(path))
+
+    record = reloaded.get_by_host("10.20.0.146")
+    assert record.alias == "LG45"
+    assert record.connection_params.encryption_type is DeviceEncryptionType.Klap
+
+
+def test_registry_follows_device_to_new_host(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    registry.update(make_record(host="10.20.0.146"))
+    # rediscovered at a new address before the alias could be queried
+    registry.update(make_record(host="10.20.0.200", alias=None))
+
+    assert registry.get_by_host("10.20.0.146") is None
+    assert registry.get_by_host("10.20.0.200").alias == "LG45"
+    assert registry.hosts("KP125M") == ["10.20.0.200"]
+
+
+def test_registry_drops_device_whose_address_was_reused(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    registry.update(make_record(device_id="AA:BB:CC:DD:EE:01", host="10.20.0.146"))
+    registry.update(make_record(device_id="AA:BB:CC:DD:EE:02", host="10.20.0.146", alias="kuycon"))
+
+    assert len(registry) == 1
+    assert registry.get_by_host("10.20.0.146").alias == "kuycon"
+
+
+def test_discover_once_records_discovered_devices(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    device = SimpleNamespace(
+        host="10.20.0.200",
+        mac="AA:BB:CC:DD:EE:01",
+        alias="LG45",
+        model="KP125M",
+        config=SimpleNamespace(connection_type=KLAP),
+        update=AsyncMock(),
+        disconnect=AsyncMock(),
+    )
+    service = DiscoveryService(registry, logging.getLogger("test"))
+
+    with patch("discovery.Discover.discover", AsyncMock(return_value={"10.20.0.200": device})):
+        assert asyncio.run(service.discover_once()) == 1
+
+    device.disconnect.assert_awaited_once()
+    assert DeviceRegistry(registry.path).hosts("KP125M") == ["10.20.0.200"]
+
+
+def test_kp125m_ips_follow_configured_devices_only(tmp_path, monkeypatch):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    monkeypatch.setattr(FLASK_APP, "DEVICE_REGISTRY", registry)
+    monkeypatch.setattr(FLASK_APP.CONFIG, "KP125M_IPS", ["10.20.0.146", "10.20.0.100"])
+
+    assert FLASK_APP.kp125m_ips() == ["10.20.0.146", "10.20.0.100"]
+
+    # LG45 is seen at its configured address, then moves; a neighbour's
+    # plug is discovered too, and 10.20.0.100 missed the discovery round
+    registry.update(make_record(host="10.20.0.146"))
+    assert FLASK_APP.kp125m_ips() == ["10.20.0.146", "10.20.0.100"]
+    registry.update(make_record(host="10.20.0.200"))
+    registry.update(make_record(device_id="AA:BB:CC:DD:EE:09", host="10.20.0.55", alias="spare"))
+
+    assert FLASK_APP.kp125m_ips() == ["10.20.0.200", "10.20.0.100"]
+
+
+def test_stale_records_are_pruned_and_not_followed(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    registry.update(make_record(host="10.20.0.146"))
+    registry.resolve(["10.20.0.146"], "KP125M", max_age=3600)
+    registry.update(make_record(host="10.20.0.200"))
+    later = time.time() + 7200
+
+    assert registry.resolve(["10.20.0.146"], "KP125M", max_age=3600, now=later) == ["10.20.0.146"]
+    assert registry.prune(max_age=3600, now=later) == 1
+    assert len(registry) == 0
+
+
+def test_claims_survive_a_restart(tmp_path):
+    path = str(tmp_path / "kasa-devices.json")
+    registry = DeviceRegistry(path)
+    registry.update(make_record(host="10.20.0.146"))
+    registry.resolve(["10.20.0.146"], "KP125M", max_age=3600)
+    registry.update(make_record(host="10.20.0.200"))
+    registry.save()
+
+    assert DeviceRegistry(path).resolve(["10.20.0.146"], "KP125M", max_age=3600) == ["10.20.0.200"]
+
+
+def test_connect_to_kp125m_device_prefers_discovered_connection_param(tmp_path, monkeypatch):
+    registry = DeviceRegistry(str(tmp_path / "kasa-devices.json"))
+    registry.update(make_record(host="10.20.0.200"))
+    monkeypatch.setattr(FLASK_APP, "DEVICE_REGISTRY", registry)
+    monkeypatch.setattr(FLASK_APP.CONFIG, "TPAP_KP125M_IPS", ["10.20.0.200"])
+    captured = {}
+
+    async def fake_connect_to_device(device_config, ip, max_retries):
+        captured["device_config"] = device_config
+        return object()
+
+    monkeypatch.setattr(FLASK_APP, "connect_to_device", fake_connect_to_device)
+
+    asyncio.run(FLASK_APP.connect_to_kp125m_device("10.20.0.200", max_retries=1))
+
+    assert (
+        captured["device_config"].connection_type.encryption_type
+        is DeviceEncryptionType.Klap
+    )
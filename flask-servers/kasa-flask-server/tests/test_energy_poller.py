@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from kasa import Module
+from kasa.iot import IotDevice
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+from energy_poller import EnergyPoller
+
+
+class FakeModule:
+    MINIMUM_UPDATE_INTERVAL_SECS = 0
+
+
+def make_kp125m(alias="LG45", watts=42.7, is_on=True):
+    energy = SimpleNamespace(MINIMUM_UPDATE_INTERVAL_SECS=0, current_consumption=watts)
+    return SimpleNamespace(
+        alias=alias,
+        is_on=is_on,
+        children=[],
+        turn_off=AsyncMock(),
+        modules={
+            Module.Energy: energy,
+            "DeviceModule": FakeModule(),
+            "Firmware": FakeModule(),
+            "Led": FakeModule(),
+        },
+        update=AsyncMock(),
+        disconnect=AsyncMock(),
+    )
+
+
+def make_hs300(alias="rack1", watts_13k=180.4):
+    strip = MagicMock(spec=IotDevice)
+    strip.alias = alias
+    strip.get_sys_info = AsyncMock(return_value={"children": []})
+    plugs = []
+    for alias, watts in [("13k", watts_13k), ("9950x", 95.0), (None, 1.0)]:
+        energy = SimpleNamespace(
+            current_consumption=None,
+            get_status=AsyncMock(return_value=SimpleNamespace(power=watts)),
+        )
+        plugs.append(
+            SimpleNamespace(
+                alias=alias, is_on=True, modules={Module.Energy: energy}, turn_off=AsyncMock()
+            )
+        )
+    strip.children = plugs
+    return strip
+
+
+def make_poller(hs300_hosts, kp125m_hosts, devices):
+    async def connect(host, max_retries):
+        dev = devices[host]
+        if isinstance(dev, Exception):
+            raise dev
+        return dev
+
+    return EnergyPoller(
+        logging.getLogger("test"),
+        hs300_hosts=lambda: hs300_hosts,
+        kp125m_hosts=lambda: kp125m_hosts,
+        connect_hs300=connect,
+        connect_kp125m=connect,
+        full_refresh_interval=600,
+    )
+
+
+def test_smart_plug_polls_only_energy_and_device_info_after_connect():
+    plug = make_kp125m()
+    poller = make_poller([], ["10.20.0.146"], {"10.20.0.146": plug})
+
+    asyncio.run(poller.poll_once())
+
+    assert poller.snapshot() == {("LG45", ""): 42}
+    assert plug.modules["Firmware"].MINIMUM_UPDATE_INTERVAL_SECS == 600
+    assert plug.modules["Led"].MINIMUM_UPDATE_INTERVAL_SECS == 600
+    assert plug.modules["DeviceModule"].MINIMUM_UPDATE_INTERVAL_SECS == 0
+    assert plug.modules[Module.Energy].MINIMUM_UPDATE_INTERVAL_SECS == 0
+
+    # the connection is kept and reused
+    asyncio.run(poller.poll_once())
+    assert poller.devices["10.20.0.146"] is plug
+    plug.update.assert_awaited_once()
+
+
+def test_strip_polls_sysinfo_and_realtime_between_full_refreshes():
+    strip = make_hs300()
+    poller = make_poller(["10.20.0.40"], [], {"10.20.0.40": strip})
+    asyncio.run(poller.poll_once())
+
+    asyncio.run(poller.poll_once())
+
+    strip.update.assert_not_called()
+    strip.get_sys_info.assert_awaited_once()
+    assert poller.snapshot() == {("13k", "rack1"): 180, ("9950x", "rack1"): 95}
+
+
+def test_strips_with_the_same_aliases_are_kept_apart():
+    devices = {
+        "10.20.0.40": make_hs300("rack1", watts_13k=180.4),
+        "10.20.0.41": make_hs300("rack2", watts_13k=60.0),
+    }
+    poller = make_poller(["10.20.0.40", "10.20.0.41"], [], devices)
+    asyncio.run(poller.poll_once())
+
+    asyncio.run(poller.poll_once())
+
+    snapshot = poller.snapshot()
+    assert snapshot[("13k", "rack1")] == 180
+    assert snapshot[("13k", "rack2")] == 60
+    assert len(snapshot) == 4
+
+
+def test_full_refresh_is_due_after_interval():
+    strip = make_hs300()
+    poller = make_poller(["10.20.0.40"], [], {"10.20.0.40": strip})
+    asyncio.run(poller.poll_once())
+    poller.last_full_refresh["10.20.0.40"] -= 601
+
+    asyncio.run(poller.poll_once())
+
+    strip.update.assert_awaited_once()
+    strip.get_sys_info.assert_not_called()
+
+
+def test_failed_device_is_dropped_from_snapshot_and_reconnected():
+    plug = make_kp125m()
+    poller = make_poller([], ["10.20.0.146"], {"10.20.0.146": plug})
+    asyncio.run(poller.poll_once())
+    plug.update.side_effect = TimeoutError("unreachable")
+
+    asyncio.run(poller.poll_once())
+
+    assert poller.snapshot() == {}
+    assert "10.20.0.146" not in poller.devices
+    plug.disconnect.assert_awaited_once()
+
+
+def test_devices_are_polled_concurrently_and_reported():
+    plugs = {f"10.20.0.{i}": make_kp125m(alias=f"plug{i}") for i in range(5)}
+
+    async def slow_update():
+        await asyncio.sleep(0.2)
+
+    for plug in plugs.values():
+        plug.update.side_effect = slow_update
+    results, rounds = [], []
+    poller = make_poller([], list(plugs), plugs)
+    poller.on_result = lambda host, error: results.append((host, error))
+    poller.on_round = lambda: rounds.append(True)
+    asyncio.run(poller.poll_once())
+
+    started = time.monotonic()
+    asyncio.run(poller.poll_once())
+
+    assert time.monotonic() - started < 0.5
+    assert sorted(results) == sorted([(host, None) for host in plugs] * 2)
+    assert rounds == [True, True]
+
+
+def test_policy_sees_states_and_turns_off_over_polled_connection():
+    strip = make_hs300()
+    plug = make_kp125m(is_on=False)
+    devices = {"10.20.0.40": strip, "10.20.0.146": plug}
+    poller = make_poller(["10.20.0.40"], ["10.20.0.146"], devices)
+    seen = {}
+
+    class Policy:
+        async def evaluate(self, now, readings, states, turn_off):
+            seen.update(states)
+            await turn_off(("9950x", "rack1"))
+
+    poller.policy = Policy()
+    asyncio.run(poller.poll_once())
+
+    assert seen == {("13k", "rack1"): True, ("9950x", "rack1"): True, ("LG45", ""): False}
+    strip.children[1].turn_off.assert_awaited_once()
+
+
+def test_same_alias_on_two_strips_is_two_plugs():
+    rack1, rack2 = make_hs300("rack1", watts_13k=180), make_hs300("rack2", watts_13k=2)
+    devices = {"10.20.0.40": rack1, "10.20.0.41": rack2}
+    poller = make_poller(list(devices), [], devices)
+    seen = {}
+
+    class Policy:
+        async def evaluate(self, now, readings, states, turn_off):
+            seen.update(readings)
+            if ("13k", "rack2") in readings:
+                await turn_off(("13k", "rack2"))
+
+    poller.policy = Policy()
+    # the first round connects, the second reads the outlets from sysinfo
+    asyncio.run(poller.poll_once())
+    asyncio.run(poller.poll_once())
+
+    assert seen[("13k", "rack1")] == 180
+    assert seen[("13k", "rack2")] == 2
+    rack2.children[0].turn_off.assert_awaited_once()
+    rack1.children[0].turn_off.assert_not_awaited()
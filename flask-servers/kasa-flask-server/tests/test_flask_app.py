@@ -2,6 +2,7 @@ import importlib.util
 import os
 import sys
 import asyncio
+import time
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
 
@@ -50,5 +51,104 @@ def test_kp125m_failure_does_not_discard_other_metrics():
         assert asyncio.run(
             flask_app.get_metrics_KP125M(["10.20.0.1", "10.20.0.2"])
         ) == {
-            "LG45": 28
+            ("LG45", ""): 28
         }
+
+
+def test_strips_are_swept_concurrently_and_labeled():
+    def make_strip(alias, watts):
+        outlet = type(
+            "Outlet",
+            (),
+            {
+                "alias": "13k",
+                "modules": {
+                    flask_app.Module.Energy: type(
+                        "Energy", (), {"current_consumption": watts}
+                    )()
+                },
+            },
+        )()
+        strip = type("Strip", (), {"alias": alias, "children": [outlet]})()
+        strip.disconnect = AsyncMock()
+        return strip
+
+    strips = {"10.20.0.40": make_strip("rack1", 180.0), "10.20.0.41": make_strip("rack2", 60.0)}
+
+    async def connect(ip):
+        await asyncio.sleep(0.2)
+        return strips[ip]
+
+    with patch.object(flask_app, "hs300_ips", lambda: list(strips)), patch.object(
+        flask_app, "kp125m_ips", lambda: []
+    ), patch.object(flask_app, "connect_to_hs300_device", connect):
+        started = time.monotonic()
+        data = asyncio.run(flask_app.get_power_data())
+        elapsed = time.monotonic() - started
+
+    assert elapsed < 0.35
+    assert data == {("13k", "rack1"): 180, ("13k", "rack2"): 60}
+    registry = flask_app.build_metrics_registry(data)
+    assert registry.get_sample_value("kasapower_watts", {"device": "13k", "strip": "rack2"}) == 60
+
+
+def test_scrape_deadline_returns_partial_results_and_marks_late_devices(monkeypatch):
+    plugs = {
+        "10.20.0.1": (0.0, "LG45", 28.0),
+        "10.20.0.2": (5.0, "kuycon", 12.0),
+    }
+
+    async def connect(ip):
+        delay, alias, watts = plugs[ip]
+        await asyncio.sleep(delay)
+        device = type(
+            "Device",
+            (),
+            {
+                "alias": alias,
+                "modules": {
+                    flask_app.Module.Energy: type(
+                        "Energy", (), {"current_consumption": watts}
+                    )()
+                },
+            },
+        )()
+        device.disconnect = AsyncMock()
+        return device
+
+    startup = flask_app.Startup()
+    monkeypatch.setattr(flask_app, "STARTUP", startup)
+    monkeypatch.setattr(flask_app, "SCRAPE_TIMEOUTS", {})
+    monkeypatch.setattr(flask_app, "ENERGY_POLLER", None)
+    monkeypatch.setattr(flask_app, "hs300_ips", lambda: [])
+    monkeypatch.setattr(flask_app, "kp125m_ips", lambda: list(plugs))
+    monkeypatch.setattr(flask_app, "connect_to_kp125m_device", connect)
+    monkeypatch.setattr(flask_app, "record_samples", lambda data: None)
+    monkeypatch.setattr(flask_app.CONFIG, "KASA_SCRAPE_TIMEOUT_MARGIN_SECONDS", 0.2)
+
+    started = time.monotonic()
+    response = flask_app.app.test_client().get(
+        "/metrics", headers={"X-Prometheus-Scrape-Timeout-Seconds": "0.5"}
+    )
+
+    assert time.monotonic() - started < 1.5
+    body = response.get_data(as_text=True)
+    assert 'kasapower_watts{device="LG45",strip=""} 28.0' in body
+    assert 'device="kuycon"' not in body
+    assert 'kasa_up{host="10.20.0.2"} 0.0' in body
+    assert 'kasa_scrape_timeouts_total{host="10.20.0.2"} 1.0' in body
+
+
+def test_scrape_deadline_leaves_room_for_the_response(monkeypatch):
+    monkeypatch.setattr(flask_app.CONFIG, "KASA_SCRAPE_TIMEOUT_MARGIN_SECONDS", 2)
+
+    with flask_app.app.test_request_context(
+        headers={"X-Prometheus-Scrape-Timeout-Seconds": "60"}
+    ):
+        assert flask_app.scrape_deadline() == 58
+    with flask_app.app.test_request_context(
+        headers={"X-Prometheus-Scrape-Timeout-Seconds": "3"}
+    ):
+        assert flask_app.scrape_deadline() == 1.5
+    with flask_app.app.test_request_context():
+        assert flask_app.scrape_deadline() == flask_app.CONFIG.KASA_SCRAPE_TIMEOUT_SECONDS - 2
@@ -0,0 +1,204 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+from plug_control import AliasIndex, AmbiguousAlias, PlugTarget, apply_states, parse_targets
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+
+def make_plug(alias, delay=0.0, error=None):
+    async def switch():
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+
+    return SimpleNamespace(
+        alias=alias,
+        children=[],
+        turn_on=AsyncMock(side_effect=switch),
+        turn_off=AsyncMock(side_effect=switch),
+        disconnect=AsyncMock(),
+    )
+
+
+def test_parse_targets():
+    targets = parse_targets({"targets": [{"alias": "LG45", "on": False}]})
+    assert [(t.alias, t.on) for t in targets] == [("LG45", False)]
+
+    assert len(parse_targets([{"alias": "LG45", "on": True}, {"alias": "kuycon", "on": True}])) == 2
+
+    targets = parse_targets([{"alias": "13k", "on": True, "strip": "rack1"},
+                             {"alias": "13k", "on": True, "strip": "rack2"}])
+    assert [t.strip for t in targets] == ["rack1", "rack2"]
+
+    for body in [None, [], [{"alias": "LG45"}], [{"alias": "LG45", "on": "off"}],
+                 [{"alias": "LG45", "on": True, "strip": 1}],
+                 [{"alias": "LG45", "on": True}, {"alias": "LG45", "on": False}]]:
+        with pytest.raises(ValueError):
+            parse_targets(body)
+
+
+def test_alias_index_follows_renames():
+    index = AliasIndex()
+    index.update("10.20.0.40", [("13k", "rack1"), ("14kf", "rack1")])
+    index.update("10.20.0.146", [("LG45", "")])
+    index.update("10.20.0.40", [("13k", "rack1"), ("14kf-renamed", "rack1")])
+    targets = [PlugTarget(alias, on=True) for alias in ["13k", "14kf", "LG45"]]
+
+    by_host, unresolved = index.group(targets)
+
+    assert {host: [key for _, key in items] for host, items in by_host.items()} == {
+        "10.20.0.40": [("13k", "rack1")],
+        "10.20.0.146": [("LG45", "")],
+    }
+    assert [(target.alias, str(error)) for target, error in unresolved] == [
+        ("14kf", "no plug with this alias")
+    ]
+
+
+def test_alias_on_two_strips_needs_its_strip():
+    index = AliasIndex()
+    index.update("10.20.0.40", [("13k", "rack1")])
+    index.update("10.20.0.41", [("13k", "rack2")])
+
+    bare, named = PlugTarget("13k", on=False), PlugTarget("13k", on=False, strip="rack2")
+
+    by_host, unresolved = index.group([bare, named])
+
+    assert by_host == {"10.20.0.41": [(named, ("13k", "rack2"))]}
+    ((target, error),) = unresolved
+    assert target is bare
+    assert isinstance(error, AmbiguousAlias)
+    assert str(error) == "alias 13k is on several strips (rack1, rack2), give its strip"
+
+
+def test_apply_states_runs_concurrently_and_reports_each_plug():
+    plugs = {(f"monitor{i}", ""): make_plug(f"monitor{i}", delay=0.2) for i in range(10)}
+    plugs[("monitor3", "")] = make_plug("monitor3", error=TimeoutError("unreachable"))
+    targets = [PlugTarget(alias, on=False) for alias, _ in plugs] + [PlugTarget("ghost", on=True)]
+
+    started = time.monotonic()
+    results = asyncio.run(apply_states(plugs, targets))
+
+    assert time.monotonic() - started < 0.5
+    assert [r["alias"] for r in results] == [t.alias for t in targets]
+    assert results[0] == {"alias": "monitor0", "on": False, "status": "success"}
+    assert results[3]["status"] == "failure"
+    assert results[-1]["message"] == "no plug with this alias"
+    plugs[("monitor0", "")].turn_off.assert_awaited_once()
+
+
+def test_apply_states_switches_the_outlet_on_the_named_strip():
+    rack1, rack2 = make_plug("13k"), make_plug("13k")
+    plugs = {("13k", "rack1"): rack1, ("13k", "rack2"): rack2}
+
+    results = asyncio.run(
+        apply_states(plugs, [PlugTarget("13k", on=False, strip="rack2"), PlugTarget("13k", on=False)])
+    )
+
+    assert results[0] == {"alias": "13k", "on": False, "strip": "rack2", "status": "success"}
+    assert results[1]["status"] == "failure"
+    assert "several strips" in results[1]["message"]
+    rack2.turn_off.assert_awaited_once()
+    rack1.turn_off.assert_not_awaited()
+
+
+def test_endpoint_uses_one_connection_per_host(monkeypatch):
+    strip = SimpleNamespace(
+        alias="strip",
+        children=[make_plug("13k"), make_plug("14kf")],
+        disconnect=AsyncMock(),
+    )
+    lg45 = make_plug("LG45")
+    connects = []
+
+    async def fake_connect(ip, max_retries):
+        connects.append(ip)
+        return {"10.20.0.40": strip, "10.20.0.146": lg45}[ip]
+
+    index = AliasIndex()
+    index.update("10.20.0.40", [("13k", "strip"), ("14kf", "strip")])
+    index.update("10.20.0.146", [("LG45", "")])
+    monkeypatch.setattr(FLASK_APP, "ALIAS_INDEX", index)
+    monkeypatch.setattr(FLASK_APP, "ENERGY_POLLER", None)
+    monkeypatch.setattr(FLASK_APP, "hs300_ips", lambda: ["10.20.0.40"])
+    monkeypatch.setattr(FLASK_APP, "connect_to_hs300_device", fake_connect)
+    monkeypatch.setattr(FLASK_APP, "connect_to_kp125m_device", fake_connect)
+
+    response = FLASK_APP.app.test_client().post(
+        "/plugs/state",
+        json=[
+            {"alias": "LG45", "on": False},
+            {"alias": "13k", "on": True},
+            {"alias": "14kf", "on": False},
+        ],
+    )
+
+    assert response.status_code == 200
+    assert [r["alias"] for r in response.get_json()["results"]] == ["LG45", "13k", "14kf"]
+    assert sorted(connects) == ["10.20.0.146", "10.20.0.40"]
+    strip.children[0].turn_on.assert_awaited_once()
+    strip.children[1].turn_off.assert_awaited_once()
+    lg45.turn_off.assert_awaited_once()
+
+
+def test_endpoint_rejects_bad_body():
+    response = FLASK_APP.app.test_client().post("/plugs/state", json={"alias": "LG45"})
+
+    assert response.status_code == 400
+
+
+def test_endpoint_reports_failures(monkeypatch):
+    index = AliasIndex()
+    monkeypatch.setattr(FLASK_APP, "ALIAS_INDEX", index)
+    monkeypatch.setattr(FLASK_APP, "ENERGY_POLLER", None)
+    monkeypatch.setattr(FLASK_APP, "get_power_data", AsyncMock(return_value={}))
+
+    response = FLASK_APP.app.test_client().post(
+        "/plugs/state", json=[{"alias": "ghost", "on": True}]
+    )
+
+    assert response.status_code == 502
+    assert response.get_json()["results"][0]["message"] == "no plug with this alias"
+
+
+def test_poller_applies_states_on_its_own_loop():
+    from energy_poller import EnergyPoller
+
+    poller = EnergyPoller(
+        None, lambda: [], lambda: [], connect_hs300=None, connect_kp125m=None
+    )
+    lg45 = make_plug("LG45")
+    poller.plugs = {"10.20.0.146": {"LG45": lg45}}
+    poller.loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=poller.loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        results = poller.set_states([PlugTarget("LG45", on=True)], timeout=5)
+    finally:
+        poller.loop.call_soon_threadsafe(poller.loop.stop)
+        thread.join()
+
+    assert results == [{"alias": "LG45", "on": True, "status": "success"}]
+    lg45.turn_on.assert_awaited_once()
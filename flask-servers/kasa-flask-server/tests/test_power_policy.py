@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+from power_policy import IdlePowerPolicy
+
+T0 = 1_790_000_000.0
+POLL = 15
+
+
+def make_policy(**kwargs):
+    options = dict(min_samples=4, min_idle_seconds=60, cooldown_seconds=3600, dry_run=False)
+    options.update(kwargs)
+    return IdlePowerPolicy(
+        ["13k", "9950x"], 7, logging.getLogger("test"), notify=AsyncMock(), **options
+    )
+
+
+DESKTOP = ("13k", "rack1")
+
+
+def run_polls(policy, watts_by_poll, is_on=True, start=T0):
+    """Feed one reading of 13k per poll; returns the turn_off mock."""
+    turn_off = AsyncMock()
+    for i, watts in enumerate(watts_by_poll):
+        readings = {} if watts is None else {DESKTOP: watts}
+        asyncio.run(policy.evaluate(start + i * POLL, readings, {DESKTOP: is_on}, turn_off))
+    return turn_off
+
+
+def test_turns_off_after_enough_idle_samples_and_time():
+    policy = make_policy()
+
+    # 4 samples below 7W but only 45s apart from the first: not yet
+    assert not run_polls(policy, [3, 3, 3, 3]).await_count
+
+    turn_off = run_polls(make_policy(), [3, 3, 3, 3, 3])
+    turn_off.assert_awaited_once_with(DESKTOP)
+
+
+def test_single_low_sample_does_not_trigger():
+    turn_off = run_polls(make_policy(), [150, 2, 150, 2, 150, 2, 150])
+    turn_off.assert_not_awaited()
+
+
+def test_high_sample_or_missing_reading_restarts_the_count():
+    assert not run_polls(make_policy(), [3, 3, 3, 3, 80, 3, 3, 3, 3]).await_count
+    assert not run_polls(make_policy(), [3, 3, 3, None, 3, 3, 3, 3]).await_count
+
+
+def test_plug_already_off_is_left_alone():
+    turn_off = run_polls(make_policy(), [0] * 10, is_on=False)
+
+    turn_off.assert_not_awaited()
+
+
+def test_cooldown_after_action():
+    policy = make_policy(cooldown_seconds=600)
+    turn_off = run_polls(policy, [3] * 5)
+    # someone switched it back on and left it idle again
+    turn_off_again = run_polls(policy, [3] * 10, start=T0 + 5 * POLL)
+
+    assert turn_off.await_count == 1
+    turn_off_again.assert_not_awaited()
+    assert policy.actions == {DESKTOP: 1}
+
+
+def test_dry_run_only_notifies():
+    policy = make_policy(dry_run=True)
+
+    turn_off = run_polls(policy, [3] * 5)
+
+    turn_off.assert_not_awaited()
+    policy.notify.assert_awaited_once()
+    assert "dry run" in policy.notify.await_args.args[0]
+    assert policy.actions == {DESKTOP: 1}
+
+
+def test_failed_turn_off_is_not_counted():
+    policy = make_policy()
+    turn_off = AsyncMock(side_effect=TimeoutError("unreachable"))
+    for i in range(5):
+        asyncio.run(policy.evaluate(T0 + i * POLL, {DESKTOP: 3}, {DESKTOP: True}, turn_off))
+
+    assert policy.actions == {}
+    policy.notify.assert_not_awaited()
+
+
+def test_same_alias_on_another_strip_is_judged_on_its_own_readings():
+    policy = make_policy()
+    busy, idle = ("13k", "rack1"), ("13k", "rack2")
+    turn_off = AsyncMock()
+    for i in range(5):
+        readings = {busy: 180, idle: 2, ("fridge", "rack1"): 1}
+        states = {busy: True, idle: True, ("fridge", "rack1"): True}
+        asyncio.run(policy.evaluate(T0 + i * POLL, readings, states, turn_off))
+
+    turn_off.assert_awaited_once_with(idle)
+    assert "13k on rack2" in policy.notify.await_args.args[0]
@@ -0,0 +1,200 @@
+import logging
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+import remote_write
+from remote_write import RemoteWriter, encode_varint, snappy_literal_block
+
+T0 = 1_790_000_000.0
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def parse_message(data: bytes) -> list[tuple[int, object]]:
+    fields, pos = [], 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            (value,) = struct.unpack("<d", data[pos:pos + 8])
+            pos += 8
+        else:
+            length, pos = read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        fields.append((field, value))
+    return fields
+
+
+def decode_write_request(data: bytes) -> dict:
+    """{(label pairs): [(value, timestamp_ms)]} from a WriteRequest."""
+    series = {}
+    for _, ts_bytes in parse_message(data):
+        labels, samples = [], []
+        for field, value in parse_message(ts_bytes):
+            pairs = dict(parse_message(value))
+            if field == 1:
+                labels.append((pairs[1].decode(), pairs[2].decode()))
+            else:
+                samples.append((pairs[1], pairs[2]))
+        series[tuple(labels)] = samples
+    return series
+
+
+def snappy_decompress(data: bytes) -> bytes:
+    cramjam = pytest.importorskip("cramjam")
+    return bytes(cramjam.snappy.decompress_raw(data))
+
+
+class Receiver:
+    """Remote-write endpoint stand-in that answers with queued status codes."""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                status = receiver.statuses.pop(0) if receiver.statuses else 204
+                receiver.requests.append((dict(self.headers), body, status))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1/write"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def accepted(self) -> dict:
+        series = {}
+        for _, body, status in self.requests:
+            if status < 300:
+                for labels, samples in decode_write_request(snappy_decompress(body)).items():
+                    series.setdefault(labels, []).extend(samples)
+        return series
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.server.shutdown()
+
+
+def make_writer(url, **kwargs):
+    return RemoteWriter(url, logging.getLogger("test"), labels={"job": "kasa_exporter_push"}, **kwargs)
+
+
+def test_varint_encoding():
+    assert encode_varint(1) == b"\x01"
+    assert encode_varint(300) == b"\xac\x02"
+    assert encode_varint(-1) == b"\xff" * 9 + b"\x01"
+
+
+def test_push_sends_snappy_protobuf(receiver):
+    writer = make_writer(receiver.url)
+    writer.append(T0, {"LG45": 42, "13k": 180.5})
+    writer.append(T0 + 15, {"LG45": 43})
+
+    assert writer.push(writer.take_batch())
+
+    headers, _, _ = receiver.requests[0]
+    assert headers["Content-Encoding"] == "snappy"
+    assert headers["Content-Type"] == "application/x-protobuf"
+    assert headers["X-Prometheus-Remote-Write-Version"] == "0.1.0"
+    assert receiver.accepted() == {
+        (("__name__", "kasapower_watts"), ("device", "LG45"), ("job", "kasa_exporter_push")): [
+            (42.0, int(T0 * 1000)),
+            (43.0, int((T0 + 15) * 1000)),
+        ],
+        (("__name__", "kasapower_watts"), ("device", "13k"), ("job", "kasa_exporter_push")): [
+            (180.5, int(T0 * 1000)),
+        ],
+    }
+    assert writer.sent_samples == 3
+
+
+def test_literal_snappy_fallback_is_valid():
+    data = bytes(range(256)) * 700  # spans several 64 KiB literal runs
+
+    assert snappy_decompress(snappy_literal_block(data)) == data
+    assert snappy_decompress(snappy_literal_block(b"x" * 59)) == b"x" * 59
+    assert snappy_decompress(snappy_literal_block(b"x" * 200)) == b"x" * 200
+
+
+def test_failed_push_is_retried_with_backoff(receiver):
+    receiver.statuses = [503, 503]
+    writer = make_writer(receiver.url, flush_interval=0.05, min_backoff=0.01)
+    writer.append(T0, {"LG45": 42})
+    writer.start()
+
+    deadline = time.monotonic() + 5
+    while writer.sent_samples == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert [status for _, _, status in receiver.requests] == [503, 503, 204]
+    assert writer.failed_pushes == 2
+    assert len(receiver.accepted()) == 1
+
+
+def test_rejected_batch_is_dropped_not_retried(receiver):
+    receiver.statuses = [400]
+    writer = make_writer(receiver.url)
+    writer.append(T0, {"LG45": 42})
+
+    assert writer.push(writer.take_batch())
+    assert writer.dropped_samples == 1
+    assert writer.sent_samples == 0
+
+
+def test_unreachable_endpoint_means_retry():
+    writer = make_writer("http://127.0.0.1:9/api/v1/write", timeout=0.5)
+    writer.append(T0, {"LG45": 42})
+
+    assert not writer.push(writer.take_batch())
+
+
+def test_queue_is_bounded_and_keeps_newest():
+    writer = make_writer("http://unused", max_queue=3)
+    for i in range(5):
+        writer.append(T0 + i, {"LG45": i})
+
+    assert [value for _, value, _ in writer.queue] == [2.0, 3.0, 4.0]
+    assert writer.dropped_samples == 2
+
+    # a failed batch goes back in front, but never past the bound
+    batch = writer.take_batch()
+    writer.append(T0 + 5, {"LG45": 5})
+    writer.requeue(batch)
+    assert [value for _, value, _ in writer.queue] == [3.0, 4.0, 5.0]
+    assert writer.dropped_samples == 3
+
+
+def test_snappy_falls_back_without_cramjam(monkeypatch):
+    monkeypatch.setitem(sys.modules, "cramjam", None)
+
+    assert remote_write.snappy_compress(b"abc") == snappy_literal_block(b"abc")
@@ -0,0 +1,129 @@
+import io
+import sys
+from pathlib import Path
+
+from prometheus_client.openmetrics.parser import text_string_to_metric_families
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+import sample_store
+from sample_store import SampleStore, export_openmetrics
+
+T0 = 1_790_000_000.0
+
+
+def make_store(tmp_path, **kwargs) -> SampleStore:
+    # retention is measured from T0, never from the real clock
+    return SampleStore(str(tmp_path / "samples.db"), clock=lambda: T0, **kwargs)
+
+
+def count_rows(store, table="samples"):
+    return store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_store_uses_wal(tmp_path):
+    store = make_store(tmp_path)
+
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_samples_are_buffered_until_batch_is_full(tmp_path):
+    store = make_store(tmp_path, batch_size=4, flush_interval=3600)
+
+    store.append(T0, {"LG45": 42, "13k": 180})
+    assert count_rows(store) == 0
+
+    store.append(T0 + 15, {"LG45": 43, "13k": 181})
+    assert count_rows(store) == 4
+
+
+def test_close_flushes_pending_samples(tmp_path):
+    path = str(tmp_path / "samples.db")
+    store = SampleStore(path, batch_size=500, flush_interval=3600, clock=lambda: T0)
+    store.append(T0, {"LG45": 42})
+    store.close()
+
+    reopened = SampleStore(path, clock=lambda: T0)
+    assert count_rows(reopened) == 1
+
+
+def test_prune_drops_samples_past_retention(tmp_path):
+    store = make_store(tmp_path, retention_days=1, batch_size=1)
+    store.append(T0 - 2 * 86400, {"LG45": 40})
+    store.append(T0, {"LG45": 42})
+
+    with store.lock:
+        assert store.prune() == 1
+    assert count_rows(store) == 1
+
+
+def test_first_flush_does_not_prune_straight_away(tmp_path):
+    store = make_store(tmp_path, retention_days=1, batch_size=1)
+
+    store.append(T0 - 2 * 86400, {"LG45": 40})
+
+    assert count_rows(store) == 1
+
+
+def test_prune_drops_series_left_without_samples(tmp_path):
+    store = make_store(tmp_path, retention_days=1, batch_size=1)
+    store.append(T0 - 2 * 86400, {"old plug": 40})
+    store.append(T0, {"LG45": 42})
+
+    with store.lock:
+        store.prune()
+    assert count_rows(store, "series") == 1
+
+    # a plug coming back gets a fresh series
+    store.append(T0 + 15, {"old plug": 41})
+    assert count_rows(store, "series") == 2
+    assert count_rows(store) == 2
+
+
+def test_export_is_valid_openmetrics_with_timestamps(tmp_path):
+    store = make_store(tmp_path, batch_size=1)
+    store.append(T0, {'odd "name"': 1.5, "LG45": 42})
+    store.append(T0 + 15, {"LG45": 43})
+    store.append(T0 + 30, {"LG45": 44})
+    out = io.StringIO()
+
+    written = export_openmetrics(store.conn, out, start=T0, end=T0 + 30)
+
+    assert written == 3
+    (family,) = text_string_to_metric_families(out.getvalue())
+    assert family.name == "kasapower_watts"
+    assert family.type == "gauge"
+    assert family.unit == "watts"
+    samples = [(s.labels["device"], s.value, float(s.timestamp)) for s in family.samples]
+    assert samples == [
+        ('odd "name"', 1.5, T0),
+        ("LG45", 42.0, T0),
+        ("LG45", 43.0, T0 + 15),
+    ]
+
+
+def test_strip_outlets_get_a_strip_label(tmp_path):
+    store = make_store(tmp_path, batch_size=1)
+    store.append(T0, {("13k", "rack1"): 180, ("13k", "rack2"): 60, ("LG45", ""): 42})
+    out = io.StringIO()
+
+    export_openmetrics(store.conn, out, start=T0, end=T0 + 1)
+
+    (family,) = text_string_to_metric_families(out.getvalue())
+    assert sorted(tuple(sorted(s.labels.items())) for s in family.samples) == [
+        (("device", "13k"), ("strip", "rack1")),
+        (("device", "13k"), ("strip", "rack2")),
+        (("device", "LG45"),),
+    ]
+
+
+def test_export_cli_writes_file(tmp_path, capsys):
+    path = str(tmp_path / "samples.db")
+    store = SampleStore(path, batch_size=1, clock=lambda: T0)
+    store.append(T0, {"LG45": 42})
+    output = tmp_path / "gap.om"
+
+    assert sample_store.main(["export", "--db", path, "--start", str(T0), "-o", str(output)]) == 0
+
+    assert output.read_text().endswith("# EOF\n")
+    assert "exported 1 samples" in capsys.readouterr().err
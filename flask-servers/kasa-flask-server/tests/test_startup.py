@@ -0,0 +1,132 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+from startup import Startup
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+
+@pytest.fixture
+def startup(monkeypatch):
+    startup = Startup(warmup_timeout=60)
+    startup.import_seconds = 1.5
+    monkeypatch.setattr(FLASK_APP, "STARTUP", startup)
+    return startup
+
+
+def test_not_ready_until_every_device_was_tried():
+    startup = Startup()
+    assert not startup.ready
+
+    startup.begin(["10.20.0.40", "10.20.0.146"])
+    startup.record("10.20.0.40")
+
+    status = startup.status()
+    assert not startup.ready
+    assert status["phase"] == "warming up"
+    assert status["devices_done"] == 1
+
+    startup.record("10.20.0.146", TimeoutError())
+    startup.finish()
+
+    status = startup.status()
+    assert startup.ready
+    assert status["devices_up"] == 1
+    assert status["devices"]["10.20.0.146"]["last_error"] == "TimeoutError"
+    assert status["warmup_seconds"] is not None
+
+
+def test_ready_after_warmup_timeout():
+    startup = Startup(warmup_timeout=60)
+    startup.begin(["10.20.0.40"])
+    startup.started -= 61
+
+    assert startup.ready
+    assert startup.status()["phase"] == "warm-up timed out"
+
+
+def test_warm_up_connects_to_every_device_in_parallel(startup, monkeypatch):
+    monkeypatch.setattr(FLASK_APP, "hs300_ips", lambda: ["10.20.0.40"])
+    monkeypatch.setattr(FLASK_APP, "kp125m_ips", lambda: ["10.20.0.146", "10.20.0.100"])
+    startup.begin(["10.20.0.40", "10.20.0.146", "10.20.0.100"])
+
+    async def fake_connect(ip, max_retries):
+        await asyncio.sleep(0.2)
+        if ip == "10.20.0.100":
+            raise TimeoutError("unreachable")
+        return SimpleNamespace(disconnect=AsyncMock())
+
+    monkeypatch.setattr(FLASK_APP, "connect_to_hs300_device", fake_connect)
+    monkeypatch.setattr(FLASK_APP, "connect_to_kp125m_device", fake_connect)
+
+    started = time.monotonic()
+    asyncio.run(FLASK_APP.warm_up_connections())
+
+    assert time.monotonic() - started < 0.5
+    assert startup.device_up() == {
+        "10.20.0.40": True,
+        "10.20.0.146": True,
+        "10.20.0.100": False,
+    }
+
+
+def test_readyz_reports_progress(startup):
+    client = FLASK_APP.app.test_client()
+    startup.begin(["10.20.0.40"])
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.get_json()["phase"] == "warming up"
+
+    startup.record("10.20.0.40")
+    startup.finish()
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["devices"]["10.20.0.40"]["up"] is True
+
+
+def test_livez_fails_when_poller_stalls(monkeypatch):
+    client = FLASK_APP.app.test_client()
+    poller = SimpleNamespace(started_at=time.time(), updated_at=None)
+    monkeypatch.setattr(FLASK_APP, "ENERGY_POLLER", poller)
+
+    assert client.get("/livez").status_code == 200
+
+    poller.updated_at = time.time() - FLASK_APP.CONFIG.KASA_LIVENESS_STALE_SECONDS - 1
+
+    assert client.get("/livez").status_code == 503
+
+
+def test_metrics_export_startup_timings_and_device_health(startup):
+    startup.begin(["10.20.0.40", "10.20.0.146"])
+    startup.record("10.20.0.40")
+    startup.record("10.20.0.146", TimeoutError())
+    startup.finish()
+
+    registry = FLASK_APP.build_metrics_registry({})
+
+    assert registry.get_sample_value("kasa_startup_import_seconds") == 1.5
+    assert registry.get_sample_value("kasa_startup_warmup_seconds") is not None
+    assert registry.get_sample_value("kasa_up", {"host": "10.20.0.40"}) == 1
+    assert registry.get_sample_value("kasa_up", {"host": "10.20.0.146"}) == 0
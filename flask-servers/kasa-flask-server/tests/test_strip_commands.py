@@ -0,0 +1,125 @@
+import asyncio
+import importlib.util
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+from kasa import Module
+from kasa.iot import IotStrip
+from plug_control import PlugTarget, apply_states
+from strip_commands import set_children_state
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+OK = {"system": {"set_relay_state": {"err_code": 0}}}
+
+
+def make_strip(aliases, response=OK, watts=3.0):
+    strip = MagicMock(spec=IotStrip)
+    strip.protocol = SimpleNamespace(query=AsyncMock(return_value=response))
+    strip.sys_info = {
+        "children": [{"id": f"child{i}", "alias": a, "state": 1} for i, a in enumerate(aliases)]
+    }
+    strip.children = [
+        SimpleNamespace(
+            alias=alias,
+            child_id=f"child{i}",
+            parent=strip,
+            is_on=True,
+            modules={Module.Energy: SimpleNamespace(current_consumption=watts)},
+            turn_on=AsyncMock(),
+            turn_off=AsyncMock(),
+        )
+        for i, alias in enumerate(aliases)
+    ]
+    strip.disconnect = AsyncMock()
+    return strip
+
+
+def test_one_request_for_all_outlets():
+    strip = make_strip(["13k", "14kf", "9950x"])
+
+    batched = asyncio.run(set_children_state(strip, strip.children[:2], on=False))
+
+    assert batched
+    strip.protocol.query.assert_awaited_once_with(
+        {
+            "context": {"child_ids": ["child0", "child1"]},
+            "system": {"set_relay_state": {"state": 0}},
+        }
+    )
+    assert [c["state"] for c in strip.sys_info["children"]] == [0, 0, 1]
+    strip.children[0].turn_off.assert_not_awaited()
+
+
+def test_rejected_batch_falls_back_per_outlet():
+    strip = make_strip(["13k", "14kf"], response={"system": {"set_relay_state": {"err_code": -1}}})
+
+    batched = asyncio.run(set_children_state(strip, strip.children, on=True))
+
+    assert not batched
+    for plug in strip.children:
+        plug.turn_on.assert_awaited_once()
+
+
+def test_apply_states_batches_outlets_by_direction():
+    strip = make_strip(["13k", "14kf", "9950x"])
+    plugs = {(plug.alias, "rack1"): plug for plug in strip.children}
+    lg45 = SimpleNamespace(alias="LG45", turn_on=AsyncMock(), turn_off=AsyncMock())
+    plugs[("LG45", "")] = lg45
+    targets = [
+        PlugTarget("13k", on=False),
+        PlugTarget("LG45", on=False),
+        PlugTarget("14kf", on=True),
+        PlugTarget("9950x", on=False),
+    ]
+
+    results = asyncio.run(apply_states(plugs, targets))
+
+    assert [r["alias"] for r in results] == ["13k", "LG45", "14kf", "9950x"]
+    assert all(r["status"] == "success" for r in results)
+    assert strip.protocol.query.await_count == 2
+    sent = [call.args[0] for call in strip.protocol.query.await_args_list]
+    assert {"child_ids": ["child0", "child2"]} in [request["context"] for request in sent]
+    lg45.turn_off.assert_awaited_once()
+
+
+def test_apply_states_reports_a_failed_batch_for_each_outlet():
+    strip = make_strip(["13k", "14kf"])
+    strip.protocol.query.side_effect = TimeoutError("unreachable")
+    plugs = {(plug.alias, "rack1"): plug for plug in strip.children}
+
+    results = asyncio.run(apply_states(plugs, [PlugTarget("13k", False), PlugTarget("14kf", False)]))
+
+    assert [r["status"] for r in results] == ["failure", "failure"]
+
+
+def test_idle_desktops_turned_off_in_one_request(monkeypatch):
+    strip = make_strip(["13k", "9950x", "fridge"])
+
+    async def fake_connect(ip):
+        return strip
+
+    monkeypatch.setattr(FLASK_APP, "connect_to_hs300_device", fake_connect)
+    monkeypatch.setattr(FLASK_APP, "send_discord_message", AsyncMock())
+    monkeypatch.setattr(FLASK_APP.CONFIG, "DESKTOPS", ["13k", "9950x"])
+
+    assert asyncio.run(FLASK_APP.turn_off_desktop_plugs_if_no_power_HS300("10.20.0.40"))
+
+    strip.protocol.query.assert_awaited_once()
+    assert strip.protocol.query.await_args.args[0]["context"] == {"child_ids": ["child0", "child1"]}
+    assert FLASK_APP.send_discord_message.await_count == 2
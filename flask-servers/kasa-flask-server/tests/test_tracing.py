@@ -0,0 +1,127 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+DOCKER_APP_DIR = Path(__file__).parent.parent / "docker-app"
+sys.path.insert(0, str(DOCKER_APP_DIR))
+
+os.environ.setdefault("HS300_IP", "10.20.0.40")
+os.environ.setdefault("KP125M_IPS", "10.20.0.115")
+os.environ.setdefault("KASA_USERNAME", "test-user")
+os.environ.setdefault("KASA_PASSWORD", "test-password")
+
+import tracing
+
+FLASK_APP_SPEC = importlib.util.spec_from_file_location(
+    "kasa_flask_app", DOCKER_APP_DIR / "flask-app.py"
+)
+FLASK_APP = importlib.util.module_from_spec(FLASK_APP_SPEC)
+FLASK_APP_SPEC.loader.exec_module(FLASK_APP)
+
+
+@pytest.fixture(autouse=True)
+def tracing_off():
+    yield
+    tracing.configure(None)
+
+
+def read_events(path):
+    # files are left unterminated, as the trace event format allows
+    return json.loads(Path(path).read_text().rstrip().rstrip(",") + "]")
+
+
+def test_span_is_a_noop_when_disabled():
+    tracing.configure(None)
+
+    assert tracing.span("connect", host="10.20.0.40") is tracing.NOOP_SPAN
+
+
+def test_spans_are_written_as_chrome_trace_events(tmp_path):
+    path = tmp_path / "kasa.trace.json"
+    tracing.configure(str(path))
+
+    async def connect(host):
+        with tracing.span("connect", host=host):
+            await asyncio.sleep(0.01)
+
+    async def sweep():
+        await asyncio.gather(connect("10.20.0.146"), connect("10.20.0.100"))
+
+    with pytest.raises(TimeoutError):
+        with tracing.span("scrape"):
+            asyncio.run(sweep())
+            raise TimeoutError("too slow")
+
+    events = read_events(path)
+    assert [event["name"] for event in events] == ["connect", "connect", "scrape"]
+    assert {event["ph"] for event in events} == {"X"}
+    assert events[0]["dur"] >= 10_000
+    # concurrent coroutines each get their own track
+    assert events[0]["tid"] != events[1]["tid"]
+    assert events[2]["args"]["error"] == "TimeoutError('too slow')"
+
+
+def test_trace_file_rotates(tmp_path):
+    path = tmp_path / "kasa.trace.json"
+    tracing.configure(str(path), max_bytes=2048, backups=2)
+
+    for i in range(100):
+        with tracing.span("energy_read", host=f"10.20.0.{i}"):
+            pass
+
+    assert os.path.exists(f"{path}.1")
+    assert os.path.exists(f"{path}.2")
+    assert not os.path.exists(f"{path}.3")
+    assert os.path.getsize(path) <= 2048
+    assert read_events(f"{path}.1")[0]["name"] == "energy_read"
+
+
+def test_sample_stacks_sees_busy_thread():
+    stop = threading.Event()
+
+    def busy_loop_for_test():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop_for_test, name="busy")
+    thread.start()
+    try:
+        counts = tracing.sample_stacks(0.2, interval=0.01)
+    finally:
+        stop.set()
+        thread.join()
+
+    folded = tracing.collapsed(counts)
+    assert any(
+        line.startswith("busy;") and "busy_loop_for_test" in line
+        for line in folded.splitlines()
+    )
+
+
+def test_debug_profile_is_hidden_unless_enabled(monkeypatch):
+    monkeypatch.setattr(FLASK_APP.CONFIG, "KASA_DEBUG_ENDPOINTS", False)
+
+    response = FLASK_APP.app.test_client().get("/debug/profile?seconds=1")
+
+    assert response.status_code == 404
+
+
+def test_debug_profile_returns_collapsed_stacks(monkeypatch):
+    monkeypatch.setattr(FLASK_APP.CONFIG, "KASA_DEBUG_ENDPOINTS", True)
+    client = FLASK_APP.app.test_client()
+
+    assert client.get("/debug/profile?seconds=600").status_code == 400
+
+    started = time.monotonic()
+    response = client.get("/debug/profile?seconds=0.1")
+
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5
+    assert "kasa-profile.folded" in response.headers["Content-Disposition"]
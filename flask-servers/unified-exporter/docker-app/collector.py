@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+
+import aiohttp
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+logger = logging.getLogger(__name__)
+
+
+class Collector(ABC):
+    """
+    One data source hosted by the exporter runtime.
+
+    collect() runs on the shared event loop every `interval` seconds (read
+    again after each run, so a collector may retune itself) and returns the
+    metric families to publish, or None to keep publishing the previous
+    snapshot. Blocking work must go through asyncio.to_thread so one slow
+    source never stalls the others.
+    """
+
+    name = ""
+    interval = 60.0
+    timeout = 30.0
+
+    @abstractmethod
+    async def collect(self, session: aiohttp.ClientSession) -> list[Metric] | None: ...
+
+    async def close(self):
+        pass
+
+
+class Snapshot:
+    """Last published families of one collector plus its run statistics."""
+
+    def __init__(self):
+        self.families: list[Metric] = []
+        self.duration = 0.0
+        self.success = False
+        self.last_success = 0.0
+        self.runs = 0
+        self.errors = 0
+
+
+class SnapshotCache:
+    """
+    Holds every collector's last snapshot and serves them to the registry.
+
+    /metrics only reads this cache, so a scrape never waits on a device, and
+    a failing collector keeps serving its last good families while its
+    success gauge drops to 0. Everything runs on one event loop, so there
+    is no locking.
+    """
+
+    def __init__(self):
+        self.snapshots: dict[str, Snapshot] = {}
+
+    def get(self, name: str) -> Snapshot:
+        return self.snapshots.setdefault(name, Snapshot())
+
+    def collect(self):
+        duration = GaugeMetricFamily(
+            "exporter_collector_duration_seconds",
+            "Duration of the collector's last run",
+            labels=["collector"],
+        )
+        success = GaugeMetricFamily(
+            "exporter_collector_success",
+            "1 if the collector's last run succeeded",
+            labels=["collector"],
+        )
+        last_success = GaugeMetricFamily(
+            "exporter_collector_last_success_timestamp_seconds",
+            "Unix time of the collector's last successful run",
+            labels=["collector"],
+        )
+        runs = CounterMetricFamily(
+            "exporter_collector_runs", "Collector runs since start", labels=["collector"]
+        )
+        errors = CounterMetricFamily(
+            "exporter_collector_errors",
+            "Collector runs that failed or timed out since start",
+            labels=["collector"],
+        )
+        for name, snapshot in self.snapshots.items():
+            duration.add_metric([name], snapshot.duration)
+            success.add_metric([name], 1 if snapshot.success else 0)
+            last_success.add_metric([name], snapshot.last_success)
+            runs.add_metric([name], snapshot.runs)
+            errors.add_metric([name], snapshot.errors)
+            yield from snapshot.families
+        yield from (duration, success, last_success, runs, errors)
+
+
+class Scheduler:
+    """Runs each collector on its own fixed-rate timer on the shared loop."""
+
+    def __init__(self, cache: SnapshotCache, session: aiohttp.ClientSession):
+        self.cache = cache
+        self.session = session
+
+    async def run_once(self, collector: Collector):
+        snapshot = self.cache.get(collector.name)
+        started = time.perf_counter()
+        snapshot.runs += 1
+        try:
+            families = await asyncio.wait_for(
+                collector.collect(self.session), timeout=collector.timeout
+            )
+        except Exception as e:
+            snapshot.errors += 1
+            snapshot.success = False
+            logger.error(f"collector {collector.name} failed: {e!r}")
+        else:
+            if families is not None:
+                snapshot.families = families
+            snapshot.success = True
+            snapshot.last_success = time.time()
+        snapshot.duration = time.perf_counter() - started
+
+    async def run(self, collector: Collector):
+        next_run = time.monotonic()
+        while True:
+            await self.run_once(collector)
+            next_run += collector.interval
+            delay = next_run - time.monotonic()
+            if delay < 0:  # the run overran its slot; start again from now
+                next_run, delay = time.monotonic(), 0
+            await asyncio.sleep(delay)
@@ -0,0 +1,10 @@
+#!/bin/bash
+
+# the build context is the repo root, since the image bundles the kasa,
+# govee and highflow modules from their own directories
+docker buildx build \
+  --platform linux/amd64,linux/arm64 \
+  -t nathannnli/myexporter:$1 \
+  -f docker-app/Dockerfile \
+  --push \
+  ../..
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+
+import aiohttp
+from prometheus_client.core import Metric
+
+from collector import Collector
+
+GOVEE_APP_DIR = os.getenv(
+    "GOVEE_APP_DIR",
+    str(Path(__file__).resolve().parents[2] / "govee-flask-server" / "docker-app"),
+)
+sys.path.insert(0, GOVEE_APP_DIR)
+
+from govee_api import (  # noqa: E402
+    GOVEE_API_KEY,
+    GOVEE_BASE_URL,
+    GOVEE_DEVICES_URL_SUFFIX,
+    GOVEE_MAX_CONCURRENCY,
+    GOVEE_PROPERTIES_URL_SUFFIX,
+    NAME,
+    PollState,
+    parse_devices,
+    parse_state,
+    state_request_body,
+)
+
+GOVEE_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=3.05, sock_read=10)
+
+logger = logging.getLogger(__name__)
+
+
+class GoveeCollector(Collector):
+    """
+    The govee exporter's Poller on the shared HTTP pool.
+
+    Only the HTTP calls are async here; the device list, readings, request
+    budget and published series are the govee exporter's own PollState, so
+    the interval follows the budget exactly as the standalone poller does.
+    """
+
+    name = NAME
+    timeout = 60.0
+
+    def __init__(self):
+        self.headers = {"Govee-API-Key": GOVEE_API_KEY}
+        self.state = PollState()
+        self.semaphore = asyncio.Semaphore(GOVEE_MAX_CONCURRENCY)
+
+    @property
+    def interval(self) -> float:
+        return self.state.interval
+
+    async def refresh_devices(self, session: aiohttp.ClientSession):
+        if not self.state.device_list_due():
+            return
+        try:
+            async with session.get(
+                f"{GOVEE_BASE_URL}{GOVEE_DEVICES_URL_SUFFIX}",
+                headers=self.headers,
+                timeout=GOVEE_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                devices = parse_devices(await response.json())
+        except Exception as e:
+            logger.error(f"govee device list error ------------ Got Nothing: error: {e}")
+            return
+        interval = self.state.set_devices(devices)
+        logger.info(f"found {len(devices)} govee devices, polling every {interval:.0f}s")
+
+    async def poll_device(self, session: aiohttp.ClientSession, device: dict):
+        label = self.state.label(device)
+        if not self.state.acquire():
+            return
+        try:
+            async with self.semaphore, session.post(
+                f"{GOVEE_BASE_URL}{GOVEE_PROPERTIES_URL_SUFFIX}",
+                json=state_request_body(device),
+                headers=self.headers,
+                timeout=GOVEE_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                reading = parse_state(await response.json())
+        except Exception as e:
+            logger.error(f"govee {label} poll error ------------ Got Nothing: error: {e}")
+            self.state.record_error(label)
+            return
+        self.state.record(label, reading)
+
+    async def collect(self, session: aiohttp.ClientSession) -> list[Metric]:
+        await self.refresh_devices(session)
+        await asyncio.gather(*(self.poll_device(session, device) for device in self.state.devices))
+        return list(self.state.collect())
+
+
+def create() -> Collector:
+    return GoveeCollector()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from prometheus_client.core import Metric
+from prometheus_client.parser import text_string_to_metric_families
+
+from collector import Collector
+
+HIGHFLOW_APP_DIR = os.getenv(
+    "HIGHFLOW_APP_DIR",
+    str(Path(__file__).resolve().parents[3] / "aquacomputer-highflow-next"),
+)
+sys.path.insert(0, HIGHFLOW_APP_DIR)
+
+from highflow_exporter import Aggregate, HwmonReader, render  # noqa: E402
+
+HIGHFLOW_SAMPLE_INTERVAL = float(os.getenv("HIGHFLOW_SAMPLE_INTERVAL", "1"))
+HIGHFLOW_EXPORT_INTERVAL = float(os.getenv("HIGHFLOW_EXPORT_INTERVAL", "15"))
+HIGHFLOW_DEVICE_NAME = os.getenv("HIGHFLOW_DEVICE_NAME", "highflownext")
+HWMON_ROOT = os.getenv("HWMON_ROOT", "/sys/class/hwmon")
+
+
+class HwmonCollector(Collector):
+    """
+    The highflow exporter's sampling loop as a collector.
+
+    Samples every HIGHFLOW_SAMPLE_INTERVAL and publishes the min/max/avg of
+    each HIGHFLOW_EXPORT_INTERVAL window, with the same series the textfile
+    exporter writes. A sysfs pread takes microseconds, so it is done inline
+    rather than on a worker thread.
+    """
+
+    name = "hwmon"
+    interval = HIGHFLOW_SAMPLE_INTERVAL
+    timeout = 5.0
+
+    def __init__(self):
+        self.reader = HwmonReader(HIGHFLOW_DEVICE_NAME, HWMON_ROOT)
+        self.agg = Aggregate()
+        self.window_ends = time.monotonic() + HIGHFLOW_EXPORT_INTERVAL
+        self.reads_total = 0
+        self.failures_total = 0
+
+    async def collect(self, session: aiohttp.ClientSession) -> list[Metric] | None:
+        start = time.perf_counter()
+        self.reads_total += 1
+        try:
+            values = self.reader.read()
+            self.agg.add(values, time.perf_counter() - start)
+        except (OSError, ValueError):
+            self.failures_total += 1
+            # the failure is counted in the published series, not raised, so
+            # the collector itself stays healthy while the probe is unplugged
+
+        if time.monotonic() < self.window_ends:
+            return None
+        text = render(self.agg, self.reads_total, self.failures_total)
+        self.agg = Aggregate()
+        self.window_ends = time.monotonic() + HIGHFLOW_EXPORT_INTERVAL
+        return list(text_string_to_metric_families(text))
+
+    async def close(self):
+        self.reader.close()
+
+
+def create() -> Collector:
+    return HwmonCollector()
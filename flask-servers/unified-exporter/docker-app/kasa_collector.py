@@ -0,0 +1,82 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from prometheus_client.core import Metric
+
+from collector import Collector
+
+# The kasa exporter's own modules are reused as-is; the image copies them
+# to /app/kasa and local runs fall back to the repo checkout.
+KASA_APP_DIR = os.getenv(
+    "KASA_APP_DIR",
+    str(Path(__file__).resolve().parents[2] / "kasa-flask-server" / "docker-app"),
+)
+# a round connects to any device that dropped its connection, so allow
+# for a few slow handshakes
+KASA_TIMEOUT_SECONDS = float(os.getenv("KASA_TIMEOUT_SECONDS", "30"))
+
+
+def load_kasa_app():
+    """Import the kasa exporter's flask-app.py (its hyphenated name rules out a plain import)."""
+    sys.path.insert(0, KASA_APP_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "kasa_flask_app", os.path.join(KASA_APP_DIR, "flask-app.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class KasaCollector(Collector):
+    """
+    Runs the kasa exporter's energy poller on the shared loop: each collect
+    is one poll round over the poller's open device connections, published
+    through build_metrics_registry as the kasa exporter's own /metrics does.
+
+    Discovery, when KASA_DISCOVERY_ENABLED, runs as a task on the same loop
+    every KASA_DISCOVERY_INTERVAL_SECONDS; it is started from collect() and
+    never awaited there, since a broadcast waits out its whole timeout.
+    """
+
+    name = "kasa"
+    timeout = KASA_TIMEOUT_SECONDS
+
+    def __init__(self):
+        self.app = load_kasa_app()
+        self.interval = self.app.CONFIG.KASA_POLL_INTERVAL_SECONDS
+        self.discovery = self.app.create_discovery()
+        self.discovery_task: asyncio.Task | None = None
+        self.last_discovery: float | None = None
+        self.app.STARTUP.begin([*self.app.hs300_ips(), *self.app.kp125m_ips()])
+        self.poller = self.app.create_energy_poller()
+        self.poller.started_at = time.time()
+
+    def discover_if_due(self):
+        if self.discovery is None:
+            return
+        if self.discovery_task is not None and not self.discovery_task.done():
+            return
+        now = time.monotonic()
+        if self.last_discovery is not None and now - self.last_discovery < self.discovery.interval:
+            return
+        self.last_discovery = now
+        self.discovery_task = asyncio.create_task(self.discovery.discover_and_log())
+
+    async def collect(self, session: aiohttp.ClientSession) -> list[Metric] | None:
+        self.discover_if_due()
+        await self.poller.poll_once()
+        return list(self.app.build_metrics_registry(self.poller.snapshot()).collect())
+
+    async def close(self):
+        if self.discovery_task is not None:
+            self.discovery_task.cancel()
+        for host in list(self.poller.devices):
+            await self.poller.drop(host)
+
+def create() -> Collector:
+    return KasaCollector()
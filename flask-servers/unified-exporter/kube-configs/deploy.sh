@@ -0,0 +1,6 @@
+#! /bin/bash
+# create namespace if not exist
+kubectl get namespace unified-exporter || kubectl create namespace unified-exporter
+
+# deploy exporter
+kubectl apply -f ./
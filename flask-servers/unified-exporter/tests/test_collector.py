@@ -0,0 +1,105 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "docker-app"))
+
+from collector import Collector, Scheduler, SnapshotCache
+
+
+def family(value: float) -> GaugeMetricFamily:
+    gauge = GaugeMetricFamily("fake_value", "A fake reading")
+    gauge.add_metric([], value)
+    return gauge
+
+
+class FakeCollector(Collector):
+    """Returns (or raises) the queued outcomes, one per run."""
+
+    name = "fake"
+    timeout = 1.0
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+
+    async def collect(self, session):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome == "hang":
+            await asyncio.sleep(10)
+        return outcome
+
+
+def run(collector: Collector, cache: SnapshotCache, times: int = 1):
+    scheduler = Scheduler(cache, session=None)
+
+    async def scenario():
+        for _ in range(times):
+            await scheduler.run_once(collector)
+
+    asyncio.run(scenario())
+    return cache.get(collector.name)
+
+
+def test_successful_run_publishes_its_families():
+    cache = SnapshotCache()
+
+    snapshot = run(FakeCollector([family(1.0)]), cache)
+
+    assert snapshot.success
+    assert snapshot.runs == 1 and snapshot.errors == 0
+    assert snapshot.last_success > 0
+    assert [m.samples[0].value for m in snapshot.families] == [1.0]
+
+
+def test_failed_run_keeps_the_last_good_families():
+    cache = SnapshotCache()
+
+    snapshot = run(FakeCollector([family(1.0)], RuntimeError("api down")), cache, times=2)
+
+    assert not snapshot.success
+    assert snapshot.runs == 2 and snapshot.errors == 1
+    assert [m.samples[0].value for m in snapshot.families] == [1.0]
+
+
+def test_none_keeps_the_families_and_counts_as_success():
+    cache = SnapshotCache()
+
+    snapshot = run(FakeCollector([family(1.0)], None), cache, times=2)
+
+    assert snapshot.success and snapshot.errors == 0
+    assert [m.samples[0].value for m in snapshot.families] == [1.0]
+
+
+def test_run_past_the_timeout_is_cancelled_and_counted_as_an_error():
+    collector = FakeCollector("hang")
+    collector.timeout = 0.05
+    cache = SnapshotCache()
+
+    snapshot = run(collector, cache)
+
+    assert not snapshot.success
+    assert snapshot.errors == 1
+    assert snapshot.families == []
+    assert snapshot.duration < 1
+
+
+def test_cache_serves_every_collector_with_its_run_statistics():
+    cache = SnapshotCache()
+    run(FakeCollector([family(1.0)]), cache)
+    failing = FakeCollector(RuntimeError("api down"))
+    failing.name = "broken"
+    run(failing, cache)
+    registry = CollectorRegistry()
+    registry.register(cache)
+
+    assert registry.get_sample_value("fake_value") == 1.0
+    for name, success, errors in [("fake", 1, 0), ("broken", 0, 1)]:
+        labels = {"collector": name}
+        assert registry.get_sample_value("exporter_collector_success", labels) == success
+        assert registry.get_sample_value("exporter_collector_runs_total", labels) == 1
+        assert registry.get_sample_value("exporter_collector_errors_total", labels) == errors